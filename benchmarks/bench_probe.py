@@ -0,0 +1,57 @@
+"""
+Compare probe throughput of the native header parser against ffprobe.
+
+Usage:
+    python benchmarks/bench_probe.py [--ffmpeg PATH] [--rounds N] FILE_OR_GLOB...
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.container_parser import ContainerParseError, parse_container  # noqa: E402
+from backend.stream_info import StreamInfo  # noqa: E402
+
+
+def time_probes(probe, files, rounds):
+    """Return (probes per second, failures) for `probe` over every file, `rounds` times."""
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in files:
+            try:
+                probe(path)
+            except ContainerParseError:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    return len(files) * rounds / elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    files = [path for pattern in args.files for path in sorted(glob.glob(pattern))]
+    if not files:
+        parser.error("no files matched")
+
+    native_rate, native_failures = time_probes(parse_container, files, args.rounds)
+    ffprobe_rate, _ = time_probes(
+        lambda path: StreamInfo(path, args.ffmpeg, use_cache=False, use_native_parser=False),
+        files, args.rounds
+    )
+
+    print(f"files: {len(files)}, rounds: {args.rounds}")
+    print(f"native parser: {native_rate:10.1f} probes/s ({native_failures} fell back)")
+    print(f"ffprobe:       {ffprobe_rate:10.1f} probes/s")
+    print(f"speedup:       {native_rate / ffprobe_rate:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Time probing, stream copy, transcoding and batch throughput on generated fixtures.
+
+Results are written as JSON; pass an earlier results file with --compare to
+fail (exit code 1) when any benchmark got slower than its regression threshold.
+
+Usage:
+    python benchmarks/bench_suite.py [--set quick|full] [--rounds N] [--out results.json]
+                                     [--compare baseline.json] [--threshold FRACTION]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import DEFAULT_DIR, SETS, ensure_fixtures  # noqa: E402
+from backend.commands import output_paths  # noqa: E402
+from backend.extractor import run_job  # noqa: E402
+from backend.jobs import ALL_STREAMS, Job, JobStatus, Scheduler  # noqa: E402
+from backend.options import Options  # noqa: E402
+from backend.stream_info import StreamInfo  # noqa: E402
+
+RESULTS_FORMAT = 1
+
+# Allowed slowdown per benchmark group before it counts as a regression
+THRESHOLDS = {
+    'probe_native': 0.5,  # sub-millisecond timings are noisy
+    'probe_ffprobe': 0.25,
+    'copy': 0.2,
+    'transcode': 0.1,
+    'batch': 0.2
+}
+
+
+def job_options(ffmpeg_path, **overrides):
+    # The output cache would turn every round after the first into a no-op
+    values = {'ffmpeg_path': ffmpeg_path, 'output_cache': 'false', 'chunked_encoding': 'false'}
+    values.update(overrides)
+    return Options(values).snapshot()
+
+
+def timed(function, rounds):
+    runs = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    return {'median': statistics.median(runs), 'min': min(runs), 'runs': runs}
+
+
+def extraction(input_file, output_dir, options):
+    def run():
+        output_video, output_audio = output_paths(
+            input_file, output_dir, options['video_template'], options['audio_template'], options['audio_codec']
+        )
+        run_job(Job(input_file, output_video, output_audio, options, audio_streams=ALL_STREAMS))
+    return run
+
+
+def batch(fixtures, output_dir, options):
+    def run():
+        scheduler = Scheduler(run_job, cpu_share=float(options['batch_cpu_share']),
+                              io_jobs=int(options['batch_io_jobs']))
+        for fixture in fixtures.values():
+            output_video, output_audio = output_paths(
+                fixture['path'], output_dir, options['video_template'],
+                options['audio_template'], options['audio_codec']
+            )
+            scheduler.submit(Job(fixture['path'], output_video, output_audio, options, audio_streams=ALL_STREAMS))
+        scheduler.start()
+        scheduler.wait()
+        failed = [job for job in scheduler.queue.jobs() if job.status != JobStatus.DONE]
+        if failed:
+            raise RuntimeError(f"batch jobs failed: {failed}")
+    return run
+
+
+def run_suite(fixtures, ffmpeg_path, rounds, transcode=True):
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        copy_options = job_options(ffmpeg_path, video_codec='copy', audio_codec='aac', smart_copy='true')
+        transcode_options = job_options(ffmpeg_path, video_codec='h264', audio_codec='aac', smart_copy='false')
+
+        for name, fixture in fixtures.items():
+            path = fixture['path']
+            print(f"{name}...", file=sys.stderr)
+            results[f"probe_native/{name}"] = timed(
+                lambda: StreamInfo(path, ffmpeg_path, use_cache=False), rounds * 10
+            )
+            results[f"probe_ffprobe/{name}"] = timed(
+                lambda: StreamInfo(path, ffmpeg_path, use_cache=False, use_native_parser=False), rounds
+            )
+            results[f"copy/{name}"] = timed(extraction(path, output_dir, copy_options), rounds)
+            if transcode:
+                results[f"transcode/{name}"] = timed(extraction(path, output_dir, transcode_options), rounds)
+
+        batch_result = timed(batch(fixtures, output_dir, copy_options), rounds)
+        media_seconds = sum(fixture['duration'] for fixture in fixtures.values())
+        batch_result['media_seconds_per_second'] = media_seconds / batch_result['median']
+        results['batch/copy'] = batch_result
+    return results
+
+
+def ffmpeg_version(ffmpeg_path):
+    try:
+        output = subprocess.run([ffmpeg_path, "-version"], capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    return output.splitlines()[0] if output else None
+
+
+def compare(baseline, current, threshold=None):
+    """
+    Compare the medians of two result sets.
+
+    Returns:
+        list[str]: One line per regression; empty when nothing got slower than allowed.
+    """
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        allowed = threshold if threshold is not None else THRESHOLDS.get(name.split('/')[0], 0.15)
+        ratio = result['median'] / reference['median']
+        marker = "REGRESSION" if ratio > 1 + allowed else ""
+        print(f"{name:<40} {reference['median']:9.4f}s -> {result['median']:9.4f}s  {ratio:5.2f}x  {marker}")
+        if marker:
+            regressions.append(f"{name}: {ratio:.2f}x slower (allowed {1 + allowed:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--fixtures", default=DEFAULT_DIR, help="fixture directory (reused between runs)")
+    parser.add_argument("--set", default="quick", choices=sorted(SETS))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--no-transcode", action="store_true", help="skip the (slow) transcode benchmarks")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, help="allowed slowdown for every benchmark, e.g. 0.1 for 10%%")
+    args = parser.parse_args()
+
+    fixtures = ensure_fixtures(args.ffmpeg, args.fixtures, SETS[args.set])
+    current = {
+        'format': RESULTS_FORMAT,
+        'meta': {
+            'timestamp': time.time(),
+            'ffmpeg': ffmpeg_version(args.ffmpeg),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'set': args.set,
+            'rounds': args.rounds
+        },
+        'results': run_suite(fixtures, args.ffmpeg, args.rounds, transcode=not args.no_transcode)
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f"results written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('ffmpeg') != current['meta']['ffmpeg']:
+            print("warning: baseline was recorded with a different ffmpeg build", file=sys.stderr)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print("\n".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Generate deterministic media fixtures with ffmpeg's lavfi sources.
+
+Fixtures are written once per directory and reused; a fixture whose file is
+missing or whose recipe changed is regenerated. Bit-exact flags keep the files
+identical between runs of the same ffmpeg build.
+
+Usage:
+    python benchmarks/fixtures.py [--ffmpeg PATH] [--dir DIR] [--set quick|full]
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# name: (duration seconds, resolution, audio tracks, container)
+FIXTURES = {
+    'short_sd_1a': (10, '640x360', 1, 'mp4'),
+    'short_hd_2a': (10, '1280x720', 2, 'mkv'),
+    'medium_hd_1a': (60, '1280x720', 1, 'mp4'),
+    'medium_sd_4a': (60, '640x360', 4, 'mkv'),
+    'long_fhd_2a': (300, '1920x1080', 2, 'mkv'),
+    'long_sd_1a_mov': (300, '640x360', 1, 'mov')
+}
+
+SETS = {
+    'quick': ['short_sd_1a', 'short_hd_2a', 'medium_sd_4a'],
+    'full': list(FIXTURES)
+}
+
+LANGUAGES = ['eng', 'fra', 'deu', 'jpn']
+
+
+def fixture_command(ffmpeg_path, path, duration, resolution, audio_tracks):
+    """Build the ffmpeg command for one fixture: h264 test pattern plus `audio_tracks` AAC sine tones."""
+    command = [
+        ffmpeg_path, "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate=25:duration={duration}"
+    ]
+    for track in range(audio_tracks):
+        command.extend(["-f", "lavfi", "-i", f"sine=frequency={440 + 110 * track}:sample_rate=48000:duration={duration}"])
+    command.extend(["-map", "0:v"])
+    for track in range(audio_tracks):
+        command.extend(["-map", f"{track + 1}:a"])
+    command.extend([
+        "-c:v", "libx264", "-preset", "veryfast", "-g", "50", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k", "-ac", "2"
+    ])
+    for track in range(audio_tracks):
+        command.extend([f"-metadata:s:a:{track}", f"language={LANGUAGES[track % len(LANGUAGES)]}"])
+    command.extend(["-map_metadata", "-1", "-fflags", "+bitexact", "-flags:v", "+bitexact",
+                    "-flags:a", "+bitexact", "-threads", "1", path])
+    return command
+
+
+def ensure_fixtures(ffmpeg_path="ffmpeg", directory=DEFAULT_DIR, names=None):
+    """
+    Create any missing fixtures.
+
+    Returns:
+        dict: Fixture name to {'path', 'duration', 'resolution', 'audio_tracks', 'container'}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, 'index.json')
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    fixtures = {}
+    for name in names or list(FIXTURES):
+        duration, resolution, audio_tracks, container = FIXTURES[name]
+        path = os.path.join(directory, f"{name}.{container}")
+        command = fixture_command(ffmpeg_path, path, duration, resolution, audio_tracks)
+        recipe = hashlib.sha1(json.dumps(command[1:]).encode('utf-8')).hexdigest()
+        if index.get(name) != recipe or not os.path.isfile(path):
+            print(f"generating {name}...", file=sys.stderr)
+            subprocess.run(command, check=True)
+            index[name] = recipe
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=2)
+        fixtures[name] = {
+            'path': path, 'duration': duration, 'resolution': resolution,
+            'audio_tracks': audio_tracks, 'container': container
+        }
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    parser.add_argument("--set", default="full", choices=sorted(SETS))
+    args = parser.parse_args()
+    for name, fixture in ensure_fixtures(args.ffmpeg, args.dir, SETS[args.set]).items():
+        print(f"{name}: {fixture['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Check that segment-parallel encoding matches a single-pass encode.
+
+Encodes the video of each input twice, once in one pass and once in parallel
+segments, then compares duration, start time (A/V alignment) and frame count,
+and reports the wall time of both.
+
+Usage:
+    python benchmarks/validate_chunked.py [--codec h264] [--chunk-seconds 10] FILE...
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.api import extract  # noqa: E402
+from backend.chunked import compare_timing, probe_video_timing  # noqa: E402
+from backend.stream_info import ffprobe_path_for  # noqa: E402
+
+
+def frame_count(ffmpeg_path, path):
+    command = [
+        ffprobe_path_for(ffmpeg_path), "-v", "error", "-select_streams", "v:0", "-count_packets",
+        "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    try:
+        return int(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def encode(input_file, output, options):
+    start = time.perf_counter()
+    result = extract(input_file, {'video': output}, options)
+    if not result.ok:
+        raise SystemExit(f"encode failed: {result.error}")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--codec", default="h264", choices=["h264", "h265", "vp9"])
+    parser.add_argument("--chunk-seconds", default="10")
+    parser.add_argument("--chunk-workers", default="0")
+    args = parser.parse_args()
+
+    options = {
+        'ffmpeg_path': args.ffmpeg, 'video_codec': args.codec, 'smart_copy': 'false',
+        'chunk_seconds': args.chunk_seconds, 'chunk_workers': args.chunk_workers
+    }
+    failed = False
+    with tempfile.TemporaryDirectory() as work_dir:
+        for input_file in args.files:
+            name = os.path.splitext(os.path.basename(input_file))[0]
+            single = os.path.join(work_dir, f"{name}_single.mp4")
+            chunked = os.path.join(work_dir, f"{name}_chunked.mp4")
+
+            single_time = encode(input_file, single, dict(options, chunked_encoding='false'))
+            chunked_time = encode(input_file, chunked, dict(options, chunked_encoding='true'))
+
+            problems = compare_timing(
+                probe_video_timing(args.ffmpeg, single), probe_video_timing(args.ffmpeg, chunked)
+            )
+            single_frames = frame_count(args.ffmpeg, single)
+            chunked_frames = frame_count(args.ffmpeg, chunked)
+            if single_frames != chunked_frames:
+                problems.append(f"{chunked_frames} frames vs {single_frames}")
+
+            failed = failed or bool(problems)
+            print(f"{input_file}: single {single_time:.1f}s, chunked {chunked_time:.1f}s "
+                  f"({single_time / chunked_time:.2f}x) - {'; '.join(problems) or 'OK'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
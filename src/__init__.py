@@ -1 +1 @@
-# This file can be empty or include metadata about the package.
+# This file can be empty or include metadata about the package.
@@ -1 +1 @@
-# This file can be empty or used to initialize backend utilities.
+# This file can be empty or used to initialize backend utilities.
@@ -0,0 +1,389 @@
+"""
+Asyncio backend for running extractions inside an event loop, e.g. an ingest service.
+
+ffprobe and ffmpeg run via `asyncio.create_subprocess_exec`, so a job waiting
+on ffmpeg holds no OS thread; hundreds of queued or running jobs cost a task
+each. The job logic is `backend.extractor.JobRun`, the same core the threaded
+`run_job` drives for the CLI, batches and the GUI's `WorkerThread`. Short
+blocking steps (the capability probe, cache lookups, reading container
+headers) and chunked encoding, which manages its own ffmpeg processes, go to
+the loop's default executor.
+
+    async with AsyncExtractor(max_transcodes=4) as extractor:
+        handle = extractor.submit('in.mkv', {'audio': 'out/track.m4a'})
+        async for update in handle:
+            print(update['percent'], update['speed'])
+        result = await handle.result()
+
+Cancelling a handle (or the task awaiting it) terminates ffmpeg, waits up to
+TERMINATE_TIMEOUT for it to exit, kills it otherwise, and deletes its partial
+outputs. Nothing here imports PyQt5.
+"""
+import asyncio
+import logging
+import os
+import subprocess
+import time
+
+from backend.api import ExtractionResult, make_options
+from backend.capabilities import ffmpeg_capabilities, ffprobe_path_for
+from backend.extractor import JobRun
+from backend.ffmpeg_progress import ProgressParser, with_progress
+from backend.jobs import Job, JobStatus
+from backend.metrics import record_job
+from backend.options import Options
+from backend.sinks import Pipes
+from backend.stream_info import StreamInfo
+
+logger = logging.getLogger(__name__)
+
+# Seconds a child gets to exit after SIGTERM before it's killed
+TERMINATE_TIMEOUT = 5
+
+
+async def _terminate(process):
+    """Stop a child process, politely first."""
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), TERMINATE_TIMEOUT)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        logger.warning(f"ffmpeg (pid {process.pid}) ignored SIGTERM, killing it")
+        process.kill()
+        await process.wait()
+
+
+async def run_ffmpeg_async(command, duration=None, on_progress=None, max_log_lines=200, usage=None, sinks=()):
+    """
+    Coroutine version of `backend.ffmpeg_progress.run_ffmpeg`.
+
+    Cancelling the task terminates ffmpeg before CancelledError propagates.
+    `usage` gets the wall time only: the event loop reaps the child, so its
+    CPU times can't be collected (they're None, as on Windows). A sink
+    callback still runs on its own thread.
+
+    Returns:
+        tuple[int, str]: The exit code and the last stderr lines.
+    """
+    parser = ProgressParser(duration, max_log_lines)
+    start = time.perf_counter()
+    pipes = Pipes(sinks)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *with_progress(command), stdin=subprocess.DEVNULL,
+            stdout=pipes.stdout, stderr=subprocess.PIPE, pass_fds=pipes.pass_fds
+        )
+    finally:
+        pipes.started()
+    try:
+        async for line in process.stderr:
+            snapshot = parser.feed(line.decode('utf-8', errors='replace'))
+            if snapshot is not None and on_progress is not None:
+                on_progress(snapshot)
+        await process.wait()
+    except BaseException:
+        await asyncio.shield(_terminate(process))
+        raise
+    await asyncio.get_running_loop().run_in_executor(None, pipes.finish)
+    if usage is not None:
+        usage['wall'] = time.perf_counter() - start
+        usage['cpu_user'] = usage['cpu_system'] = None
+    return process.returncode, parser.error_text()
+
+
+async def probe_async(input_file, ffmpeg_path):
+    """
+    Coroutine version of `StreamInfo(input_file, ffmpeg_path)`.
+
+    The probe cache and the container header parser are tried in the executor;
+    ffprobe only runs, as a child of the loop, if both miss.
+    """
+    loop = asyncio.get_running_loop()
+    stream_info = StreamInfo(input_file, ffmpeg_path, probe=False)
+    if await loop.run_in_executor(None, stream_info.probe_local):
+        return stream_info
+
+    process = await asyncio.create_subprocess_exec(
+        *stream_info.ffprobe_command(ffprobe_path_for(ffmpeg_path)),
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except BaseException:
+        await asyncio.shield(_terminate(process))
+        raise
+    if process.returncode != 0:
+        logger.error(f"FFprobe failed: {stderr.decode('utf-8', errors='replace')}")
+    elif stream_info.load_ffprobe(stdout.decode('utf-8', errors='replace')):
+        await loop.run_in_executor(None, stream_info.probed, 'ffprobe')
+    return stream_info
+
+
+async def _in_executor(job, future):
+    """
+    Await work running in the executor for `job`.
+
+    A thread can't be interrupted: on cancellation, the job's cancel event
+    tells it to stop and it's waited for before CancelledError propagates,
+    so nothing is still writing when the partial outputs are deleted.
+    """
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        job.cancel_event.set()
+        while not future.done():
+            try:
+                await asyncio.wait((future,))
+            except asyncio.CancelledError:
+                pass  # cancelled again, still not safe to clean up
+        if not future.cancelled():
+            future.exception()  # failing on being stopped is expected; don't log it as unretrieved
+        raise
+
+
+async def run_job_async(job, on_progress=None, on_stats=None):
+    """
+    Coroutine version of `backend.extractor.run_job`, with the same arguments and errors.
+
+    Cancelling the task stops the job: running ffmpeg processes are terminated
+    and partial outputs deleted before CancelledError propagates.
+    """
+    loop = asyncio.get_running_loop()
+    run = JobRun(job, on_progress, on_stats)
+    try:
+        # Probed once per binary, then answered from memory
+        run.check(await loop.run_in_executor(None, ffmpeg_capabilities, run.ffmpeg_path))
+
+        probe_start = time.perf_counter()
+        stream_info = await probe_async(job.input_file, run.ffmpeg_path)
+        run.plan(stream_info, time.perf_counter() - probe_start)
+        if await loop.run_in_executor(None, run.restore_cached):
+            return
+
+        run.stage()
+        try:
+            for step, output in enumerate(list(run.chunked)):
+                await _in_executor(job, loop.run_in_executor(None, run.encode_chunked, step, output))
+            for step, desc, command, length, sinks in run.commands():
+                logger.info(f"Running {desc} command: {' '.join(command)}")
+                usage = {}
+                returncode, stderr_tail = await run_ffmpeg_async(
+                    command, length, run.progress_callback(step), usage=usage, sinks=sinks
+                )
+                run.command_finished(desc, usage, returncode, stderr_tail, length)
+            run.commit()
+        finally:
+            run.discard()
+    except asyncio.CancelledError:
+        job.cancel_event.set()
+        raise
+
+    await loop.run_in_executor(None, run.store_cached)
+    run.done()
+
+
+class AsyncJob:
+    """
+    Handle on a job submitted to an `AsyncExtractor`.
+
+    Iterate over it (`async for`) for progress updates until the job finishes;
+    updates are dicts with the overall 'percent' and ffmpeg's latest 'speed',
+    'fps', 'bitrate' and 'eta' (None until reported). A slow reader skips
+    intermediate updates rather than queueing them. Meant for one reader.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.task = None
+        self._stats = {}
+        self._latest = None
+        self._changed = asyncio.Event()
+
+    def __aiter__(self):
+        return self._updates()
+
+    async def _updates(self):
+        while True:
+            if self._latest is None and self.task.done():
+                return
+            if self._latest is None:
+                await self._changed.wait()
+                self._changed.clear()
+            update, self._latest = self._latest, None
+            if update is not None:
+                yield update
+
+    def _publish(self, percent=None):
+        if percent is not None:
+            self.job.progress = percent
+        self._latest = {
+            'percent': self.job.progress,
+            'speed': self._stats.get('speed'),
+            'fps': self._stats.get('fps'),
+            'bitrate': self._stats.get('bitrate'),
+            'eta': self._stats.get('eta')
+        }
+        self._changed.set()
+
+    def _on_stats(self, snapshot):
+        self._stats = snapshot
+
+    def _finished(self, task):
+        self._changed.set()
+
+    @property
+    def status(self):
+        return self.job.status
+
+    def done(self):
+        return self.task.done()
+
+    def cancel(self):
+        """Stop the job, or drop it if it's still waiting for a slot."""
+        self.job.cancel_event.set()
+        self.task.cancel()
+
+    async def result(self):
+        """
+        Wait for the job to finish.
+
+        Returns:
+            ExtractionResult: Never raises for ffmpeg failures or cancellation; check `result.ok`.
+        """
+        try:
+            await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            if not self.task.done():
+                raise  # the caller was cancelled, not the job
+        return ExtractionResult.from_job(self.job)
+
+
+class AsyncExtractor:
+    """
+    Run extraction jobs as asyncio tasks, limiting how many run at once.
+
+    Like the batch Scheduler, transcodes and stream copies are limited
+    separately (a share of the CPU cores and a number of jobs), each by an
+    asyncio.Semaphore; jobs over the limit wait as tasks without a process.
+    Must be used from a running event loop.
+    """
+
+    def __init__(self, max_transcodes=None, max_copies=None, options=None):
+        """
+        Args:
+            max_transcodes (int): Transcodes at once; defaults to the 'batch_cpu_share' of the cores.
+            max_copies (int): Stream copies at once; defaults to the 'batch_io_jobs' setting.
+            options (dict): Setting overrides applied to every job, under each job's own.
+        """
+        self.options = make_options(options)
+        if max_transcodes is None:
+            max_transcodes = int((os.cpu_count() or 1) * float(self.options.get('batch_cpu_share')))
+        if max_copies is None:
+            max_copies = int(self.options.get('batch_io_jobs'))
+        self.limits = {'transcode': max(1, max_transcodes), 'copy': max(1, max_copies)}
+        self._semaphores = None
+        self._handles = set()
+
+    def submit(self, input_file, outputs, options=None, video_stream=None, audio_streams=None, clips=None):
+        """
+        Queue one input file; takes the arguments of `backend.api.extract`.
+
+        Returns:
+            AsyncJob: Started right away, running as soon as a slot is free.
+        """
+        if self._semaphores is None:
+            # Created here so they belong to the running loop
+            self._semaphores = {kind: asyncio.Semaphore(limit) for kind, limit in self.limits.items()}
+        job_options = Options(self.options)
+        for key, value in (options or {}).items():
+            job_options.set(key, value)
+        job = Job(
+            input_file, outputs.get('video'), outputs.get('audio'), job_options.snapshot(),
+            video_stream, audio_streams, clips=clips
+        )
+        handle = AsyncJob(job)
+        handle.task = asyncio.ensure_future(self._run(handle))
+        handle.task.add_done_callback(handle._finished)
+        self._handles.add(handle)
+        handle.task.add_done_callback(lambda task: self._handles.discard(handle))
+        return handle
+
+    async def _run(self, handle):
+        job = handle.job
+        loop = asyncio.get_running_loop()
+
+        def on_progress(percent):
+            # Chunked encodes report from executor threads
+            loop.call_soon_threadsafe(handle._publish, percent)
+
+        try:
+            async with self._semaphores[job.kind]:
+                job.status = JobStatus.RUNNING
+                job.attempts = 1
+                job.started_at = time.time()
+                handle._publish(0)
+                await run_job_async(job, on_progress, handle._on_stats)
+            job.status = JobStatus.DONE
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+            raise
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            if job.started_at is not None:
+                await loop.run_in_executor(None, record_job, job, job.status)
+
+    async def join(self):
+        """Wait for every submitted job to finish."""
+        while self._handles:
+            await asyncio.gather(*(handle.result() for handle in list(self._handles)))
+
+    async def cancel_all(self):
+        """Cancel every unfinished job and wait for their processes to exit."""
+        for handle in list(self._handles):
+            handle.cancel()
+        await self.join()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            await self.cancel_all()
+        else:
+            await self.join()
+
+
+async def extract_async(input_file, outputs, options=None, video_stream=None, audio_streams=None,
+                        on_progress=None, clips=None):
+    """
+    Coroutine version of `backend.api.extract`, running one job outside any concurrency limit.
+
+    Returns:
+        ExtractionResult: Never raises for ffmpeg failures; check `result.ok`.
+    """
+    job = Job(
+        input_file, outputs.get('video'), outputs.get('audio'), make_options(options),
+        video_stream, audio_streams, clips=clips
+    )
+    job.status = JobStatus.RUNNING
+    job.attempts = 1
+    job.started_at = time.time()
+    try:
+        await run_job_async(job, on_progress)
+        job.status = JobStatus.DONE
+    except asyncio.CancelledError:
+        job.status = JobStatus.CANCELLED
+        raise
+    except Exception as e:
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+    finally:
+        job.finished_at = time.time()
+        record_job(job, job.status)
+    return ExtractionResult.from_job(job)
@@ -0,0 +1,39 @@
+import logging
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+from backend.audio_analysis import AnalysisError, analyze
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisThread(QThread):
+    """Analyse the waveform and loudness of audio streams off the GUI thread, one stream at a time."""
+
+    analyzed = pyqtSignal(str, int, object)  # input file, stream index, AudioAnalysis
+    failed = pyqtSignal(str, int, str)  # input file, stream index, error message
+
+    def __init__(self, input_file, ffmpeg_path, stream_indexes, duration=None, parent=None):
+        super().__init__(parent)
+        self.input_file = input_file
+        self.ffmpeg_path = ffmpeg_path
+        self.stream_indexes = stream_indexes
+        self.duration = duration
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        for index in self.stream_indexes:
+            if self.cancel_event.is_set():
+                return
+            try:
+                analysis = analyze(
+                    self.ffmpeg_path, self.input_file, index, self.duration, cancel_event=self.cancel_event
+                )
+            except (AnalysisError, OSError) as e:
+                if not self.cancel_event.is_set():
+                    logger.error(f"Audio analysis of stream {index} failed: {e}")
+                    self.failed.emit(self.input_file, index, str(e))
+                continue
+            self.analyzed.emit(self.input_file, index, analysis)
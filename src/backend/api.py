@@ -0,0 +1,123 @@
+"""
+Qt-free entry points for running extractions from scripts, services and the CLI.
+
+Nothing imported from here pulls in PyQt5.
+"""
+import time
+from backend.commands import audio_renditions
+from backend.extractor import rendition_paths, run_job
+from backend.jobs import Job, JobStatus
+from backend.metrics import record_job
+from backend.options import Options
+from backend.sinks import as_sink
+
+
+class ExtractionResult:
+    """Outcome of one extraction job."""
+
+    def __init__(self, input_file, outputs, status, error=None, elapsed=None, attempts=1, cached=False):
+        """
+        Args:
+            outputs (list[dict]): One entry per file with 'kind', 'stream', 'path',
+                'mode' ('copy' or 'transcode', None if the job never ran) and 'clip'
+                ('HH:MM:SS.mmm-HH:MM:SS.mmm', None for the whole input).
+            cached (bool): The outputs came from the output cache without running ffmpeg.
+        """
+        self.input_file = input_file
+        self.outputs = outputs
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+        self.attempts = attempts
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.status == JobStatus.DONE
+
+    @classmethod
+    def from_job(cls, job):
+        if job.outputs:
+            outputs = [
+                {
+                    'kind': output.kind, 'stream': output.stream,
+                    'path': str(output.sink) if output.sink is not None else output.path, 'mode': output.mode,
+                    'clip': str(output.clip) if output.clip else None
+                }
+                for output in job.outputs
+            ]
+        else:
+            # The job failed before its outputs were planned; report the requested ones
+            outputs = []
+            if job.output_video is not None:
+                path = str(as_sink(job.output_video) or job.output_video)
+                outputs.append({'kind': 'video', 'stream': job.video_stream, 'path': path, 'mode': None})
+            if as_sink(job.output_audio) is not None:
+                path = str(as_sink(job.output_audio))
+                outputs.append({'kind': 'audio', 'stream': job.audio_streams, 'path': path, 'mode': None})
+            elif job.output_audio is not None:
+                try:
+                    renditions = audio_renditions(job.options)
+                except ValueError:  # the invalid ladder is what failed the job
+                    renditions = [(job.options.get('audio_codec'), None)]
+                for _, _, path in rendition_paths(job.output_audio, renditions):
+                    outputs.append({'kind': 'audio', 'stream': job.audio_streams, 'path': path, 'mode': None})
+        return cls(job.input_file, outputs, job.status, job.error, job.elapsed, job.attempts, job.cached)
+
+    def to_dict(self):
+        return {
+            'input': self.input_file,
+            'outputs': self.outputs,
+            'status': self.status,
+            'ok': self.ok,
+            'error': self.error,
+            'elapsed': self.elapsed,
+            'attempts': self.attempts,
+            'cached': self.cached
+        }
+
+
+def make_options(options=None):
+    """Merge caller options over the defaults. Accepts a dict, `Options` or `Settings`."""
+    if options is None:
+        return Options().snapshot()
+    if hasattr(options, 'snapshot'):
+        return options.snapshot()
+    return Options(options).snapshot()
+
+
+def extract(input_file, outputs, options=None, video_stream=None, audio_streams=None, on_progress=None, clips=None):
+    """
+    Split one input file synchronously.
+
+    Args:
+        input_file (str): Path of the media file.
+        outputs (dict): Output paths keyed by 'video' and/or 'audio'; a missing key skips that output.
+            The audio path may contain {index}, {lang} and {title} placeholders. An output may
+            go to a pipe instead: '-' for stdout, a FIFO path, or a sink from `backend.sinks`.
+        options (dict): Setting overrides, e.g. {'audio_codec': 'flac'}.
+        video_stream (int): Input stream index to use for video.
+        audio_streams (int, list[int] or 'all'): Audio stream index(es) to extract.
+        on_progress (callable): Called with the overall percentage.
+        clips (list[Clip]): Sections to cut, each to its own files (see `backend.clips.parse_clips`);
+            output paths may contain {clip}. None extracts the whole input.
+
+    Returns:
+        ExtractionResult: Never raises for ffmpeg failures; check `result.ok`.
+    """
+    job = Job(
+        input_file, outputs.get('video'), outputs.get('audio'), make_options(options),
+        video_stream, audio_streams, clips=clips
+    )
+    job.status = JobStatus.RUNNING
+    job.attempts = 1
+    job.started_at = time.time()
+    try:
+        run_job(job, on_progress)
+        job.status = JobStatus.DONE
+    except Exception as e:
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+    job.finished_at = time.time()
+    record_job(job, job.status)
+    return ExtractionResult.from_job(job)
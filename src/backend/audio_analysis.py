@@ -0,0 +1,304 @@
+"""
+Waveform and loudness analysis of audio tracks, for previewing them before extraction.
+
+ffmpeg decodes one audio stream, downmixes it to mono at a low sample rate and
+writes two float channels to a pipe: the signal itself and a K-weighted copy
+(the ITU-R BS.1770 pre-filter, approximated with ffmpeg's highshelf and
+highpass filters). The pipe is read in fixed-size chunks and each chunk is
+reduced with vectorized NumPy operations, so memory stays bounded whatever the
+length of the track:
+
+- min/max peaks per waveform bucket,
+- sum of squares for the RMS level,
+- mean square per 100 ms of the K-weighted signal, from which the gated
+  integrated loudness and the maximum momentary loudness are computed at the end.
+
+Results are cached per input file (path, size, mtime) and stream. NumPy is an
+optional dependency (`pip install tracksep[analysis]`); check `available()`.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import subprocess
+import threading
+
+from backend.probe_cache import default_cache_dir
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the analysis or the shape of cached results changes
+ANALYSIS_FORMAT = 1
+
+SAMPLE_RATE = 8000
+BUCKETS = 800  # waveform columns
+CHUNK_SECONDS = 10  # audio read from the pipe per step; a multiple of the 100 ms loudness sub-block
+CHANNELS = 2  # signal, K-weighted signal
+
+# BS.1770 gating
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+SUB_BLOCK = 0.1  # seconds
+BLOCK_SUB_BLOCKS = 4  # 400 ms momentary blocks with 75% overlap
+
+
+class AnalysisError(Exception):
+    """ffmpeg couldn't decode the stream, or the analysis was cancelled."""
+
+
+def available():
+    """Check whether NumPy, which the analysis needs, is installed."""
+    return np is not None
+
+
+def _db(value):
+    return 20 * math.log10(value) if value > 0 else None
+
+
+def _lufs(mean_square):
+    return -0.691 + 10 * math.log10(mean_square) if mean_square > 0 else None
+
+
+class AudioAnalysis:
+    """Waveform peaks and level statistics of one audio stream."""
+
+    def __init__(self, minimums, maximums, duration, peak, rms, integrated, momentary_max):
+        """
+        Args:
+            minimums, maximums (list[float]): Lowest and highest sample of each waveform bucket (-1..1).
+            duration (float): Seconds of audio analysed.
+            peak (float): Sample peak in dBFS (of the low-rate signal), None for silence.
+            rms (float): RMS level in dBFS, None for silence.
+            integrated (float): Gated integrated loudness in LUFS, None if every block was gated out.
+            momentary_max (float): Loudest 400 ms block in LUFS, None for silence.
+        """
+        self.minimums = minimums
+        self.maximums = maximums
+        self.duration = duration
+        self.peak = peak
+        self.rms = rms
+        self.integrated = integrated
+        self.momentary_max = momentary_max
+
+    def summary(self):
+        """One-line description of the levels, e.g. 'peak -1.2 dBFS, RMS -20.3 dBFS, -23.0 LUFS'."""
+        def level(value, unit):
+            return f"{value:.1f} {unit}" if value is not None else "silent"
+
+        return (
+            f"peak {level(self.peak, 'dBFS')}, RMS {level(self.rms, 'dBFS')}, "
+            f"{level(self.integrated, 'LUFS')} integrated, {level(self.momentary_max, 'LUFS')} max momentary"
+        )
+
+    def to_dict(self):
+        return {
+            'minimums': [round(value, 4) for value in self.minimums],
+            'maximums': [round(value, 4) for value in self.maximums],
+            'duration': self.duration,
+            'peak': self.peak,
+            'rms': self.rms,
+            'integrated': self.integrated,
+            'momentary_max': self.momentary_max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['minimums'], data['maximums'], data['duration'], data['peak'],
+            data['rms'], data['integrated'], data['momentary_max']
+        )
+
+
+class _Accumulator:
+    """Reduces PCM chunks into waveform buckets and loudness sums as they arrive."""
+
+    def __init__(self, samples_per_bucket, buckets):
+        self.samples_per_bucket = samples_per_bucket
+        # Buckets no sample has reached yet stay infinite
+        self.minimums = np.full(buckets, np.inf, dtype=np.float32)
+        self.maximums = np.full(buckets, -np.inf, dtype=np.float32)
+        self.samples = 0
+        self.sum_squares = 0.0
+        self.peak = 0.0
+        self.sub_blocks = []  # mean square of the K-weighted signal per 100 ms, one array per chunk
+        self.sub_block = int(SAMPLE_RATE * SUB_BLOCK)
+        self.pending = np.zeros(0, dtype=np.float32)  # weighted samples short of a full sub-block
+
+    def add(self, frames):
+        signal = frames[:, 0]
+        if len(signal):
+            # Every sample goes to bucket offset // samples_per_bucket; reduce each run of equal buckets
+            buckets = (self.samples + np.arange(len(signal))) // self.samples_per_bucket
+            if buckets[-1] >= len(self.minimums):
+                grow = int(buckets[-1]) + 1 - len(self.minimums)
+                self.minimums = np.concatenate([self.minimums, np.full(grow, np.inf, dtype=np.float32)])
+                self.maximums = np.concatenate([self.maximums, np.full(grow, -np.inf, dtype=np.float32)])
+            starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+            np.minimum.at(self.minimums, buckets[starts], np.minimum.reduceat(signal, starts))
+            np.maximum.at(self.maximums, buckets[starts], np.maximum.reduceat(signal, starts))
+            self.samples += len(signal)
+            self.sum_squares += float(np.dot(signal.astype(np.float64), signal))
+            self.peak = max(self.peak, float(np.abs(signal).max()))
+
+        weighted = np.concatenate([self.pending, frames[:, 1]])
+        whole = len(weighted) // self.sub_block * self.sub_block
+        if whole:
+            squares = weighted[:whole].astype(np.float64) ** 2
+            self.sub_blocks.append(squares.reshape(-1, self.sub_block).mean(axis=1))
+        self.pending = weighted[whole:]
+
+    def result(self, buckets):
+        used = max(1, -(-self.samples // self.samples_per_bucket))
+        minimums, maximums = self.minimums[:used], self.maximums[:used]
+        if used > buckets:
+            # Longer than the probed duration said: fold neighbouring buckets together
+            factor = -(-used // buckets)
+            padded = factor * (-(-used // factor))
+            minimums = np.pad(minimums, (0, padded - used), mode='edge').reshape(-1, factor).min(axis=1)
+            maximums = np.pad(maximums, (0, padded - used), mode='edge').reshape(-1, factor).max(axis=1)
+        minimums = np.where(np.isfinite(minimums), minimums, 0)
+        maximums = np.where(np.isfinite(maximums), maximums, 0)
+
+        integrated = momentary_max = None
+        sub_blocks = np.concatenate(self.sub_blocks) if self.sub_blocks else np.zeros(0)
+        if len(sub_blocks) >= BLOCK_SUB_BLOCKS:
+            blocks = np.convolve(sub_blocks, np.ones(BLOCK_SUB_BLOCKS) / BLOCK_SUB_BLOCKS, mode='valid')
+            momentary_max = _lufs(float(blocks.max()))
+            with np.errstate(divide='ignore'):
+                loudness = -0.691 + 10 * np.log10(blocks)
+            gated = blocks[loudness > ABSOLUTE_GATE]
+            if len(gated):
+                relative_gate = _lufs(float(gated.mean())) + RELATIVE_GATE
+                with np.errstate(divide='ignore'):
+                    gated = gated[-0.691 + 10 * np.log10(gated) > relative_gate]
+                integrated = _lufs(float(gated.mean())) if len(gated) else None
+
+        return AudioAnalysis(
+            minimums.tolist(), maximums.tolist(), self.samples / SAMPLE_RATE, _db(self.peak),
+            _db(math.sqrt(self.sum_squares / self.samples)) if self.samples else None,
+            integrated, momentary_max
+        )
+
+
+def analysis_command(ffmpeg_path, input_file, stream_index):
+    """ffmpeg command writing the mono signal and its K-weighted copy as interleaved float32 to stdout."""
+    graph = (
+        f"[0:{stream_index}]aformat=channel_layouts=mono,aresample={SAMPLE_RATE},asplit=2[signal][weighting];"
+        "[weighting]highshelf=f=1681:g=4:t=q:w=0.71,highpass=f=38:t=q:w=0.5[weighted];"
+        "[signal][weighted]amerge=inputs=2[out]"
+    )
+    return [
+        ffmpeg_path, "-v", "error", "-nostdin", "-i", input_file, "-filter_complex", graph,
+        "-map", "[out]", "-f", "f32le", "-c:a", "pcm_f32le", "pipe:1"
+    ]
+
+
+def analyze_stream(ffmpeg_path, input_file, stream_index, duration=None, buckets=BUCKETS, cancel_event=None):
+    """
+    Decode one audio stream and measure its waveform and levels.
+
+    Args:
+        stream_index (int): Input stream index of the audio stream.
+        duration (float): Probed duration, used to size the waveform buckets; optional.
+        buckets (int): Waveform columns to return.
+        cancel_event (threading.Event): Stops ffmpeg when set.
+
+    Raises:
+        AnalysisError: If ffmpeg fails or the analysis is cancelled.
+    """
+    if np is None:
+        raise AnalysisError("Audio analysis needs NumPy (pip install numpy)")
+    expected = int((duration or 0) * SAMPLE_RATE)
+    samples_per_bucket = max(1, -(-expected // buckets)) if expected else SAMPLE_RATE
+    accumulator = _Accumulator(samples_per_bucket, buckets if expected else 1)
+    chunk_bytes = CHUNK_SECONDS * SAMPLE_RATE * CHANNELS * 4
+
+    process = subprocess.Popen(
+        analysis_command(ffmpeg_path, input_file, stream_index),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    # Drain stderr on the side so a chatty ffmpeg can't block on a full pipe
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    reader.start()
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise AnalysisError("Analysis cancelled")
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            usable = len(data) // (CHANNELS * 4) * CHANNELS * 4
+            accumulator.add(np.frombuffer(data[:usable], dtype='<f4').reshape(-1, CHANNELS))
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        reader.join()
+    if process.returncode != 0:
+        message = errors[0].decode('utf-8', 'replace').strip() if errors and errors[0] else ""
+        raise AnalysisError(f"ffmpeg could not decode stream {stream_index}: {message}")
+    return accumulator.result(buckets)
+
+
+class AnalysisCache:
+    """On-disk JSON cache of analyses, keyed by input file (path, size, mtime) and stream."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(default_cache_dir(), 'analysis')
+
+    def key(self, input_file, stream_index):
+        try:
+            stat = os.stat(input_file)
+        except OSError:
+            return None
+        identity = [
+            ANALYSIS_FORMAT, os.path.abspath(input_file), stat.st_size, stat.st_mtime_ns,
+            stream_index, SAMPLE_RATE, BUCKETS
+        ]
+        return hashlib.sha1(json.dumps(identity).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if key is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{key}.json"), 'r', encoding='utf-8') as f:
+                return AudioAnalysis.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, analysis):
+        if key is None:
+            return
+        path = os.path.join(self.directory, f"{key}.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(analysis.to_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache audio analysis: {e}")
+
+
+def cached_analysis(input_file, stream_index, cache=None):
+    """Return the cached analysis of a stream, or None."""
+    cache = cache or AnalysisCache()
+    return cache.get(cache.key(input_file, stream_index))
+
+
+def analyze(ffmpeg_path, input_file, stream_index, duration=None, cache=None, cancel_event=None):
+    """Like `analyze_stream`, but served from and stored in the analysis cache."""
+    cache = cache or AnalysisCache()
+    key = cache.key(input_file, stream_index)
+    analysis = cache.get(key)
+    if analysis is None:
+        analysis = analyze_stream(ffmpeg_path, input_file, stream_index, duration, cancel_event=cancel_event)
+        cache.put(key, analysis)
+    return analysis
@@ -0,0 +1,350 @@
+"""
+What the configured FFmpeg build can do: its version, encoders and muxers.
+
+A binary is probed once (`-version`, `-encoders`, `-muxers`) and the result is
+cached on disk keyed by its resolved path, size and mtime, so upgrading or
+replacing FFmpeg re-probes while every later start reads a small JSON file.
+The result picks the encoder used for each codec setting (libfdk_aac over the
+native AAC encoder, for instance), fills the codec lists of the settings
+dialog, and lets jobs the build can't run be rejected before they're queued
+instead of failing partway through a batch.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future
+
+from backend.commands import AUDIO_EXTENSIONS, audio_extension, audio_renditions
+from backend.probe_cache import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when the probe or the shape of cached results changes
+CAPABILITIES_FORMAT = 1
+
+VIDEO_CODECS = ('h264', 'h265', 'vp9')
+
+# Software encoders that can produce each codec setting, best first. Hardware
+# encoders (nvenc, vaapi, qsv...) are left out: being compiled in doesn't mean
+# the machine has the device.
+ENCODERS = {
+    'h264': ['libx264', 'libopenh264'],
+    'h265': ['libx265'],
+    'vp9': ['libvpx-vp9'],
+    'aac': ['libfdk_aac', 'aac'],
+    'mp3': ['libmp3lame', 'libshine'],
+    'flac': ['flac'],
+    'opus': ['libopus']
+}
+
+# Muxer ffmpeg picks for each output extension
+MUXERS = {
+    'mp4': 'mp4',
+    'm4a': 'ipod',
+    'mp3': 'mp3',
+    'flac': 'flac',
+    'opus': 'opus'
+}
+
+PROBE_TIMEOUT = 30
+
+_memory = {}  # (path, size, mtime) -> Capabilities
+_probing = {}  # (path, size, mtime) -> Future of the probe in flight
+_memory_lock = threading.Lock()
+_ffprobe_paths = {}
+
+
+class CapabilityError(Exception):
+    """The FFmpeg build can't produce what a job's settings ask for."""
+
+
+def resolve_binary(path):
+    """Absolute path of an executable given as a path or a name on PATH, or None if there's none."""
+    if not path:
+        return None
+    found = shutil.which(path)
+    return os.path.abspath(found) if found else None
+
+
+def ffprobe_path_for(ffmpeg_path):
+    """
+    Find the ffprobe that belongs to `ffmpeg_path`.
+
+    Looks next to the resolved ffmpeg binary first (keeping a suffix such as
+    '-6' or '.exe'), then on PATH. Only the file name is rewritten, so a build
+    installed under e.g. /opt/ffmpeg/bin is found. Falls back to the rewritten
+    name, which fails with a clear error when it's run.
+    """
+    if ffmpeg_path in _ffprobe_paths:
+        return _ffprobe_paths[ffmpeg_path]
+    directory, name = os.path.split(ffmpeg_path)
+    probe_name = name.replace('ffmpeg', 'ffprobe') if 'ffmpeg' in name else 'ffprobe'
+    candidates = []
+    resolved = resolve_binary(ffmpeg_path)
+    if resolved:
+        candidates.append(os.path.join(os.path.dirname(resolved), probe_name))
+    candidates.extend([os.path.join(directory, probe_name) if directory else probe_name, 'ffprobe'])
+    for candidate in candidates:
+        found = resolve_binary(candidate)
+        if found:
+            _ffprobe_paths[ffmpeg_path] = found
+            return found
+    return os.path.join(directory, probe_name)
+
+
+def _flag_lines(output, separator):
+    """The lines after the flag legend of `-encoders` / `-muxers` output."""
+    lines = output.splitlines()
+    for position, line in enumerate(lines):
+        if line.strip() == separator:
+            return lines[position + 1:]
+    return []
+
+
+def parse_encoders(output):
+    """Parse `ffmpeg -encoders` into {name: {'type', 'experimental', 'description'}}."""
+    encoders = {}
+    for line in _flag_lines(output, '------'):
+        parts = line.split(None, 2)
+        if len(parts) < 2 or len(parts[0]) < 4 or parts[0][0] not in 'VAS':
+            continue
+        flags, name = parts[0], parts[1]
+        encoders[name] = {
+            'type': {'V': 'video', 'A': 'audio', 'S': 'subtitle'}[flags[0]],
+            'experimental': flags[3] == 'X',
+            'description': parts[2] if len(parts) > 2 else ''
+        }
+    return encoders
+
+
+def parse_muxers(output):
+    """Parse `ffmpeg -muxers` into a set of muxer names."""
+    muxers = set()
+    for line in _flag_lines(output, '--'):
+        parts = line.split(None, 2)
+        if len(parts) >= 2 and 'E' in parts[0]:
+            muxers.update(parts[1].split(','))
+    return muxers
+
+
+class Capabilities:
+    """Version, encoders and muxers of one FFmpeg binary."""
+
+    def __init__(self, path, version, encoders, muxers):
+        """
+        Args:
+            path (str): Resolved path of the binary.
+            version (str): First line of `-version`.
+            encoders (dict): As returned by `parse_encoders`.
+            muxers (set[str]): Muxer names.
+        """
+        self.path = path
+        self.version = version
+        self.encoders = encoders
+        self.muxers = set(muxers)
+
+    def encoder_for(self, codec):
+        """
+        Encoder to use for a codec setting, or None if the build has none.
+
+        Prefers the first usable encoder of ENCODERS; an encoder name such as
+        'libopus' given as the codec is used as is.
+        """
+        for name in ENCODERS.get(codec, []) + [codec]:
+            encoder = self.encoders.get(name)
+            if encoder is not None and not encoder['experimental']:
+                return name
+        return None
+
+    def video_codecs(self):
+        """Video codec settings the build can encode, 'copy' first."""
+        return ['copy'] + [codec for codec in VIDEO_CODECS if self.encoder_for(codec)]
+
+    def audio_codecs(self):
+        """Audio codec settings the build can encode and write."""
+        return [
+            codec for codec in AUDIO_EXTENSIONS
+            if self.encoder_for(codec) and MUXERS.get(audio_extension(codec)) in self.muxers
+        ]
+
+    def job_problems(self, job):
+        """Why the build can't run `job`, as a list of messages (empty if it can)."""
+        return self.problems(job.options, job.output_video is not None, job.output_audio is not None)
+
+    def problems(self, options, video=True, audio=True):
+        """
+        Why the build can't run jobs with these settings, as a list of messages.
+
+        Args:
+            video (bool): Whether the jobs write a video file.
+            audio (bool): Whether they write audio files.
+        """
+        needed = []  # (codec, output extension)
+        if video:
+            needed.append((options.get('video_codec'), 'mp4'))
+        if audio:
+            try:
+                renditions = audio_renditions(options)
+            except ValueError as e:
+                return [str(e)]
+            needed.extend((codec, audio_extension(codec)) for codec, _ in renditions)
+
+        problems = []
+        for codec, extension in needed:
+            if codec != 'copy' and self.encoder_for(codec) is None:
+                wanted = " or ".join(ENCODERS.get(codec, [codec]))
+                problems.append(f"FFmpeg ({self.path}) has no {codec} encoder; it needs {wanted}")
+            muxer = MUXERS.get(extension)
+            if muxer is not None and muxer not in self.muxers:
+                problems.append(f"FFmpeg ({self.path}) can't write .{extension} files (no {muxer} muxer)")
+        return list(dict.fromkeys(problems))
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'version': self.version,
+            'encoders': self.encoders,
+            'muxers': sorted(self.muxers)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['path'], data['version'], data['encoders'], data['muxers'])
+
+
+def _run(path, *args):
+    result = subprocess.run([path, "-hide_banner"] + list(args), capture_output=True, text=True,
+                            timeout=PROBE_TIMEOUT)
+    return result.stdout
+
+
+def probe_capabilities(path):
+    """Run the binary at `path` to list what it supports. Returns None if it doesn't answer like FFmpeg."""
+    try:
+        version = subprocess.run([path, "-version"], capture_output=True, text=True, timeout=PROBE_TIMEOUT).stdout
+        encoders = parse_encoders(_run(path, "-encoders"))
+        muxers = parse_muxers(_run(path, "-muxers"))
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not probe FFmpeg at {path}: {e}")
+        return None
+    if not encoders:
+        logger.warning(f"{path} listed no encoders; not checking settings against it")
+        return None
+    return Capabilities(path, version.splitlines()[0] if version else '', encoders, muxers)
+
+
+def ffmpeg_capabilities(ffmpeg_path, cache_dir=None):
+    """
+    Capabilities of the FFmpeg at `ffmpeg_path` (a path or a name on PATH).
+
+    Probed at most once per binary version: kept in memory, and on disk until
+    the binary's size or mtime changes. Blocks while the binary is probed,
+    which takes up to three PROBE_TIMEOUTs; see `capabilities_future` to wait
+    without blocking.
+
+    Returns:
+        Capabilities: Or None if the binary can't be found or probed, in which
+        case callers skip their checks and let ffmpeg report errors itself.
+    """
+    return capabilities_future(ffmpeg_path, cache_dir, background=False).result()
+
+
+def capabilities_future(ffmpeg_path, cache_dir=None, background=True):
+    """
+    Like `ffmpeg_capabilities`, as a concurrent.futures.Future.
+
+    The future is already done when the binary was probed before. Otherwise
+    there's one probe per binary however many callers ask: later callers get
+    the future of the probe in flight.
+
+    Args:
+        background (bool): Probe on a thread of its own rather than the calling one.
+    """
+    future = Future()
+    path = resolve_binary(ffmpeg_path)
+    try:
+        stat = os.stat(os.path.realpath(path)) if path else None
+    except OSError:
+        stat = None
+    if stat is None:
+        future.set_result(None)
+        return future
+    identity = (path, stat.st_size, stat.st_mtime_ns)
+    with _memory_lock:
+        if identity in _memory:
+            future.set_result(_memory[identity])
+            return future
+        if identity in _probing:
+            return _probing[identity]
+        _probing[identity] = future
+
+    cache_file = os.path.join(
+        cache_dir or os.path.join(default_cache_dir(), 'capabilities'),
+        hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json'
+    )
+    if background:
+        threading.Thread(
+            target=_probe_into, args=(future, identity, cache_file), name="tracksep-capabilities", daemon=True
+        ).start()
+    else:
+        _probe_into(future, identity, cache_file)
+    return future
+
+
+def _probe_into(future, identity, cache_file):
+    capabilities = None
+    try:
+        capabilities = _load(cache_file, identity)
+        if capabilities is None:
+            capabilities = probe_capabilities(identity[0])
+            if capabilities is not None:
+                _store(cache_file, identity, capabilities)
+                logger.info(f"Probed {capabilities.version or identity[0]}: {len(capabilities.encoders)} encoders, "
+                            f"{len(capabilities.muxers)} muxers")
+    finally:
+        with _memory_lock:
+            _memory[identity] = capabilities
+            del _probing[identity]
+        future.set_result(capabilities)
+
+
+def _load(cache_file, identity):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != CAPABILITIES_FORMAT or data.get('identity') != list(identity):
+            return None
+        return Capabilities.from_dict(data['capabilities'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _store(cache_file, identity, capabilities):
+    data = {'format': CAPABILITIES_FORMAT, 'identity': list(identity), 'capabilities': capabilities.to_dict()}
+    tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not cache FFmpeg capabilities: {e}")
+
+
+def check_job(job, capabilities=None):
+    """
+    Raise CapabilityError if the job's FFmpeg can't produce its outputs.
+
+    Args:
+        capabilities (Capabilities): Of the job's ffmpeg; looked up if None.
+    """
+    capabilities = capabilities or ffmpeg_capabilities(job.options.get('ffmpeg_path'))
+    if capabilities is None:
+        return
+    problems = capabilities.job_problems(job)
+    if problems:
+        raise CapabilityError("; ".join(problems))
@@ -0,0 +1,38 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+from backend.capabilities import capabilities_future
+
+
+class CapabilitiesWatcher(QObject):
+    """Deliver the result of a background FFmpeg capability probe to the GUI thread."""
+
+    ready = pyqtSignal(object)  # Capabilities or None
+
+
+def when_probed(ffmpeg_path, callback, parent):
+    """
+    Call `callback(capabilities)` on the GUI thread once the FFmpeg at `ffmpeg_path` is probed.
+
+    Called right away if it already was; otherwise the probe (shared with any
+    other caller waiting for the same binary) runs in the background. Nothing
+    is called if `parent` is deleted first.
+
+    Returns:
+        bool: True if `callback` was called already.
+    """
+    future = capabilities_future(ffmpeg_path)
+    if future.done():
+        callback(future.result())
+        return True
+    watcher = CapabilitiesWatcher(parent)
+    watcher.ready.connect(callback)
+    watcher.ready.connect(watcher.deleteLater)
+
+    def emit(done):
+        # Runs on the probing thread; the connection queues the call to the GUI thread
+        try:
+            watcher.ready.emit(done.result())
+        except RuntimeError:
+            pass  # the parent, and the watcher with it, was deleted meanwhile
+
+    future.add_done_callback(emit)
+    return False
@@ -0,0 +1,239 @@
+"""
+Segment-parallel video encoding.
+
+The video stream is cut at keyframes with a stream copy, the segments are
+encoded by several ffmpeg processes at once, and the encoded segments are
+joined with the concat demuxer without re-encoding. Every segment starts on a
+keyframe of the source, so joining them reproduces the original timeline.
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.ffmpeg_progress import run_ffmpeg
+from backend.capabilities import ffprobe_path_for
+
+logger = logging.getLogger(__name__)
+
+CHUNKABLE_CODECS = ('h264', 'h265', 'vp9')
+
+# Largest duration difference accepted between the joined output and the source
+DURATION_TOLERANCE = 0.1
+
+
+class ChunkedEncodingError(Exception):
+    """Splitting, encoding or joining the segments failed."""
+
+
+def use_chunked(options, output):
+    """Check whether an output should be encoded in parallel segments."""
+    return (
+        options.get('chunked_encoding') == 'true'
+        and output.kind == 'video'
+        and output.codec in CHUNKABLE_CODECS
+        and output.clip is None  # clips are short, and splitting would lose the seek
+    )
+
+
+def worker_layout(options, cores=None):
+    """Return (parallel encoders, -threads per encoder) from the settings, sharing `cores` (all by default)."""
+    cores = cores or os.cpu_count() or 1
+    workers = int(options.get('chunk_workers') or 0)
+    if workers <= 0:
+        workers = max(1, cores // 4)
+    return workers, max(1, cores // workers)
+
+
+def probe_video_timing(ffmpeg_path, path):
+    """
+    Return (duration, start_time) of the first video stream in seconds.
+
+    Falls back to the container duration when the stream has none (e.g. Matroska).
+
+    Raises:
+        ChunkedEncodingError: If ffprobe can't be run or its output isn't a JSON report.
+    """
+    command = [
+        ffprobe_path_for(ffmpeg_path), "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=duration,start_time:format=duration",
+        "-of", "json", path
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except (OSError, ValueError) as e:
+        raise ChunkedEncodingError(f"Couldn't run ffprobe on {path}: {e}") from e
+    if result.returncode != 0:
+        raise ChunkedEncodingError(f"ffprobe failed on {path}: {result.stderr.strip()}")
+    try:
+        probe = json.loads(result.stdout)
+    except ValueError as e:
+        raise ChunkedEncodingError(f"Unreadable ffprobe output for {path}: {e}") from e
+    if not isinstance(probe, dict):
+        raise ChunkedEncodingError(f"Unreadable ffprobe output for {path}: not a JSON object")
+    streams = probe.get('streams') or [{}]
+
+    def number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    duration = number(streams[0].get('duration')) or number(probe.get('format', {}).get('duration'))
+    return duration, number(streams[0].get('start_time')) or 0.0
+
+
+def compare_timing(reference, candidate, tolerance=DURATION_TOLERANCE):
+    """
+    Compare two (duration, start_time) pairs.
+
+    Returns:
+        list[str]: Human-readable mismatches; empty when they agree.
+    """
+    problems = []
+    if reference[0] is None or candidate[0] is None:
+        problems.append("duration unknown")
+    elif abs(reference[0] - candidate[0]) > tolerance:
+        problems.append(f"duration {candidate[0]:.3f}s vs {reference[0]:.3f}s")
+    # A shifted start would put the video out of sync with the separately extracted audio
+    if abs(reference[1] - candidate[1]) > tolerance:
+        problems.append(f"start time {candidate[1]:.3f}s vs {reference[1]:.3f}s")
+    return problems
+
+
+def encode_chunked(ffmpeg_path, input_file, output, options, duration=None,
+                   on_progress=None, cancel_event=None, usage=None):
+    """
+    Encode one video output in parallel segments.
+
+    Args:
+        ffmpeg_path (str): The ffmpeg executable.
+        input_file (str): Source media file.
+        output (OutputSpec): The video output to produce.
+        options (dict): Job settings ('chunk_seconds', 'chunk_workers').
+        duration (float): Source duration, for progress reporting.
+        on_progress (callable): Called with this step's percentage (float).
+        cancel_event (threading.Event): Stops all ffmpeg processes when set.
+        usage (dict): Filled like `run_ffmpeg`'s, with the CPU time of all processes combined.
+
+    Raises:
+        ChunkedEncodingError: If any stage fails or the result doesn't line up with the source.
+    """
+    chunk_seconds = float(options.get('chunk_seconds') or 60)
+    workers, threads = worker_layout(options, output.threads)
+    start = time.perf_counter()
+    runs = []  # usage of every ffmpeg process
+
+    def run(command, *args, **kwargs):
+        runs.append({})
+        return run_ffmpeg(command, *args, usage=runs[-1], **kwargs)
+
+    work_dir = tempfile.mkdtemp(prefix='.tracksep-chunks-', dir=os.path.dirname(os.path.abspath(output.path)))
+
+    def report(percent):
+        if on_progress is not None:
+            on_progress(percent)
+
+    # Stops every ffmpeg process of this step, on job cancellation or when one segment fails
+    stop_event = threading.Event()
+    if cancel_event is not None:
+        def forward_cancel():
+            while not stop_event.is_set():
+                if cancel_event.wait(0.2):
+                    stop_event.set()
+        threading.Thread(target=forward_cancel, daemon=True).start()
+
+    def check(returncode, stderr_tail, stage):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ChunkedEncodingError(f"{stage} cancelled")
+        if returncode != 0:
+            raise ChunkedEncodingError(f"{stage} failed: {stderr_tail.strip()}")
+
+    try:
+        # 1. Cut the video stream at keyframes; the segment muxer only splits on keyframes when copying
+        video_map = f"0:{output.stream}" if output.stream is not None else "0:v:0"
+        split_command = [
+            ffmpeg_path, "-y", "-i", input_file, "-map", video_map, "-c", "copy", "-an",
+            "-f", "segment", "-segment_time", str(chunk_seconds), "-reset_timestamps", "1",
+            os.path.join(work_dir, "source_%05d.mkv")
+        ]
+        logger.info(f"Splitting video: {' '.join(split_command)}")
+        check(*run(
+            split_command, duration, lambda snapshot: report((snapshot['percent'] or 0) * 0.1),
+            cancel_event=stop_event
+        ), "Splitting")
+
+        segments = sorted(name for name in os.listdir(work_dir) if name.startswith("source_"))
+        if not segments:
+            raise ChunkedEncodingError("Splitting produced no segments")
+        logger.info(f"Encoding {len(segments)} segments with {workers} workers, {threads} threads each")
+
+        # 2. Encode the segments in parallel ffmpeg processes
+        segment_progress = [0.0] * len(segments)
+        lock = threading.Lock()
+
+        def encode(position):
+            source = os.path.join(work_dir, segments[position])
+            target = os.path.join(work_dir, f"encoded_{position:05d}.mkv")
+            command = (
+                [ffmpeg_path, "-y", "-i", source]
+                + output.codec_args() + ["-threads", str(threads), "-an", target]
+            )
+
+            def progress(snapshot):
+                with lock:
+                    segment_progress[position] = snapshot['percent'] or 0.0
+                    report(10 + 80 * sum(segment_progress) / (100 * len(segments)))
+
+            if stop_event.is_set():
+                return target
+            returncode, stderr_tail = run(command, chunk_seconds, progress, cancel_event=stop_event)
+            if returncode != 0 and not stop_event.is_set():
+                errors.append(f"segment {position}: {stderr_tail.strip()}")
+                stop_event.set()  # no point finishing the other segments
+            return target
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            encoded = list(pool.map(encode, range(len(segments))))
+        if cancel_event is not None and cancel_event.is_set():
+            raise ChunkedEncodingError("Encoding cancelled")
+        if errors:
+            raise ChunkedEncodingError(f"Encoding failed: {errors[0]}")
+
+        # 3. Join the encoded segments without re-encoding
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in encoded:
+                escaped = path.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        concat_command = [
+            ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-map", "0:v", "-c", "copy", output.path
+        ]
+        logger.info(f"Joining segments: {' '.join(concat_command)}")
+        check(*run(
+            concat_command, duration, lambda snapshot: report(90 + (snapshot['percent'] or 0) * 0.1),
+            cancel_event=stop_event
+        ), "Joining")
+
+        problems = compare_timing(
+            probe_video_timing(ffmpeg_path, input_file), probe_video_timing(ffmpeg_path, output.path)
+        )
+        if problems:
+            raise ChunkedEncodingError("Joined video doesn't match the source: " + ", ".join(problems))
+        report(100)
+    finally:
+        stop_event.set()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if usage is not None:
+            usage['wall'] = time.perf_counter() - start
+            usage['cpu_user'] = usage['cpu_system'] = None
+            if runs and all(run_usage.get('cpu_user') is not None for run_usage in runs):
+                usage['cpu_user'] = sum(run_usage['cpu_user'] for run_usage in runs)
+                usage['cpu_system'] = sum(run_usage['cpu_system'] for run_usage in runs)
@@ -0,0 +1,124 @@
+"""
+Time ranges for extracting only part of an input.
+
+Ranges are written as 'START-END' or 'START+DURATION', with times in seconds
+or [HH:]MM:SS[.mmm], e.g. '90-120', '1:30+30' or '01:02:03.5-01:02:10'.
+"""
+import re
+
+
+class ClipError(ValueError):
+    """A time or range couldn't be parsed, or a range is empty."""
+
+
+def parse_time(text):
+    """Convert '90', '1:30' or '00:01:30.5' to seconds."""
+    text = str(text).strip()
+    if not re.fullmatch(r'\d+(\.\d+)?|(\d+:){1,2}\d+(\.\d+)?', text):
+        raise ClipError(f"Invalid time: {text!r}")
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_time(seconds):
+    """Format seconds as HH:MM:SS.mmm, the form ffmpeg and the UI display."""
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}"
+
+
+class Clip:
+    """A section of the input: from `start` to `end` seconds (`end` None means to the end)."""
+
+    def __init__(self, start=0.0, end=None, duration=None):
+        if duration is not None:
+            if end is not None:
+                raise ClipError("Give either an end or a duration, not both")
+            end = start + duration
+        if start < 0 or (end is not None and end <= start):
+            raise ClipError(f"Empty time range: {format_time(start)} to {format_time(end or 0)}")
+        self.start = start
+        self.end = end
+
+    @property
+    def length(self):
+        """Length in seconds, or None when the clip runs to the end of the input."""
+        return None if self.end is None else self.end - self.start
+
+    def clamp_length(self, total):
+        """Length of the clip inside an input of `total` seconds (None if both are unknown)."""
+        if total is None:
+            return self.length
+        end = total if self.end is None else min(self.end, total)
+        return max(0.0, end - self.start)
+
+    def input_args(self):
+        """
+        Seek and limit options to put before '-i'.
+
+        Input seeking jumps straight to the nearest index entry instead of
+        decoding from the start. Transcoded streams are then decoded from that
+        point and trimmed to the exact time (ffmpeg's default -accurate_seek);
+        copied streams can't be trimmed without re-encoding and start on the
+        keyframe at or before `start`.
+        """
+        args = []
+        if self.start:
+            args.extend(["-ss", f"{self.start:.3f}"])
+        if self.end is not None:
+            args.extend(["-t", f"{self.length:.3f}"])
+        return args
+
+    def __eq__(self, other):
+        return isinstance(other, Clip) and (self.start, self.end) == (other.start, other.end)
+
+    def __hash__(self):
+        return hash((self.start, self.end))
+
+    def __str__(self):
+        end = format_time(self.end) if self.end is not None else "end"
+        return f"{format_time(self.start)}-{end}"
+
+    def __repr__(self):
+        return f"Clip({self.start!r}, {self.end!r})"
+
+
+def parse_clip(text):
+    """Parse 'START-END', 'START+DURATION' or 'START-' (to the end of the input)."""
+    text = text.strip()
+    match = re.fullmatch(r'([^-+]*)([-+])([^-+]*)', text)
+    if not match:
+        raise ClipError(f"Invalid time range: {text!r} (expected START-END or START+DURATION)")
+    start, separator, rest = (part.strip() for part in match.groups())
+    start = parse_time(start) if start else 0.0
+    if not rest:
+        if separator == '+':
+            raise ClipError(f"Missing duration in {text!r}")
+        return Clip(start)
+    if separator == '+':
+        return Clip(start, duration=parse_time(rest))
+    return Clip(start, parse_time(rest))
+
+
+def parse_clips(text):
+    """Parse a comma-separated list of ranges, e.g. '0:30-1:00, 5:00+30'. Empty text gives []."""
+    return [parse_clip(part) for part in text.split(',') if part.strip()]
+
+
+def clip_from_fields(start, end='', duration=''):
+    """
+    Build a clip from separate start/end/duration fields (empty strings are unset).
+
+    Returns:
+        Clip or None: None when all fields are empty.
+    """
+    start, end, duration = (str(value or '').strip() for value in (start, end, duration))
+    if not (start or end or duration):
+        return None
+    return Clip(
+        parse_time(start) if start else 0.0,
+        parse_time(end) if end else None,
+        parse_time(duration) if duration else None
+    )
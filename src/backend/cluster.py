@@ -0,0 +1,556 @@
+"""
+Run batch jobs on worker processes on other machines that see the same storage.
+
+The coordinator listens on a TCP address (host:port) or a Unix socket
+(unix:/path), and workers connect to it. Each worker connection is one job
+slot. Messages are JSON objects, one per line, and every message a worker
+sends gets exactly one reply:
+
+    hello      {version, worker, token}       -> welcome {heartbeat, lease_ttl} | error
+    lease      {wait}                         -> job {lease, ttl, job} | idle
+    heartbeat  {lease, progress}              -> ok | cancel | lost
+    result     {lease, status, error, ...}    -> ok | lost
+
+A job is handed out as a lease. The worker must heartbeat it at least every
+`lease_ttl` seconds. Otherwise, or when its connection drops, the lease
+expires and the job goes back to the queue for another worker. A result for
+an expired lease is answered with 'lost' and ignored. Jobs travel as the
+same spec the journal stores (input, outputs, settings, streams, clips,
+duration), so workers run exactly what a local `WorkerThread` would. Each
+worker uses its own ffmpeg binary and can map path prefixes when the shared
+storage is mounted somewhere else.
+
+On the coordinator side, `Coordinator.run_job` is a Scheduler runner. The
+batch keeps its queue, retries, journal and policies. It runs as many jobs
+at once as the connected workers have slots, so a job leaves the queue only
+when a worker is there to take it, and workers take them in the order the
+scheduler started them.
+"""
+import hmac
+import itertools
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+import uuid
+
+from backend.commands import OutputSpec
+from backend.concurrency import scheduler_from_options
+from backend.extractor import ExtractionError, run_job
+from backend.journal import job_from_spec, job_spec
+from backend.metrics import JobMetrics
+from backend.options import DEFAULTS
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+HEARTBEAT = 2.0  # seconds between worker heartbeats
+LEASE_TTL = 15.0  # a lease without a heartbeat for this long goes to another worker
+LEASE_WAIT = 10.0  # longest a lease request is held open when no job is queued
+MAX_LOSSES = 3  # leases a job may lose (worker crashed, disconnected) before it fails
+IDLE_TIMEOUT = 120.0  # the coordinator drops a connection silent for this long
+RECONNECT_DELAY = 2.0
+MAX_MESSAGE = 16 * 1024 * 1024
+
+# Metrics measured by the worker and carried over into the coordinator's JobMetrics
+REMOTE_METRICS = ('probe_seconds', 'probe_source', 'phases', 'bytes_read', 'media_seconds', 'cached')
+
+# Settings that describe the machine a job runs on: a worker uses its own or the defaults, never the coordinator's
+MACHINE_SETTINGS = ('ffmpeg_path', 'chunk_workers', 'output_cache', 'output_cache_mb')
+
+
+class ProtocolError(Exception):
+    """The other side sent something that isn't a valid message, or refused us."""
+
+
+def parse_address(text):
+    """
+    Parse 'host:port', '[::1]:port', ':port' (every interface) or 'unix:/path'.
+
+    Returns:
+        tuple | str: (host, port) for TCP, or the socket path for a Unix socket.
+    """
+    if text.startswith('unix:'):
+        return text[len('unix:'):]
+    host, separator, port = text.rpartition(':')
+    if not separator or not port.isdigit():
+        raise ValueError(f"Invalid address {text!r}; use host:port or unix:/path")
+    return host.strip('[]'), int(port)
+
+
+def format_address(address):
+    return f"unix:{address}" if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
+
+def map_path(path, path_map):
+    """Replace the first matching prefix of `path` from (prefix, replacement) pairs."""
+    if not path:
+        return path
+    for prefix, replacement in path_map:
+        prefix = prefix.rstrip('/\\')
+        if path == prefix or path.startswith(prefix + os.sep):
+            return replacement.rstrip('/\\') + path[len(prefix):]
+    return path
+
+
+class _Connection:
+    """One end of a line-delimited JSON connection."""
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode('utf-8') + b"\n")
+        self.wfile.flush()
+
+    def receive(self):
+        line = self.rfile.readline(MAX_MESSAGE)
+        if not line:
+            raise ConnectionError("Connection closed")
+        if not line.endswith(b"\n"):
+            raise ProtocolError("Message too long")
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            raise ProtocolError(f"Invalid message: {e}")
+        if not isinstance(message, dict) or 'type' not in message:
+            raise ProtocolError("Message without a type")
+        return message
+
+    def request(self, message):
+        """Send a message and wait for its reply."""
+        with self._lock:
+            self.send(message)
+            return self.receive()
+
+
+class _Task:
+    """A job waiting for or held by a worker."""
+
+    def __init__(self, job, order):
+        self.job = job
+        self.order = order  # position in the scheduler's start order
+        self.lease = None
+        self.worker = None
+        self.connection = None
+        self.expires = None
+        self.progress = 0
+        self.result = None
+        self.losses = 0
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.request.settimeout(IDLE_TIMEOUT)
+        self.server.coordinator._serve(_Connection(self.rfile, self.wfile), self.client_address)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None
+
+
+class Coordinator:
+    """Hands jobs to connected workers and waits for their results."""
+
+    def __init__(self, address, token=None, lease_ttl=LEASE_TTL, heartbeat=HEARTBEAT):
+        """
+        Args:
+            address (str): Where workers connect, 'host:port' or 'unix:/path'; port 0 picks a free one.
+            token (str): Shared secret workers must present; None to accept any worker.
+            lease_ttl (float): Seconds a lease lives without a heartbeat.
+            heartbeat (float): Seconds between heartbeats asked of workers.
+        """
+        self.address = parse_address(address)
+        self.token = token or None
+        self.lease_ttl = lease_ttl
+        self.heartbeat = heartbeat
+        self.scheduler = None
+        self._pending = []  # _Tasks waiting for a worker, leased lowest order first
+        self._order = itertools.count()
+        self._leases = {}  # lease id -> _Task
+        self._workers = {}  # connection -> worker name
+        self._condition = threading.Condition()
+        self._server = None
+        self._thread = None
+
+    @property
+    def listening_address(self):
+        """The address workers connect to, with the actual port when 0 was asked for."""
+        return format_address(self._server.server_address) if self._server else None
+
+    @property
+    def workers(self):
+        with self._condition:
+            return sorted(self._workers.values())
+
+    def start(self):
+        """Start accepting workers. Raises OSError if the address can't be bound."""
+        if isinstance(self.address, str):
+            if _UnixServer is None:
+                raise OSError("Unix sockets aren't supported on this platform")
+            if os.path.exists(self.address) and stat.S_ISSOCK(os.stat(self.address).st_mode):
+                os.remove(self.address)  # left over from a coordinator that didn't exit cleanly
+            self._server = _UnixServer(self.address, _Handler)
+        else:
+            if self.token is None and self.address[0] not in ('localhost', '127.0.0.1', '::1'):
+                logger.warning("Coordinator accepts workers from the network without a token")
+            self._server = _TCPServer(self.address, _Handler)
+        self._server.coordinator = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tracksep-coordinator", daemon=True)
+        self._thread.start()
+        logger.info(f"Coordinator listening on {self.listening_address}")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+            self._server = None
+        with self._condition:
+            self._condition.notify_all()
+
+    def attach(self, scheduler):
+        """Keep the scheduler's slots equal to the number of connected worker slots."""
+        self.scheduler = scheduler
+        self._capacity_changed()
+
+    def run_job(self, job, on_progress=None, on_stats=None):
+        """
+        Scheduler runner: queue `job` for the next free worker and wait for its result.
+
+        Raises:
+            ExtractionError: If the worker failed the job, the job was cancelled, or it was lost too often.
+        """
+        with self._condition:
+            task = _Task(job, next(self._order))
+            self._pending.append(task)
+            self._condition.notify_all()
+        reported = None
+        while True:
+            with self._condition:
+                if task.result is None and not job.cancelled:
+                    self._condition.wait(1.0)
+                result, progress = task.result, task.progress
+                if result is None:
+                    if job.cancelled:
+                        if task in self._pending:
+                            self._pending.remove(task)
+                        raise ExtractionError("Extraction Cancelled")
+                    if task.lease is not None and time.monotonic() > task.expires:
+                        self._lose(task, f"lease expired on {task.worker}")
+            if on_progress is not None and progress != reported:
+                reported = progress
+                on_progress(progress)
+            if result is not None:
+                break
+
+        self._apply_result(job, result)
+        if result['status'] != 'done':
+            raise ExtractionError(f"{result.get('error') or 'Failed'} (on {result.get('worker')})")
+
+    def _apply_result(self, job, result):
+        clips = {(clip.start, clip.end): clip for clip in job.clips}
+        job.outputs = [
+            OutputSpec(
+                output['kind'], output['path'], output['codec'], output['stream'], output['bitrate'],
+                output['description'], clips.get(tuple(output['clip'])) if output['clip'] else None,
+                encoder=output.get('encoder')
+            )
+            for output in result.get('outputs', [])
+        ]
+        job.cached = bool(result.get('cached'))
+        if job.duration is None:
+            job.duration = result.get('duration')
+        job.metrics = JobMetrics(job)
+        for name in REMOTE_METRICS:
+            if name in result.get('metrics', {}):
+                setattr(job.metrics, name, result['metrics'][name])
+
+    def _lose(self, task, reason):
+        """Take the lease back and requeue the task, or fail it once it was lost too often. Holds the lock."""
+        self._leases.pop(task.lease, None)
+        task.lease = task.connection = None
+        task.losses += 1
+        if task.job.cancelled:
+            pass  # run_job has given up on it already
+        elif task.losses > MAX_LOSSES:
+            task.result = {'status': 'failed', 'error': f"Lost {task.losses} times, last: {reason}",
+                           'worker': task.worker}
+        else:
+            logger.warning(f"Requeueing {task.job.input_file}: {reason}")
+            self._pending.append(task)  # still ahead of the tasks started after it
+        self._condition.notify_all()
+
+    def _capacity_changed(self):
+        scheduler = self.scheduler
+        if scheduler is None:
+            return
+        with self._condition:
+            slots = max(1, len(self._workers))  # a worker opens one connection per slot
+        # Any slot runs either kind, so one total limit; the policy then picks every job a worker gets
+        scheduler.set_max_jobs(slots)
+        for kind in scheduler.limits:
+            if scheduler.limits[kind] != slots:
+                scheduler.set_limit(kind, slots)
+
+    def _serve(self, connection, client_address):
+        """Answer one worker connection until it closes."""
+        try:
+            hello = connection.receive()
+            if hello['type'] != 'hello' or hello.get('version') != PROTOCOL_VERSION:
+                connection.send({'type': 'error', 'error': f"Expected hello, protocol {PROTOCOL_VERSION}"})
+                return
+            if self.token is not None and not hmac.compare_digest(str(hello.get('token') or ''), self.token):
+                connection.send({'type': 'error', 'error': "Wrong token"})
+                logger.warning(f"Rejected worker at {client_address}: wrong token")
+                return
+            name = str(hello.get('worker') or client_address)
+            connection.send({'type': 'welcome', 'heartbeat': self.heartbeat, 'lease_ttl': self.lease_ttl})
+        except (OSError, ProtocolError, KeyError) as e:
+            logger.warning(f"Bad handshake from {client_address}: {e}")
+            return
+
+        with self._condition:
+            self._workers[connection] = name
+        logger.info(f"Worker {name} connected")
+        self._capacity_changed()
+        try:
+            while self._server is not None:
+                message = connection.receive()
+                handler = getattr(self, f"_on_{message['type']}", None)
+                if handler is None:
+                    raise ProtocolError(f"Unknown message type {message['type']!r}")
+                connection.send(handler(connection, name, message))
+        except (OSError, ProtocolError, KeyError, TypeError) as e:
+            if not isinstance(e, ConnectionError):
+                logger.warning(f"Dropping worker {name}: {e}")
+        finally:
+            with self._condition:
+                del self._workers[connection]
+                for task in list(self._leases.values()):
+                    if task.connection is connection:
+                        self._lose(task, f"worker {name} disconnected")
+            logger.info(f"Worker {name} disconnected")
+            self._capacity_changed()
+
+    def _on_lease(self, connection, name, message):
+        deadline = time.monotonic() + min(float(message.get('wait') or 0), LEASE_WAIT)
+        with self._condition:
+            while not self._pending and self._server is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return {'type': 'idle'}
+                self._condition.wait(remaining)
+            if not self._pending:
+                return {'type': 'idle'}
+            task = min(self._pending, key=lambda task: task.order)
+            self._pending.remove(task)
+            if task.job.cancelled:
+                return {'type': 'idle'}  # run_job drops it; ask again
+            task.lease = uuid.uuid4().hex
+            task.worker = name
+            task.connection = connection
+            task.expires = time.monotonic() + self.lease_ttl
+            self._leases[task.lease] = task
+        logger.info(f"Leased {task.job.input_file} to {name}")
+        return {'type': 'job', 'lease': task.lease, 'ttl': self.lease_ttl, 'job': job_spec(task.job)}
+
+    def _on_heartbeat(self, connection, name, message):
+        with self._condition:
+            task = self._leases.get(message['lease'])
+            if task is None:
+                return {'type': 'lost'}
+            if task.job.cancelled:
+                del self._leases[task.lease]
+                return {'type': 'cancel'}
+            task.expires = time.monotonic() + self.lease_ttl
+            task.progress = int(message.get('progress') or 0)
+            self._condition.notify_all()
+        return {'type': 'ok'}
+
+    def _on_result(self, connection, name, message):
+        with self._condition:
+            task = self._leases.get(message['lease'])
+            if task is None:
+                return {'type': 'lost'}
+            if message['status'] == 'cancelled' and not task.job.cancelled:
+                self._lose(task, f"worker {name} stopped")  # shutting down; another worker takes it
+            else:
+                del self._leases[task.lease]
+                task.result = dict(message, worker=name)
+                self._condition.notify_all()
+        return {'type': 'ok'}
+
+
+def cluster_scheduler(coordinator, options, **kwargs):
+    """
+    Build a Scheduler that runs its jobs on the coordinator's workers.
+
+    The load of this machine says nothing about the workers, so the slots
+    follow the number of connected workers instead of adapting to it.
+    """
+    options = dict(options.snapshot() if hasattr(options, 'snapshot') else options)
+    options['adaptive_concurrency'] = 'false'
+    scheduler = scheduler_from_options(coordinator.run_job, options, **kwargs)
+    coordinator.attach(scheduler)
+    return scheduler
+
+
+class Worker:
+    """Runs jobs leased from a coordinator, one per slot, until stopped."""
+
+    def __init__(self, address, options=None, slots=1, token=None, path_map=(), name=None, runner=run_job):
+        """
+        Args:
+            address (str): The coordinator, 'host:port' or 'unix:/path'.
+            options (dict): Settings of this machine that replace the job's, e.g. {'ffmpeg_path': ...};
+                the MACHINE_SETTINGS it leaves out are replaced with their defaults.
+            slots (int): Jobs run at once, each over its own connection.
+            token (str): The coordinator's shared secret.
+            path_map (list[tuple[str, str]]): (coordinator prefix, local prefix) pairs for paths
+                on storage mounted elsewhere on this machine.
+            name (str): Shown in the coordinator's logs; host name and PID by default.
+            runner (callable): Runs a job, called as runner(job, on_progress).
+        """
+        self.address = parse_address(address)
+        self.options = {key: DEFAULTS[key] for key in MACHINE_SETTINGS}
+        self.options.update(options or {})
+        self.slots = max(1, slots)
+        self.token = token
+        self.path_map = list(path_map)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.runner = runner
+        self._jobs = {}  # slot -> running job
+        self._lock = threading.Lock()
+
+    def run(self, stop_event):
+        """Serve the coordinator until `stop_event` is set; jobs in flight are then cancelled and handed back."""
+        threads = [
+            threading.Thread(target=self._slot, args=(slot, stop_event), name=f"tracksep-worker-{slot}", daemon=True)
+            for slot in range(self.slots)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while not stop_event.wait(0.5):
+                pass
+        finally:
+            stop_event.set()
+            with self._lock:
+                for job in self._jobs.values():
+                    job.cancel_event.set()
+            for thread in threads:
+                thread.join(timeout=30)
+
+    def _connect(self):
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.address)
+        else:
+            sock = socket.create_connection((self.address[0] or 'localhost', self.address[1]), timeout=10)
+        sock.settimeout(LEASE_WAIT + 30)
+        return sock
+
+    def _slot(self, slot, stop_event):
+        name = f"{self.name}/{slot + 1}"
+        while not stop_event.is_set():
+            sock = None
+            try:
+                sock = self._connect()
+                connection = _Connection(sock.makefile('rb'), sock.makefile('wb'))
+                welcome = connection.request({
+                    'type': 'hello', 'version': PROTOCOL_VERSION, 'worker': name, 'token': self.token
+                })
+                if welcome['type'] != 'welcome':
+                    raise ProtocolError(welcome.get('error') or "Refused by the coordinator")
+                logger.info(f"{name} connected to {format_address(self.address)}")
+                while not stop_event.is_set():
+                    reply = connection.request({'type': 'lease', 'wait': LEASE_WAIT})
+                    if reply['type'] == 'job':
+                        self._run_lease(slot, connection, reply, welcome.get('heartbeat', HEARTBEAT))
+            except ProtocolError as e:
+                logger.error(f"{name}: {e}")
+                stop_event.set()
+            except (OSError, KeyError) as e:
+                if not stop_event.is_set():
+                    logger.warning(f"{name}: lost the coordinator ({e}); reconnecting")
+                    stop_event.wait(RECONNECT_DELAY)
+            finally:
+                if sock is not None:
+                    sock.close()
+
+    def _run_lease(self, slot, connection, lease, heartbeat):
+        spec = dict(lease['job'])
+        for key in ('input', 'output_video', 'output_audio'):
+            spec[key] = map_path(spec[key], self.path_map)
+        spec['options'] = dict(spec['options'], **self.options)
+        job = job_from_spec(spec)
+        job.attempts = 1
+        job.started_at = time.time()
+        with self._lock:
+            self._jobs[slot] = job
+        logger.info(f"Running {job.input_file}")
+
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(heartbeat):
+                try:
+                    reply = connection.request({'type': 'heartbeat', 'lease': lease['lease'], 'progress': job.progress})
+                except (OSError, ProtocolError) as e:
+                    reply = {'type': 'lost', 'error': str(e)}
+                if reply['type'] != 'ok':
+                    logger.warning(f"Stopping {job.input_file}: the coordinator said {reply['type']}")
+                    job.cancel_event.set()
+                    return
+
+        def on_progress(percent):
+            job.progress = percent
+
+        beater = threading.Thread(target=beat, name="tracksep-heartbeat", daemon=True)
+        beater.start()
+        error = None
+        try:
+            self.runner(job, on_progress)
+            status = 'done'
+        except Exception as e:
+            status = 'cancelled' if job.cancelled else 'failed'
+            error = str(e)
+            logger.error(f"{job.input_file} failed: {e}")
+        finally:
+            done.set()
+            beater.join()
+            with self._lock:
+                self._jobs.pop(slot, None)
+
+        reverse_map = [(local, remote) for remote, local in self.path_map]
+        metrics = job.metrics.to_dict() if job.metrics is not None else {}
+        connection.request({
+            'type': 'result', 'lease': lease['lease'], 'status': status, 'error': error,
+            'cached': job.cached, 'duration': job.duration,
+            'outputs': [
+                {
+                    'kind': output.kind, 'path': map_path(output.path, reverse_map), 'codec': output.codec,
+                    'stream': output.stream, 'bitrate': output.bitrate, 'description': output.description,
+                    'clip': [output.clip.start, output.clip.end] if output.clip else None,
+                    'encoder': output.encoder
+                }
+                for output in job.outputs
+            ],
+            'metrics': {name: metrics[name] for name in REMOTE_METRICS if name in metrics}
+        })
@@ -0,0 +1,368 @@
+import os
+import re
+
+# Output container used for each audio codec
+AUDIO_EXTENSIONS = {
+    'aac': 'm4a',
+    'mp3': 'mp3',
+    'flac': 'flac',
+    'opus': 'opus'
+}
+
+
+def audio_extension(audio_codec):
+    """Return the file extension (without dot) for an audio codec."""
+    return AUDIO_EXTENSIONS.get(audio_codec, 'm4a')
+
+
+# Codec name ffprobe reports for the streams each setting produces
+SOURCE_CODECS = {
+    'h264': 'h264',
+    'h265': 'hevc',
+    'vp9': 'vp9',
+    'aac': 'aac',
+    'mp3': 'mp3',
+    'flac': 'flac',
+    'opus': 'opus'
+}
+
+# Target bitrate of codecs encoded with a fixed bitrate rather than a quality level
+VIDEO_BITRATES = {
+    'vp9': '2M'
+}
+
+LOSSLESS_CODECS = {'flac'}
+
+# Allow for VBR sources whose average sits slightly above the target
+BITRATE_TOLERANCE = 1.1
+
+
+def parse_bitrate(value):
+    """Convert '192k' / '2M' / '128000' to bits per second, or None."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:].lower(), 1)
+    if multiplier != 1:
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        return None
+
+
+def _source_matches(stream, requested_codec, target_bitrate=None):
+    """Check whether a probed stream already satisfies the requested codec and bitrate."""
+    if stream is None or SOURCE_CODECS.get(requested_codec) != stream.get('codec'):
+        return False
+    if requested_codec in LOSSLESS_CODECS or target_bitrate is None:
+        return True
+    # Re-encoding down to a higher bitrate can't add quality back. An unknown
+    # bitrate (often unreported for MKV streams) may be far above the target.
+    source_bitrate = parse_bitrate(stream.get('bit_rate'))
+    return source_bitrate is not None and source_bitrate <= target_bitrate * BITRATE_TOLERANCE
+
+
+def effective_video_codec(video_codec, stream):
+    """Return 'copy' when the source video stream already is `video_codec`, else `video_codec`."""
+    if video_codec != 'copy' and _source_matches(stream, video_codec, parse_bitrate(VIDEO_BITRATES.get(video_codec))):
+        return 'copy'
+    return video_codec
+
+
+def effective_audio_codec(audio_codec, audio_bitrate, stream):
+    """Return 'copy' when the source audio stream already is `audio_codec` at or below `audio_bitrate`."""
+    if stream is None or str(stream.get('sample_rate', '?')) in ('?', '0'):
+        return audio_codec  # incomplete probe, don't trust it
+    if audio_codec != 'copy' and _source_matches(stream, audio_codec, parse_bitrate(audio_bitrate)):
+        return 'copy'
+    return audio_codec
+
+
+def encoder_name(codec, encoder=None):
+    """
+    Value for -c:v / -c:a: the chosen encoder, else the ffmpeg codec name of the
+    setting (e.g. 'hevc' for 'h265'), which lets ffmpeg pick its default encoder.
+    """
+    return encoder or SOURCE_CODECS.get(codec, codec)
+
+
+def video_codec_args(video_codec, encoder=None):
+    args = ["-c:v", encoder_name(video_codec, encoder)]
+    if video_codec == 'h265':  # Special case for h265
+        args.extend(["-preset", "medium", "-crf", "28"])  # Example parameters
+    elif video_codec == 'h264':  # Special case for h264
+        args.extend(["-preset", "medium", "-crf", "23"])  # Example parameters
+    elif video_codec == 'vp9':  # Special case for vp9
+        args.extend(["-b:v", VIDEO_BITRATES['vp9']])  # Example parameters
+    return args
+
+
+def audio_codec_args(audio_codec, audio_bitrate, encoder=None):
+    args = ["-c:a", encoder_name(audio_codec, encoder)]
+    if audio_codec in ['aac', 'mp3', 'opus']:  # bitrate only applies to certain codecs
+        args.extend(["-b:a", audio_bitrate])
+    return args
+
+
+def parse_audio_ladder(value):
+    """
+    Parse an audio ladder setting such as 'aac:192k, mp3:320k, flac'.
+
+    Returns:
+        list[tuple[str, str]]: (codec, bitrate) of each rendition; the bitrate is
+        None where it was left out. Empty for an empty setting.
+
+    Raises:
+        ValueError: On an unknown codec or a repeated rendition.
+    """
+    renditions = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        codec, _, bitrate = item.partition(':')
+        codec, bitrate = codec.strip().lower(), bitrate.strip() or None
+        if codec not in AUDIO_EXTENSIONS:
+            raise ValueError(f"Unknown audio codec in ladder: {codec!r} (use {', '.join(AUDIO_EXTENSIONS)})")
+        if bitrate is not None and parse_bitrate(bitrate) is None:
+            raise ValueError(f"Invalid bitrate in ladder: {bitrate!r}")
+        if (codec, bitrate) in renditions:
+            raise ValueError(f"Audio ladder lists {item} twice")
+        renditions.append((codec, bitrate))
+    return renditions
+
+
+def audio_renditions(options):
+    """(codec, bitrate) of every audio output per track: the ladder if one is set, else the audio codec."""
+    default_bitrate = options.get('audio_bitrate')
+    ladder = parse_audio_ladder(options.get('audio_ladder'))
+    if not ladder:
+        return [(options.get('audio_codec'), default_bitrate)]
+    renditions = []
+    for codec, bitrate in ladder:
+        rendition = (codec, None if codec in LOSSLESS_CODECS else bitrate or default_bitrate)
+        if rendition not in renditions:  # 'aac' and 'aac:192k' are the same with a 192k default
+            renditions.append(rendition)
+    return renditions
+
+
+class OutputSpec:
+    """One ffmpeg output group: which input stream goes to which file, with which codec."""
+
+    def __init__(self, kind, path, codec, stream=None, bitrate=None, description=None, clip=None, threads=None,
+                 encoder=None, sink=None, requested_codec=None):
+        """
+        Args:
+            kind (str): 'video' or 'audio'.
+            path (str): Output file.
+            codec (str): Setting value such as 'copy', 'h264' or 'aac'.
+            stream (int): Input stream index, or None for ffmpeg's default choice.
+            bitrate (str): Audio bitrate, e.g. '192k'.
+            description (str): Label used in logs and error messages.
+            clip (Clip): Section of the input to extract, or None for all of it.
+            threads (int): Encoder threads for a video transcode, or None for ffmpeg's default.
+            encoder (str): FFmpeg encoder for a transcode, e.g. 'libfdk_aac'; None for the codec's default.
+            sink (PipeSink): Pipe the output goes to instead of a file (see `backend.sinks`);
+                `path` is then the sink's url.
+            requested_codec (str): The codec setting before smart copy replaced it with 'copy',
+                which picks the container; defaults to `codec`.
+        """
+        self.kind = kind
+        self.path = path
+        self.codec = codec
+        self.stream = stream
+        self.bitrate = bitrate
+        self.description = description or kind.capitalize()
+        self.clip = clip
+        self.threads = threads
+        self.encoder = encoder
+        self.sink = sink
+        self.requested_codec = requested_codec or codec
+
+    @property
+    def mode(self):
+        return 'copy' if self.codec == 'copy' else 'transcode'
+
+    def codec_args(self):
+        """The codec options of this output (-c:v / -c:a and their settings)."""
+        if self.kind == 'video':
+            return video_codec_args(self.codec, self.encoder)
+        return audio_codec_args(self.codec, self.bitrate, self.encoder)
+
+    def args(self, overwrite=False, input_index=None):
+        """
+        Build the output group (maps, codec options, filename).
+
+        Args:
+            input_index (int): The ffmpeg input to read from when the command has
+                several (one per clip); None for a single-input command.
+        """
+        args = []
+        if self.stream is not None:
+            args.extend(["-map", f"{input_index or 0}:{self.stream}"])
+        elif input_index is not None:
+            # ffmpeg's default stream choice would look at every input
+            args.extend(["-map", f"{input_index}:{'v' if self.kind == 'video' else 'a'}:0"])
+        if self.kind == 'video':
+            args.extend(self.codec_args())
+            if self.threads and self.codec != 'copy':
+                args.extend(["-threads", str(self.threads)])
+            args.append("-an")
+        else:
+            args.append("-vn")
+            args.extend(self.codec_args())
+        if self.sink is not None:
+            args.extend(self.sink.format_args(self))
+        if overwrite:
+            args.append("-y")
+        args.append(self.path)
+        return args
+
+
+class _KeepMissing(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+def output_paths(input_file, output_folder, video_template, audio_template, audio_codec):
+    """
+    Build the video and audio output paths for an input from the filename templates.
+
+    An empty `output_folder` writes next to the input file. Per-track placeholders
+    in the audio template ({index}, {lang}, {title}) are left for `track_output_path`,
+    and {clip} for `clip_output_path`.
+    """
+    input_filename = os.path.splitext(os.path.basename(input_file))[0]
+    output_folder = output_folder or os.path.dirname(input_file)
+    output_video = os.path.join(
+        output_folder,
+        f"{video_template.format_map(_KeepMissing(filename=input_filename))}.mp4"
+    )
+    output_audio = os.path.join(
+        output_folder,
+        f"{audio_template.format_map(_KeepMissing(filename=input_filename))}.{audio_extension(audio_codec)}"
+    )
+    return output_video, output_audio
+
+
+CLIP_PLACEHOLDER = '{clip}'
+
+
+def clip_output_path(path_template, position, multiple):
+    """
+    Fill the {clip} placeholder (1-based clip number) of an output path.
+
+    When several clips are cut from one input and the template has no {clip},
+    '_clip{n}' is appended so the clips don't overwrite each other.
+    """
+    if multiple and CLIP_PLACEHOLDER not in path_template:
+        root, extension = os.path.splitext(path_template)
+        path_template = f"{root}_clip{CLIP_PLACEHOLDER}{extension}"
+    return path_template.replace(CLIP_PLACEHOLDER, str(position + 1))
+
+
+def partial_path(path, tag):
+    """
+    Hidden temporary name to write `path` under until it's complete.
+
+    Keeps the extension so ffmpeg picks the same muxer, and lives in the same
+    folder so the final rename is atomic.
+    """
+    directory, name = os.path.split(path)
+    root, extension = os.path.splitext(name)
+    return os.path.join(directory, f".{root}.{tag}.partial{extension}")
+
+
+TRACK_PLACEHOLDERS = ('{index}', '{lang}', '{title}')
+
+
+def _filename_safe(text):
+    return re.sub(r'[\\/:*?"<>|]+', '_', text).strip()
+
+
+def track_output_path(path_template, stream, position, multiple):
+    """
+    Fill the per-track placeholders of an audio output path.
+
+    Args:
+        path_template (str): Output path that may contain {index}, {lang} and {title}.
+        stream (dict): The probed audio stream, or None if unknown.
+        position (int): Position of the track among the selected ones.
+        multiple (bool): Whether several tracks are extracted. Templates without any
+            placeholder then get '_{index}' appended so outputs don't overwrite each other.
+    """
+    if multiple and not any(placeholder in path_template for placeholder in TRACK_PLACEHOLDERS):
+        root, extension = os.path.splitext(path_template)
+        path_template = f"{root}_{{index}}{extension}"
+
+    stream = stream or {}
+    index = stream.get('index', position)
+    values = {
+        '{index}': str(index),
+        '{lang}': _filename_safe(stream.get('language') or 'und'),
+        '{title}': _filename_safe(stream.get('title') or f"track{position + 1}")
+    }
+    # Plain replacement: the input filename is already in the path and may contain braces
+    for placeholder, value in values.items():
+        path_template = path_template.replace(placeholder, value)
+    return path_template
+
+
+def job_kind(outputs):
+    """'transcode' if any of `outputs` is encoded (video or audio), 'copy' if every one is a stream copy."""
+    return 'transcode' if any(output.mode == 'transcode' for output in outputs) else 'copy'
+
+
+def codec_path(outputs):
+    """Short label of how a job's outputs are produced, e.g. 'audio:aac+video:copy'."""
+    return "+".join(sorted({f"{output.kind}:{output.codec}" for output in outputs}))
+
+
+def can_single_pass(outputs):
+    """
+    Check whether all outputs can be produced by one ffmpeg process.
+
+    Codec options are scoped to the output group that follows them, so
+    mixing a copied video stream with transcoded audio streams is fine.
+    The only combination ffmpeg can't express is two groups writing the
+    same file.
+    """
+    paths = [os.path.abspath(output.path) for output in outputs]
+    return len(paths) == len(set(paths))
+
+
+def build_commands(ffmpeg_path, input_file, outputs, single_pass=True):
+    """
+    Build the ffmpeg command(s) for one extraction job.
+
+    Args:
+        outputs (list[OutputSpec]): Every file to write.
+
+    Returns:
+        list[tuple[str, list[str]]]: (description, command) pairs to run in order.
+        In single-pass mode this is one command that demuxes the input once and
+        writes every output; otherwise one command per output.
+    """
+    if single_pass and can_single_pass(outputs):
+        # One input per distinct clip, each seeking on its own, so N clips still take one process
+        clips = []
+        for output in outputs:
+            if output.clip not in clips:
+                clips.append(output.clip)
+        command = [ffmpeg_path, "-y"]
+        for clip in clips:
+            command.extend((clip.input_args() if clip else []) + ["-i", input_file])
+        for output in outputs:
+            command.extend(output.args(input_index=clips.index(output.clip) if len(clips) > 1 else None))
+        description = "+".join(output.description for output in outputs)
+        return [(description, command)]
+
+    return [
+        (
+            output.description,
+            [ffmpeg_path] + (output.clip.input_args() if output.clip else []) + ["-i", input_file]
+            + output.args(overwrite=output.kind == 'audio' or output.sink is not None)
+        )
+        for output in outputs
+    ]
@@ -0,0 +1,231 @@
+"""
+Adaptive batch concurrency: grow or shrink the scheduler's slots from measured load.
+
+Every few seconds the controller samples CPU use, disk throughput and the
+speed factor of each running ffmpeg. Transcode slots are added while the CPU
+has headroom and the combined speed keeps improving, and removed when the CPU
+is saturated or an extra job made everything slower. Copy slots follow disk
+throughput the same way. Limits never leave [1, operator cap]; the number of
+`-threads` handed to new transcodes splits the cores between them.
+
+CPU and disk figures come from /proc on Linux (no extra dependency); elsewhere
+the load average stands in for CPU use and copy slots stay where they are.
+"""
+import logging
+import os
+import threading
+import time
+
+from backend.estimates import CostEstimator
+from backend.jobs import JobStatus, Scheduler
+from backend.metrics import default_recorder
+
+logger = logging.getLogger(__name__)
+
+# CPU busy fraction above which transcode slots are removed, and below which they may be added
+CPU_HIGH = 0.95
+CPU_TARGET = 0.85
+# A slot added must raise the combined speed (or disk throughput) by this much to stay
+MIN_GAIN = 1.05
+# Samples to wait after undoing a change before trying it again
+COOLDOWN = 6
+
+
+class LoadSampler:
+    """Measures CPU use and disk throughput between successive calls to `sample`."""
+
+    def __init__(self):
+        self._cpu = self._read_cpu()
+        self._disk = self._read_disk()
+        self._time = time.monotonic()
+
+    def sample(self):
+        """
+        Returns:
+            dict: 'cpu' (busy fraction 0-1) and 'disk' (bytes/s read and written),
+            each None when it can't be measured on this system.
+        """
+        now = time.monotonic()
+        cpu, disk = self._read_cpu(), self._read_disk()
+        elapsed = max(now - self._time, 1e-6)
+        result = {'cpu': None, 'disk': None}
+        if cpu is not None and self._cpu is not None:
+            busy, total = cpu[0] - self._cpu[0], cpu[1] - self._cpu[1]
+            result['cpu'] = busy / total if total > 0 else None
+        elif hasattr(os, 'getloadavg'):
+            result['cpu'] = min(1.0, os.getloadavg()[0] / (os.cpu_count() or 1))
+        if disk is not None and self._disk is not None:
+            result['disk'] = (disk - self._disk) / elapsed
+        self._cpu, self._disk, self._time = cpu, disk, now
+        return result
+
+    @staticmethod
+    def _read_cpu():
+        """(busy, total) jiffies from the aggregate line of /proc/stat, or None."""
+        try:
+            with open('/proc/stat', 'r') as f:
+                fields = [int(value) for value in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+        total = sum(fields[:8])  # guest time is already counted in user
+        return total - idle, total
+
+    @staticmethod
+    def _read_disk():
+        """Bytes read and written by all whole disks since boot, from /proc/diskstats, or None."""
+        try:
+            with open('/proc/diskstats', 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        sectors = 0
+        for line in lines:
+            fields = line.split()
+            # Partitions would count their disk's traffic twice; /sys/block only lists whole disks
+            if len(fields) >= 10 and os.path.exists(f"/sys/block/{fields[2]}"):
+                sectors += int(fields[5]) + int(fields[9])
+        return sectors * 512  # diskstats sectors are always 512 bytes
+
+
+class _Climber:
+    """Hill-climbing state of one kind of slot."""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.before = None  # measure taken just before the last increase
+        self.cooldown = 0
+
+
+class ConcurrencyController:
+    """Adjusts a Scheduler's 'transcode' and 'copy' limits from measured system load."""
+
+    def __init__(self, max_transcodes=None, max_copies=8, interval=5.0, sampler=None):
+        """
+        Args:
+            max_transcodes (int): Operator cap on parallel transcodes; the core count if None.
+            max_copies (int): Operator cap on parallel stream copies.
+            interval (float): Seconds between load samples.
+            sampler (LoadSampler): Source of load figures; a new one if None.
+        """
+        self.cores = os.cpu_count() or 1
+        self.interval = interval
+        self.sampler = sampler
+        self._climbers = {
+            'transcode': _Climber(max(1, max_transcodes or self.cores)),
+            'copy': _Climber(max(1, max_copies))
+        }
+        self._scheduler = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, scheduler):
+        """Start sampling in a background thread and adjusting `scheduler`'s limits."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._scheduler = scheduler
+        for kind, climber in self._climbers.items():
+            scheduler.set_limit(kind, min(scheduler.limits[kind], climber.cap))
+        self.sampler = self.sampler or LoadSampler()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="tracksep-concurrency", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def threads_for(self, scheduler, job):
+        """`-threads` for a transcode about to start: the cores shared by the transcodes expected to run."""
+        if job.kind != 'transcode':
+            return None
+        expected = 0
+        for other in scheduler.queue.pending():
+            if other.kind == 'transcode' and other.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+                expected += 1
+        expected = max(1, min(scheduler.limits['transcode'], expected))
+        return max(1, self.cores // expected)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.step(self.sampler.sample())
+            except Exception:
+                logger.exception("Concurrency controller step failed")
+
+    def step(self, sample):
+        """Apply one round of adjustments for a load `sample` from `LoadSampler.sample`."""
+        scheduler = self._scheduler
+        running = {'transcode': [], 'copy': []}
+        waiting = {'transcode': 0, 'copy': 0}
+        for job in scheduler.queue.pending():
+            if job.status == JobStatus.RUNNING:
+                running[job.kind].append(job)
+            elif job.status == JobStatus.QUEUED:
+                waiting[job.kind] += 1
+
+        cpu = sample['cpu']
+        speeds = [job.speed for job in running['transcode'] if job.speed]
+        # Oversubscribed: every encoder is fighting for the same cores
+        if cpu is not None and cpu > CPU_HIGH and scheduler.limits['transcode'] > 1:
+            self._change(scheduler, 'transcode', -1, f"CPU {cpu:.0%} busy")
+            self._climbers['transcode'].before = None
+            self._climbers['transcode'].cooldown = COOLDOWN
+        else:
+            self._climb(
+                scheduler, 'transcode', sum(speeds) if speeds else None, running, waiting,
+                headroom=cpu is None or cpu < CPU_TARGET
+            )
+        self._climb(scheduler, 'copy', sample['disk'], running, waiting, headroom=True)
+
+    def _climb(self, scheduler, kind, measure, running, waiting, headroom):
+        """Keep an added slot if `measure` (combined speed or disk bytes/s) rose, otherwise undo it."""
+        climber = self._climbers[kind]
+        limit = scheduler.limits[kind]
+        if climber.cooldown:
+            climber.cooldown -= 1
+        if measure is None:
+            return
+        if climber.before is not None:
+            if len(running[kind]) >= limit:
+                # The slot added last round is in use now: judge it
+                if measure < climber.before * MIN_GAIN:
+                    self._change(scheduler, kind, -1,
+                                 f"an extra job didn't help ({climber.before:.3g} -> {measure:.3g})")
+                    climber.cooldown = COOLDOWN
+                climber.before = None
+            elif not waiting[kind]:
+                climber.before = None  # the queue ran dry before the slot was used
+        elif (not climber.cooldown and headroom and waiting[kind]
+              and len(running[kind]) >= limit and limit < climber.cap):
+            climber.before = measure
+            self._change(scheduler, kind, +1, "jobs waiting and room to spare")
+
+    def _change(self, scheduler, kind, delta, reason):
+        limit = max(1, min(self._climbers[kind].cap, scheduler.limits[kind] + delta))
+        if limit != scheduler.limits[kind]:
+            logger.info(f"{kind.capitalize()} slots {scheduler.limits[kind]} -> {limit}: {reason}")
+            scheduler.set_limit(kind, limit)
+
+
+def scheduler_from_options(runner, options, **kwargs):
+    """
+    Build a Scheduler with the batch settings of `options` (a settings dict or store).
+
+    Extra keyword arguments go to the Scheduler, e.g. on_update and journal.
+    """
+    controller = None
+    if options.get('adaptive_concurrency') == 'true':
+        controller = ConcurrencyController(
+            max_transcodes=int(options.get('batch_max_transcodes') or 0) or None,
+            max_copies=int(options.get('batch_max_copies'))
+        )
+    return Scheduler(
+        runner,
+        cpu_share=float(options.get('batch_cpu_share')),
+        io_jobs=int(options.get('batch_io_jobs')),
+        volume_jobs=int(options.get('batch_volume_jobs') or 0),
+        controller=controller,
+        policy=options.get('batch_policy'),
+        estimator=CostEstimator(default_recorder(options.get('metrics_dir')).jsonl_path),
+        **kwargs
+    )
@@ -0,0 +1,513 @@
+"""
+Pure-Python stream table readers for MP4/MOV and Matroska/WebM.
+
+They read only the container headers (the MP4 `moov` box, the Matroska
+`Info` and `Tracks` elements) with bounded seeks and reads, and fill the same
+structures as `StreamInfo`. Anything unexpected raises `ContainerParseError`
+so the caller can fall back to ffprobe.
+"""
+import os
+import struct
+
+# Refuse to load header structures larger than this; real ones are far smaller
+MAX_HEADER_SIZE = 64 * 1024 * 1024
+
+
+class ContainerParseError(Exception):
+    """The file isn't a supported container or its headers can't be read."""
+
+
+def parse_container(path):
+    """
+    Read the stream table of an MP4/MOV or Matroska/WebM file.
+
+    Returns:
+        dict: 'video_streams', 'audio_streams' and 'duration', shaped like `StreamInfo`.
+
+    Raises:
+        ContainerParseError: For other formats, damaged headers or unknown codecs.
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic = f.read(12)
+            f.seek(0)
+            if magic[:4] == b'\x1a\x45\xdf\xa3':
+                return _parse_matroska(f)
+            if len(magic) >= 8 and magic[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip'):
+                return _parse_mp4(f)
+    except (OSError, struct.error, IndexError, ValueError, UnicodeDecodeError) as e:
+        raise ContainerParseError(f"{path}: {e}")
+    raise ContainerParseError(f"{path}: unsupported container")
+
+
+def _resolution(width, height):
+    return f"{width or '?'}x{height or '?'}"
+
+
+# --- MP4 / MOV ---------------------------------------------------------------
+
+# Sample entry fourcc -> ffprobe codec name
+MP4_VIDEO_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264', b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'vp08': 'vp8', b'vp09': 'vp9', b'av01': 'av1', b'mp4v': 'mpeg4',
+    b'jpeg': 'mjpeg', b'mjpa': 'mjpeg', b'apch': 'prores', b'apcn': 'prores',
+    b'apcs': 'prores', b'apco': 'prores', b'ap4h': 'prores', b'ap4x': 'prores'
+}
+MP4_AUDIO_CODECS = {
+    b'Opus': 'opus', b'fLaC': 'flac', b'ac-3': 'ac3', b'ec-3': 'eac3',
+    b'alac': 'alac', b'.mp3': 'mp3', b'sowt': 'pcm_s16le', b'twos': 'pcm_s16be'
+}
+# MPEG-4 objectTypeIndication (from the esds box) -> ffprobe codec name
+MP4_OBJECT_TYPES = {0x40: 'aac', 0x66: 'aac', 0x67: 'aac', 0x68: 'aac', 0x69: 'mp3', 0x6B: 'mp3'}
+
+
+def _iter_boxes(data, start=0, end=None):
+    """Yield (type, payload_start, box_end) for the boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ContainerParseError(f"corrupt {box_type!r} box")
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _find_box(data, path, start=0, end=None):
+    """Return (payload_start, box_end) of the first box along `path`, or None."""
+    for box_type, payload, box_end in _iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return _find_box(data, path[1:], payload, box_end)
+    return None
+
+
+def _read_moov(f):
+    """Locate the top-level moov box with seeks and read only that box."""
+    file_size = os.fstat(f.fileno()).st_size
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        header = f.read(16)
+        size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header_size:
+            raise ContainerParseError("corrupt top-level box")
+        if box_type == b'moov':
+            if size > MAX_HEADER_SIZE:
+                raise ContainerParseError("moov box too large")
+            f.seek(offset + header_size)
+            data = f.read(size - header_size)
+            if len(data) != size - header_size:
+                raise ContainerParseError("truncated moov box")
+            return data
+        offset += size
+    raise ContainerParseError("no moov box")
+
+
+def _full_box_version(data, payload):
+    return data[payload]
+
+
+def _parse_mdhd_language(data, payload):
+    """Return the ISO-639-2 language code packed into an mdhd box."""
+    offset = payload + (32 if _full_box_version(data, payload) == 1 else 20)
+    packed = struct.unpack_from('>H', data, offset)[0]
+    return ''.join(chr(((packed >> shift) & 0x1F) + 0x60) for shift in (10, 5, 0))
+
+
+def _parse_esds(data, payload, end):
+    """Return (objectTypeIndication, avgBitrate) from an esds box."""
+    offset = payload + 4  # skip version/flags
+
+    def read_descriptor(offset):
+        tag = data[offset]
+        offset += 1
+        length = 0
+        for _ in range(4):
+            byte = data[offset]
+            offset += 1
+            length = (length << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+        return tag, offset, length
+
+    tag, offset, _ = read_descriptor(offset)
+    if tag != 0x03:  # ES_Descriptor
+        raise ContainerParseError("unexpected esds layout")
+    flags = data[offset + 2]
+    offset += 3
+    if flags & 0x80:
+        offset += 2
+    if flags & 0x40:
+        offset += 1 + data[offset]
+    if flags & 0x20:
+        offset += 2
+    tag, offset, _ = read_descriptor(offset)
+    if tag != 0x04 or offset + 13 > end:  # DecoderConfigDescriptor
+        raise ContainerParseError("unexpected esds layout")
+    object_type = data[offset]
+    avg_bitrate = struct.unpack_from('>I', data, offset + 9)[0]
+    return object_type, avg_bitrate
+
+
+def _parse_mp4(f):
+    moov = _read_moov(f)
+
+    duration = None
+    mvhd = _find_box(moov, [b'mvhd'])
+    if mvhd is not None:
+        payload = mvhd[0]
+        if _full_box_version(moov, payload) == 1:
+            timescale, movie_duration = struct.unpack_from('>IQ', moov, payload + 20)
+        else:
+            timescale, movie_duration = struct.unpack_from('>II', moov, payload + 12)
+        if timescale and movie_duration:
+            duration = movie_duration / timescale
+
+    video_streams = []
+    audio_streams = []
+    index = 0
+    for box_type, trak_start, trak_end in _iter_boxes(moov):
+        if box_type != b'trak':
+            continue
+        stream_index = index
+        index += 1  # ffmpeg creates one stream per trak, in file order
+
+        hdlr = _find_box(moov, [b'mdia', b'hdlr'], trak_start, trak_end)
+        mdhd = _find_box(moov, [b'mdia', b'mdhd'], trak_start, trak_end)
+        stsd = _find_box(moov, [b'mdia', b'minf', b'stbl', b'stsd'], trak_start, trak_end)
+        if hdlr is None or stsd is None:
+            continue
+        handler = moov[hdlr[0] + 8:hdlr[0] + 12]
+        if handler not in (b'vide', b'soun'):
+            continue
+
+        entries = list(_iter_boxes(moov, stsd[0] + 8, stsd[1]))
+        if not entries:
+            raise ContainerParseError("empty stsd box")
+        fourcc, entry_start, entry_end = entries[0]
+
+        if handler == b'vide':
+            codec = MP4_VIDEO_CODECS.get(fourcc)
+            if codec is None:
+                raise ContainerParseError(f"unknown video sample entry {fourcc!r}")
+            width, height = struct.unpack_from('>HH', moov, entry_start + 24)
+            video_streams.append({
+                'index': stream_index,
+                'codec': codec,
+                'resolution': _resolution(width, height),
+                'bit_rate': None
+            })
+        else:
+            version = struct.unpack_from('>H', moov, entry_start + 8)[0]
+            channels = struct.unpack_from('>H', moov, entry_start + 16)[0]
+            sample_rate = struct.unpack_from('>I', moov, entry_start + 24)[0] >> 16
+            # QuickTime v1/v2 sound descriptions append extra fields before child boxes
+            children_start = entry_start + 28 + {1: 16, 2: 36}.get(version, 0)
+            bit_rate = None
+            if fourcc == b'mp4a':
+                esds = _find_box(moov, [b'esds'], children_start, entry_end)
+                if esds is None:
+                    raise ContainerParseError("mp4a without esds")
+                object_type, avg_bitrate = _parse_esds(moov, esds[0], esds[1])
+                bit_rate = str(avg_bitrate) if avg_bitrate else None
+                codec = MP4_OBJECT_TYPES.get(object_type)
+            else:
+                codec = MP4_AUDIO_CODECS.get(fourcc)
+            if codec is None or version == 2:
+                raise ContainerParseError(f"unsupported audio sample entry {fourcc!r}")
+            audio_streams.append({
+                'index': stream_index,
+                'codec': codec,
+                'channels': channels,
+                'sample_rate': str(sample_rate),
+                'bit_rate': bit_rate,
+                'language': _parse_mdhd_language(moov, mdhd[0]) if mdhd else None,
+                'title': None
+            })
+
+    return {'video_streams': video_streams, 'audio_streams': audio_streams, 'duration': duration}
+
+
+# --- Matroska / WebM ---------------------------------------------------------
+
+EBML_HEADER = 0x1A45DFA3
+EBML_DOCTYPE = 0x4282
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+NAME = 0x536E
+LANGUAGE = 0x22B59C
+LANGUAGE_BCP47 = 0x22B59D
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+AUDIO = 0xE1
+SAMPLING_FREQUENCY = 0xB5
+CHANNELS = 0x9F
+BIT_DEPTH = 0x6264
+CLUSTER = 0x1F43B675
+
+MKV_VIDEO_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc', 'V_VP8': 'vp8',
+    'V_VP9': 'vp9', 'V_AV1': 'av1', 'V_MPEG2': 'mpeg2video', 'V_MPEG4/ISO/ASP': 'mpeg4',
+    'V_MJPEG': 'mjpeg', 'V_PRORES': 'prores', 'V_THEORA': 'theora'
+}
+MKV_AUDIO_CODECS = {
+    'A_MPEG/L3': 'mp3', 'A_MPEG/L2': 'mp2', 'A_AC3': 'ac3', 'A_EAC3': 'eac3',
+    'A_DTS': 'dts', 'A_OPUS': 'opus', 'A_VORBIS': 'vorbis', 'A_FLAC': 'flac',
+    'A_TRUEHD': 'truehd', 'A_ALAC': 'alac'
+}
+UNKNOWN_SIZE = -1
+
+
+def _read_vint(data, offset, keep_marker):
+    """Decode an EBML variable-length integer. Returns (value, next_offset)."""
+    first = data[offset]
+    if first == 0:
+        raise ContainerParseError("invalid EBML varint")
+    length = 1
+    mask = 0x80
+    while not first & mask:
+        mask >>= 1
+        length += 1
+    if len(data) < offset + length:
+        raise ContainerParseError("truncated EBML varint")
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = UNKNOWN_SIZE
+    return value, offset + length
+
+
+def _iter_elements(data, start=0, end=None):
+    """Yield (id, payload_start, payload_end) for the elements in data[start:end]."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset < end:
+        element_id, offset = _read_vint(data, offset, keep_marker=True)
+        size, offset = _read_vint(data, offset, keep_marker=False)
+        if size == UNKNOWN_SIZE or offset + size > end:
+            raise ContainerParseError(f"bad size for element {element_id:#x}")
+        yield element_id, offset, offset + size
+        offset += size
+
+
+def _uint(data, start, end):
+    return int.from_bytes(data[start:end], 'big') if end > start else 0
+
+
+def _float(data, start, end):
+    if end - start == 4:
+        return struct.unpack_from('>f', data, start)[0]
+    if end - start == 8:
+        return struct.unpack_from('>d', data, start)[0]
+    return 0.0
+
+
+def _read_element_header(f):
+    """Read an element header at the current position. Returns (id, size, header_length)."""
+    header = f.read(12)
+    if not header:
+        return None
+    element_id, offset = _read_vint(header, 0, keep_marker=True)
+    size, offset = _read_vint(header, offset, keep_marker=False)
+    return element_id, size, offset
+
+
+def _read_payload(f, position, size):
+    if size == UNKNOWN_SIZE or size > MAX_HEADER_SIZE:
+        raise ContainerParseError("header element too large")
+    f.seek(position)
+    data = f.read(size)
+    if len(data) != size:
+        raise ContainerParseError("truncated header element")
+    return data
+
+
+def _parse_matroska(f):
+    file_size = os.fstat(f.fileno()).st_size
+
+    element_id, size, header_length = _read_element_header(f)
+    header = _read_payload(f, header_length, size)
+    doctype = None
+    for child_id, start, end in _iter_elements(header):
+        if child_id == EBML_DOCTYPE:
+            doctype = header[start:end].rstrip(b'\x00').decode('ascii')
+    if doctype not in ('matroska', 'webm'):
+        raise ContainerParseError(f"unsupported EBML doctype {doctype!r}")
+
+    # Walk the segment's top-level children until Info and Tracks are found
+    segment_offset = header_length + size
+    f.seek(segment_offset)
+    element_id, size, header_length = _read_element_header(f)
+    if element_id != SEGMENT:
+        raise ContainerParseError("no Segment element")
+    segment_start = segment_offset + header_length
+    segment_end = file_size if size == UNKNOWN_SIZE else min(file_size, segment_start + size)
+
+    positions = {}
+    info = tracks = None
+    offset = segment_start
+    while offset < segment_end and (info is None or tracks is None):
+        f.seek(offset)
+        element = _read_element_header(f)
+        if element is None:
+            break
+        element_id, size, header_length = element
+        payload = offset + header_length
+        if element_id == INFO:
+            info = _read_payload(f, payload, size)
+        elif element_id == TRACKS:
+            tracks = _read_payload(f, payload, size)
+        elif element_id == SEEK_HEAD:
+            positions = _parse_seek_head(_read_payload(f, payload, size), segment_start)
+        elif element_id == CLUSTER or size == UNKNOWN_SIZE:
+            # Headers placed after the media data: jump via the SeekHead
+            if tracks is None and TRACKS in positions:
+                tracks = _read_positioned(f, positions[TRACKS], TRACKS)
+            if info is None and INFO in positions:
+                info = _read_positioned(f, positions[INFO], INFO)
+            break
+        offset = payload + size
+
+    if tracks is None:
+        raise ContainerParseError("no Tracks element")
+
+    duration = None
+    if info is not None:
+        timecode_scale = 1000000
+        raw_duration = None
+        for child_id, start, end in _iter_elements(info):
+            if child_id == TIMECODE_SCALE:
+                timecode_scale = _uint(info, start, end)
+            elif child_id == DURATION:
+                raw_duration = _float(info, start, end)
+        if raw_duration:
+            duration = raw_duration * timecode_scale / 1e9
+
+    video_streams = []
+    audio_streams = []
+    index = 0
+    for child_id, start, end in _iter_elements(tracks):
+        if child_id != TRACK_ENTRY:
+            continue
+        stream_index = index
+        index += 1  # ffmpeg creates one stream per TrackEntry, in file order
+        track = _parse_track_entry(tracks, start, end)
+
+        if track['type'] == 1:
+            codec = MKV_VIDEO_CODECS.get(track['codec_id'])
+            if codec is None:
+                raise ContainerParseError(f"unknown video codec {track['codec_id']!r}")
+            video_streams.append({
+                'index': stream_index,
+                'codec': codec,
+                'resolution': _resolution(track['width'], track['height']),
+                'bit_rate': None
+            })
+        elif track['type'] == 2:
+            codec_id = track['codec_id']
+            if codec_id.startswith('A_AAC'):
+                codec = 'aac'
+            elif codec_id == 'A_PCM/INT/LIT' and track['bit_depth'] in (16, 24, 32):
+                codec = f"pcm_s{track['bit_depth']}le"
+            else:
+                codec = MKV_AUDIO_CODECS.get(codec_id)
+            if codec is None:
+                raise ContainerParseError(f"unknown audio codec {codec_id!r}")
+            audio_streams.append({
+                'index': stream_index,
+                'codec': codec,
+                'channels': track['channels'],
+                'sample_rate': str(int(track['sample_rate'])),
+                'bit_rate': None,
+                'language': track['language'],
+                'title': track['name']
+            })
+
+    return {'video_streams': video_streams, 'audio_streams': audio_streams, 'duration': duration}
+
+
+def _parse_seek_head(data, segment_start):
+    positions = {}
+    for child_id, start, end in _iter_elements(data):
+        if child_id != SEEK:
+            continue
+        seek_id = position = None
+        for grandchild_id, gstart, gend in _iter_elements(data, start, end):
+            if grandchild_id == SEEK_ID:
+                seek_id = _uint(data, gstart, gend)
+            elif grandchild_id == SEEK_POSITION:
+                position = _uint(data, gstart, gend)
+        if seek_id is not None and position is not None:
+            positions[seek_id] = segment_start + position
+    return positions
+
+
+def _read_positioned(f, position, expected_id):
+    f.seek(position)
+    element = _read_element_header(f)
+    if element is None or element[0] != expected_id:
+        raise ContainerParseError("SeekHead points at the wrong element")
+    return _read_payload(f, position + element[2], element[1])
+
+
+def _parse_track_entry(data, start, end):
+    track = {
+        'type': None, 'codec_id': '', 'width': None, 'height': None, 'name': None,
+        # Matroska defaults for absent fields
+        'language': 'eng', 'sample_rate': 8000.0, 'channels': 1, 'bit_depth': None
+    }
+    bcp47 = None
+    for child_id, cstart, cend in _iter_elements(data, start, end):
+        if child_id == TRACK_TYPE:
+            track['type'] = _uint(data, cstart, cend)
+        elif child_id == CODEC_ID:
+            track['codec_id'] = data[cstart:cend].rstrip(b'\x00').decode('ascii')
+        elif child_id == NAME:
+            track['name'] = data[cstart:cend].rstrip(b'\x00').decode('utf-8') or None
+        elif child_id == LANGUAGE:
+            track['language'] = data[cstart:cend].rstrip(b'\x00').decode('ascii')
+        elif child_id == LANGUAGE_BCP47:
+            bcp47 = data[cstart:cend].rstrip(b'\x00').decode('ascii')
+        elif child_id == VIDEO:
+            for video_id, vstart, vend in _iter_elements(data, cstart, cend):
+                if video_id == PIXEL_WIDTH:
+                    track['width'] = _uint(data, vstart, vend)
+                elif video_id == PIXEL_HEIGHT:
+                    track['height'] = _uint(data, vstart, vend)
+        elif child_id == AUDIO:
+            for audio_id, astart, aend in _iter_elements(data, cstart, cend):
+                if audio_id == SAMPLING_FREQUENCY:
+                    track['sample_rate'] = _float(data, astart, aend)
+                elif audio_id == CHANNELS:
+                    track['channels'] = _uint(data, astart, aend)
+                elif audio_id == BIT_DEPTH:
+                    track['bit_depth'] = _uint(data, astart, aend)
+    if bcp47:
+        track['language'] = bcp47  # takes precedence over the legacy element when present
+    return track
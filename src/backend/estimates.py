@@ -0,0 +1,121 @@
+"""
+Run time estimates for batch jobs, used for shortest-first ordering and forecasts.
+
+A job's cost is the length of media it processes divided by the speed factor
+of its codec path (which codecs its outputs use after smart copy). Speeds come
+from recent finished jobs with the same path, read from the metrics history,
+and fall back to rough per-codec defaults until there is history.
+"""
+import json
+import logging
+import os
+import statistics
+import threading
+from collections import deque
+
+from backend.commands import codec_path
+from backend.extractor import plan_outputs
+from backend.metrics import default_recorder
+from backend.stream_info import StreamInfo
+
+logger = logging.getLogger(__name__)
+
+# Realtime speed factors assumed for a codec before any job has measured one
+DEFAULT_SPEEDS = {
+    'copy': 100.0,
+    'aac': 150.0,
+    'mp3': 100.0,
+    'flac': 150.0,
+    'opus': 100.0,
+    'h264': 2.0,
+    'h265': 0.6,
+    'vp9': 0.4
+}
+# Probe, process start-up and renaming, per job
+JOB_OVERHEAD = 1.0
+# How much of the metrics history is read at start-up
+HISTORY_BYTES = 1024 * 1024
+
+
+def media_length(job, duration):
+    """Seconds of media a job processes: its clips, or the whole input."""
+    if not job.clips:
+        return duration
+    lengths = [clip.clamp_length(duration) for clip in job.clips]
+    return None if None in lengths else sum(lengths)
+
+
+class CostEstimator:
+    """Estimates job run times from their codec path and the speeds measured so far."""
+
+    def __init__(self, history_file=None, samples=20):
+        """
+        Args:
+            history_file (str): Metrics JSON lines to learn speeds from; the default recorder's if None.
+            samples (int): Recent speed factors kept per codec path.
+        """
+        self.samples = samples
+        self._speeds = {}  # codec path -> deque of speed factors
+        self._lock = threading.Lock()
+        self._load(history_file or default_recorder().jsonl_path)
+
+    def speed(self, outputs):
+        """Expected realtime speed factor of a command writing `outputs`."""
+        with self._lock:
+            recent = list(self._speeds.get(codec_path(outputs), ()))
+        if recent:
+            return statistics.median(recent)
+        # Every output comes out of the same pass, so the slowest codec sets the pace
+        return min(DEFAULT_SPEEDS.get(output.codec, 1.0) for output in outputs)
+
+    def estimate(self, job):
+        """Expected run time of `job` in seconds, or None if it can't be told (e.g. unreadable input)."""
+        return self.plan(job)[0]
+
+    def plan(self, job):
+        """
+        Plan `job`'s outputs from its probed streams and estimate its run time.
+
+        Returns:
+            tuple: The run time in seconds or None, and the planned OutputSpecs (None if the input can't be probed).
+        """
+        try:
+            stream_info = StreamInfo(job.input_file, job.options.get('ffmpeg_path'))
+            outputs = plan_outputs(job, stream_info)
+        except Exception as e:
+            logger.debug(f"No estimate for {job.input_file}: {e}")
+            return None, None
+        length = media_length(job, job.duration or stream_info.duration)
+        if not outputs or length is None:
+            return None, outputs
+        return JOB_OVERHEAD + length / self.speed(outputs), outputs
+
+    def observe(self, job):
+        """Learn from a finished job's measured speed."""
+        metrics = job.metrics
+        if metrics is None or metrics.cached or not metrics.speed_factor or not job.outputs:
+            return
+        self._add(codec_path(job.outputs), metrics.speed_factor)
+
+    def _add(self, path, speed):
+        with self._lock:
+            self._speeds.setdefault(path, deque(maxlen=self.samples)).append(speed)
+
+    def _load(self, path):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                start = max(0, f.tell() - HISTORY_BYTES)
+                f.seek(start)
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        if start:
+            lines = lines[1:]  # probably cut in the middle
+        for line in lines:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            if data.get('status') == 'done' and data.get('speed_factor') and data.get('codec_path'):
+                self._add(data['codec_path'], data['speed_factor'])
@@ -0,0 +1,449 @@
+import glob
+import os
+import logging
+import socket
+import sys
+import time
+from backend.commands import (
+    OutputSpec, audio_extension, audio_renditions, build_commands, clip_output_path,
+    effective_audio_codec, effective_video_codec, partial_path, track_output_path
+)
+from backend.capabilities import check_job, ffmpeg_capabilities
+from backend.jobs import ALL_STREAMS
+from backend.chunked import ChunkedEncodingError, encode_chunked, use_chunked
+from backend.ffmpeg_progress import run_ffmpeg
+from backend.metrics import JobMetrics
+from backend.output_cache import default_output_cache
+from backend.sinks import SinkError, as_sink
+from backend.stream_info import StreamInfo
+
+logger = logging.getLogger(__name__)
+
+# Partials older than this are removed whoever wrote them (a crashed session on another host, a reused pid)
+STALE_PARTIAL_AGE = 24 * 3600
+
+# Partials are tagged "host-pid-job", so sessions sharing an output folder (several windows,
+# or cluster workers on a network share) can tell whether the writer is still alive
+_HOST = socket.gethostname().split('.')[0] or 'localhost'
+
+
+class ExtractionError(Exception):
+    """Raised when ffmpeg fails or a job is cancelled."""
+
+
+def audio_output_path(output_audio, audio_codec, bitrate=None):
+    """
+    Swap the audio output's extension for the one matching the codec.
+
+    With `bitrate`, it's appended to the name too, for ladders that encode one
+    codec at several bitrates.
+    """
+    if output_audio is None:
+        return None
+    root = os.path.splitext(output_audio)[0]
+    if bitrate is not None:
+        root += f"_{bitrate}"
+    return root + f".{audio_extension(audio_codec)}"
+
+
+def rendition_paths(output_audio, renditions):
+    """
+    Return (codec, bitrate, path) for each audio rendition of `output_audio`.
+
+    The extension tells renditions apart, unless a codec is listed at several
+    bitrates; then the bitrate goes in the name too.
+    """
+    codecs = [codec for codec, _ in renditions]
+    return [
+        (codec, bitrate, audio_output_path(output_audio, codec, bitrate if codecs.count(codec) > 1 else None))
+        for codec, bitrate in renditions
+    ]
+
+
+def selected_audio_streams(job, stream_info):
+    """Return the probed stream dicts (or None for ffmpeg's default) a job extracts audio from."""
+    if job.audio_streams is None:
+        return [stream_info.find_stream(None, 'audio')]
+    if job.audio_streams == ALL_STREAMS:
+        return list(stream_info.audio_streams)
+    return [
+        stream_info.find_stream(index, 'audio') or {'index': index}
+        for index in job.audio_streams
+    ]
+
+
+def plan_outputs(job, stream_info, capabilities=None):
+    """
+    Work out every output of a job: one video file and one file per selected audio
+    track and audio rendition, repeated for each clip.
+
+    With the `capabilities` of the job's ffmpeg, transcodes use the best
+    encoder it has for their codec (see `backend.capabilities.ENCODERS`).
+
+    How the outputs are run is up to `build_commands`: with 'single_pass' on,
+    one ffmpeg process writes all of them, decoding each track once and feeding
+    the frames to every rendition's encoder; with it off, each output gets its
+    own process, which decodes the track again.
+    With smart copy enabled, streams already in the requested format are copied
+    instead of re-encoded. An output path may be a sink (see `backend.sinks`),
+    which takes exactly one output.
+
+    Raises:
+        SinkError: If several outputs would go to one sink.
+    """
+    options = job.options
+    smart_copy = options.get('smart_copy') == 'true'
+    clips = job.clips or [None]
+    multiple_clips = len(clips) > 1
+    outputs = []
+
+    def encoder(codec):
+        return capabilities.encoder_for(codec) if capabilities is not None and codec != 'copy' else None
+
+    for clip_position, clip in enumerate(clips):
+        suffix = f" (clip {clip_position + 1})" if multiple_clips else ""
+
+        if job.output_video is not None:
+            video_codec = options.get('video_codec')
+            if smart_copy:
+                video_codec = effective_video_codec(video_codec, stream_info.find_stream(job.video_stream, 'video'))
+            sink = as_sink(job.output_video)
+            if sink is not None and (sink.raw or multiple_clips):
+                raise SinkError(f"Video can't go to {sink} as raw PCM or as several clips")
+            outputs.append(OutputSpec(
+                'video', sink.url if sink else clip_output_path(job.output_video, clip_position, multiple_clips),
+                video_codec, job.video_stream, description="Video" + suffix, clip=clip, encoder=encoder(video_codec),
+                sink=sink
+            ))
+
+        if job.output_audio is not None:
+            sink = as_sink(job.output_audio)
+            renditions = audio_renditions(options)
+            streams = selected_audio_streams(job, stream_info)
+            multiple = len(streams) > 1
+            if sink is not None:
+                # A pipe carries one stream of bytes: there's nothing to tell several files apart
+                if multiple or multiple_clips or len(renditions) > 1:
+                    raise SinkError(f"{sink} takes a single audio output: select one track and clip, and no ladder")
+                renditions = [(codec, bitrate, sink.url) for codec, bitrate in renditions]
+            else:
+                renditions = rendition_paths(job.output_audio, renditions)
+            for position, stream in enumerate(streams):
+                index = stream['index'] if job.audio_streams is not None else None
+                for audio_codec, audio_bitrate, path in renditions:
+                    codec = effective_audio_codec(audio_codec, audio_bitrate, stream) if smart_copy else audio_codec
+                    if sink is not None:
+                        codec = sink.codec(codec)
+                    description = f"Audio stream {index}" if multiple else "Audio"
+                    if len(renditions) > 1:
+                        description += f" {audio_codec} {audio_bitrate}" if audio_bitrate else f" {audio_codec}"
+                    if sink is None:
+                        path = track_output_path(
+                            clip_output_path(path, clip_position, multiple_clips), stream, position, multiple
+                        )
+                    outputs.append(OutputSpec(
+                        'audio', path, codec, index, audio_bitrate, description + suffix, clip,
+                        encoder=encoder(codec), sink=sink, requested_codec=audio_codec
+                    ))
+    return outputs
+
+
+def command_duration(outputs, duration):
+    """Length of media a command writing `outputs` processes, for progress percentages."""
+    lengths = [output.clip.clamp_length(duration) if output.clip else duration for output in outputs]
+    if None in lengths:
+        return None
+    return max(lengths, default=duration)
+
+
+def bytes_demuxed(input_file, length, duration):
+    """Approximate input bytes read to process `length` seconds of an input lasting `duration`."""
+    try:
+        size = os.path.getsize(input_file)
+    except OSError:
+        return 0
+    if length is None or not duration:
+        return size
+    return int(size * min(1.0, length / duration))
+
+
+def partial_tag(job):
+    """Tag of the partial outputs written by this process for `job`."""
+    return f"{_HOST}-{os.getpid()}-{job.id}"
+
+
+def _process_alive(pid):
+    if sys.platform == "win32":
+        return True  # os.kill(pid, 0) would terminate it there; leave it to the age limit
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # someone else's process
+    return True
+
+
+def _is_stale(partial):
+    """Whether the session that wrote `partial` is gone: a dead process on this host, or long untouched."""
+    try:
+        if time.time() - os.path.getmtime(partial) > STALE_PARTIAL_AGE:
+            return True
+    except OSError:
+        return False
+    tag = os.path.basename(partial).rsplit('.partial', 1)[0].rsplit('.', 1)[-1]
+    try:
+        host, pid, _ = tag.rsplit('-', 2)
+        pid = int(pid)
+    except ValueError:
+        return False  # not ours to judge until it's old
+    return host == _HOST and pid != os.getpid() and not _process_alive(pid)
+
+
+def remove_stale_partials(path):
+    """Delete temporary files left for `path` by sessions that crashed or were killed."""
+    for partial in glob.glob(glob.escape(partial_path(path, '')).replace('..partial', '.*.partial')):
+        if _is_stale(partial):
+            logger.info(f"Removing leftover partial output {partial}")
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+
+
+class JobRun:
+    """
+    The steps of running one job, shared by the threaded runner (`run_job`)
+    and the asyncio one (`backend.aio.run_job_async`).
+
+    The drivers only differ in how they wait: `run_job` blocks on ffprobe and
+    ffmpeg, the asyncio driver awaits them. Planning, the output cache,
+    partial files, progress scaling and error reporting all live here.
+    """
+
+    def __init__(self, job, on_progress=None, on_stats=None):
+        """
+        Args:
+            job (Job): The job to execute.
+            on_progress (callable): Called with the overall percentage (int).
+            on_stats (callable): Called with each raw progress snapshot dict.
+        """
+        self.job = job
+        self.options = job.options
+        self.ffmpeg_path = job.options.get('ffmpeg_path')
+        self.on_progress = on_progress
+        self.on_stats = on_stats
+        self.capabilities = None
+        self.cache = self.cache_key = None
+        self.final_paths = []
+        self.chunked = []
+        self.regular = []
+        self.steps = 1
+        job.metrics = self.metrics = JobMetrics(job)
+
+    def check(self, capabilities):
+        """Raise CapabilityError if the job's ffmpeg (described by `capabilities`) can't run it."""
+        self.capabilities = capabilities
+        check_job(self.job, capabilities)
+
+    def plan(self, stream_info, probe_seconds):
+        """Work out the job's outputs from its probed streams."""
+        job = self.job
+        self.metrics.probe_seconds = probe_seconds
+        self.metrics.probe_source = stream_info.source
+        if job.duration is None:
+            job.duration = stream_info.duration
+
+        job.outputs = plan_outputs(job, stream_info, self.capabilities)
+        if not job.outputs:
+            raise ExtractionError("Nothing to extract: no matching streams")
+        logger.info(
+            f"Codec paths for {job.input_file}: "
+            + ", ".join(f"{output.description} {output.mode}" for output in job.outputs)
+        )
+
+    def streamed(self):
+        """Whether any output goes to a sink, which is written once, as ffmpeg runs."""
+        return any(output.sink is not None for output in self.job.outputs)
+
+    def restore_cached(self):
+        """
+        Copy the outputs from the output cache if identical input and settings already produced them.
+
+        Returns:
+            bool: True if the job is done.
+        """
+        if self.options.get('output_cache') != 'true' or self.streamed():
+            return False
+        job = self.job
+        self.cache = default_output_cache(int(self.options.get('output_cache_mb')) * 1024 * 1024)
+        with self.metrics.phase('cache lookup'):
+            self.cache_key = self.cache.key(job.input_file, job.outputs, self.ffmpeg_path)
+            hit = self.cache.restore(self.cache_key, job.outputs)
+        if hit:
+            job.cached = self.metrics.cached = True
+            self.done()
+        return hit
+
+    def stage(self):
+        """
+        Point the outputs at temporary files and split them into chunked and regular encodes.
+
+        ffmpeg writes hidden temporary files that are renamed by `commit` once every
+        output is complete, so a crash or failure never leaves a truncated file under
+        a final name. `discard` must be called whatever happens. Sinks are written directly.
+        """
+        job = self.job
+        self.final_paths = [output.path for output in job.outputs]
+        for output in job.outputs:
+            if output.sink is None:
+                remove_stale_partials(output.path)
+                output.path = partial_path(output.path, partial_tag(job))
+            output.threads = job.threads
+
+        # Long h264/h265/vp9 encodes can be split into segments and encoded in parallel
+        self.chunked = [
+            output for output in job.outputs if output.sink is None and use_chunked(self.options, output)
+        ]
+        self.regular = [output for output in job.outputs if output not in self.chunked]
+        self.steps = len(self.chunked) + (1 if self.regular else 0)
+
+    def report(self, step, percent):
+        """Scale a step's progress into its share of the whole job."""
+        if self.on_progress is not None:
+            self.on_progress(int((step * 100 + percent) / self.steps))
+
+    def encode_chunked(self, step, output):
+        """Encode `output` in parallel segments; on failure it's queued for a one-pass encode instead."""
+        job = self.job
+        usage = {}
+        try:
+            encode_chunked(
+                self.ffmpeg_path, job.input_file, output, self.options, job.duration,
+                lambda percent: self.report(step, percent), job.cancel_event, usage
+            )
+            self.metrics.add_command(
+                f"{output.description} (chunked)", usage, 0, job.duration,
+                bytes_demuxed(job.input_file, None, job.duration)
+            )
+        except ChunkedEncodingError as e:
+            self.metrics.add_command(f"{output.description} (chunked)", usage, None)
+            if job.cancelled:
+                raise ExtractionError(f"{output.description} Extraction Cancelled")
+            logger.warning(f"Chunked encoding of {job.input_file} failed, encoding in one pass instead: {e}")
+            self.regular.append(output)
+
+    def commands(self):
+        """
+        The ffmpeg commands producing the outputs not encoded in chunks.
+
+        Returns:
+            list[tuple]: (step, description, command, length of media processed, sinks written) per command.
+        """
+        if not self.regular:
+            return []
+        # Demux the input once for all outputs unless that's disabled or impossible
+        commands = build_commands(
+            self.ffmpeg_path, self.job.input_file, self.regular,
+            single_pass=self.options.get('single_pass') == 'true'
+        )
+        first_step = len(self.chunked)
+        self.steps = len(self.chunked) + len(commands)
+        # A single-pass command writes every output, otherwise there's one command per output
+        groups = [self.regular] if len(commands) == 1 else [[output] for output in self.regular]
+        return [
+            (
+                first_step + index, desc, command, command_duration(groups[index], self.job.duration),
+                [output.sink for output in groups[index] if output.sink is not None]
+            )
+            for index, (desc, command) in enumerate(commands)
+        ]
+
+    def progress_callback(self, step):
+        """Callback for the progress snapshots of the command at `step`."""
+        def progress_callback(snapshot):
+            if snapshot['percent'] is not None:
+                self.report(step, snapshot['percent'])
+            self.job.speed = snapshot['speed']
+            if self.on_stats is not None:
+                self.on_stats(snapshot)
+        return progress_callback
+
+    def command_finished(self, desc, usage, returncode, stderr_tail, length):
+        """Record a finished command, raising ExtractionError if it failed or was cancelled."""
+        job = self.job
+        self.metrics.add_command(desc, usage, returncode, length, bytes_demuxed(job.input_file, length, job.duration))
+
+        if job.cancelled:
+            raise ExtractionError(f"{desc} Extraction Cancelled")
+        if returncode != 0:
+            raise ExtractionError(f"{desc} Extraction Failed: {stderr_tail.strip()}")
+
+        # Log the tail of FFmpeg's stderr
+        if stderr_tail:
+            logger.warning(f"{desc} stderr:\n{stderr_tail.strip()}")  # Use warning for stderr
+
+    def commit(self):
+        """Move every complete output to its final name."""
+        for output, final_path in zip(self.job.outputs, self.final_paths):
+            if output.sink is None:
+                os.replace(output.path, final_path)
+
+    def discard(self):
+        """Delete temporary files that weren't committed and restore the final paths."""
+        for output, final_path in zip(self.job.outputs, self.final_paths):
+            if output.path != final_path and os.path.exists(output.path):
+                os.remove(output.path)
+            output.path = final_path
+
+    def store_cached(self):
+        if self.cache is not None:
+            with self.metrics.phase('cache store'):
+                self.cache.store(self.cache_key, self.job.input_file, self.job.outputs)
+
+    def done(self):
+        if self.on_progress is not None:
+            self.on_progress(100)
+
+
+def run_job(job, on_progress=None, on_stats=None):
+    """
+    Run every ffmpeg command of a job, reporting progress as it goes.
+
+    Args:
+        job (Job): The job to execute.
+        on_progress (callable): Called with the overall percentage (int).
+        on_stats (callable): Called with each raw progress snapshot dict.
+
+    Raises:
+        ExtractionError: If a command fails or the job is cancelled.
+        CapabilityError: If ffmpeg lacks an encoder or muxer the job needs.
+        SinkError: If the job's sinks can't take its outputs, or a sink callback fails.
+    """
+    run = JobRun(job, on_progress, on_stats)
+    run.check(ffmpeg_capabilities(run.ffmpeg_path))
+
+    probe_start = time.perf_counter()
+    stream_info = StreamInfo(job.input_file, run.ffmpeg_path)
+    run.plan(stream_info, time.perf_counter() - probe_start)
+    if run.restore_cached():
+        return
+
+    run.stage()
+    try:
+        for step, output in enumerate(list(run.chunked)):
+            run.encode_chunked(step, output)
+        for step, desc, command, length, sinks in run.commands():
+            logger.info(f"Running {desc} command: {' '.join(command)}")  # Log the command
+            usage = {}
+            returncode, stderr_tail = run_ffmpeg(
+                command, length, run.progress_callback(step), cancel_event=job.cancel_event, usage=usage,
+                sinks=sinks
+            )
+            run.command_finished(desc, usage, returncode, stderr_tail, length)
+        run.commit()
+    finally:
+        run.discard()
+
+    run.store_cached()
+    run.done()
@@ -0,0 +1,185 @@
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import deque
+
+from backend.sinks import Pipes
+
+# Keys ffmpeg writes in each -progress block
+PROGRESS_KEYS = {
+    'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms',
+    'out_time', 'dup_frames', 'drop_frames', 'speed', 'progress'
+}
+
+_PROGRESS_LINE = re.compile(r'^(\w+)=(.*)$')
+
+
+def progress_args():
+    """Options that make ffmpeg report machine-readable progress on stderr."""
+    return ["-progress", "pipe:2", "-nostats"]
+
+
+def with_progress(command):
+    """Insert the progress options right after the ffmpeg executable."""
+    return command[:1] + progress_args() + command[1:]
+
+
+class ProgressParser:
+    """
+    Incrementally parse the key=value blocks ffmpeg writes with `-progress`.
+
+    Lines that are not part of a progress block are ordinary log output and
+    are kept in a bounded ring buffer for error reporting.
+    """
+
+    def __init__(self, duration=None, max_log_lines=200):
+        """
+        Args:
+            duration (float): Input duration in seconds, used for percentage and ETA.
+            max_log_lines (int): How many non-progress stderr lines to keep.
+        """
+        self.duration = duration if duration and duration > 0 else None
+        self.log_tail = deque(maxlen=max_log_lines)
+        self._block = {}
+
+    def feed(self, line):
+        """
+        Consume one line of ffmpeg output.
+
+        Returns:
+            dict or None: A progress snapshot when `line` completes a block.
+        """
+        line = line.rstrip('\r\n')
+        match = _PROGRESS_LINE.match(line)
+        if not match or not (match.group(1) in PROGRESS_KEYS or match.group(1).startswith('stream_')):
+            if line:
+                self.log_tail.append(line)
+            return None
+
+        key, value = match.group(1), match.group(2).strip()
+        self._block[key] = value
+        if key != 'progress':
+            return None
+
+        snapshot = self._snapshot(self._block)
+        self._block = {}
+        return snapshot
+
+    def _snapshot(self, block):
+        out_time = _to_float(block.get('out_time_us'))
+        out_time = out_time / 1000000 if out_time is not None else None
+        speed = _to_float(block.get('speed', '').rstrip('x'))
+        done = block.get('progress') == 'end'
+
+        percent = None
+        eta = None
+        if done:
+            percent = 100.0
+            eta = 0.0
+        elif self.duration and out_time is not None:
+            percent = max(0.0, min(100.0, out_time * 100 / self.duration))
+            if speed:
+                eta = max(0.0, (self.duration - out_time) / speed)
+
+        return {
+            'percent': percent,
+            'out_time': out_time,
+            'speed': speed,
+            'fps': _to_float(block.get('fps')),
+            'bitrate': block.get('bitrate'),
+            'eta': eta,
+            'done': done
+        }
+
+    def error_text(self):
+        return '\n'.join(self.log_tail)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _terminate_on_cancel(process, cancel_event, exited):
+    # Doesn't poll the process: that could reap it before _wait collects its resource usage
+    while not exited.is_set():
+        if cancel_event.wait(0.2):
+            if not exited.is_set():
+                process.terminate()
+            return
+
+
+def _wait(process):
+    """
+    Wait for a process to exit.
+
+    Returns:
+        tuple[float, float] or None: User and system CPU seconds of the process,
+        or None where the platform can't report them per child (Windows).
+    """
+    if hasattr(os, 'wait4'):
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            pass  # already reaped
+        else:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return rusage.ru_utime, rusage.ru_stime
+    process.wait()
+    return None
+
+
+def run_ffmpeg(command, duration=None, on_progress=None, max_log_lines=200, cancel_event=None, usage=None,
+               sinks=()):
+    """
+    Run an ffmpeg command, streaming progress instead of buffering its output.
+
+    Args:
+        command (list[str]): The ffmpeg command, without progress options.
+        duration (float): Input duration in seconds, if known.
+        on_progress (callable): Called with each progress snapshot dict.
+        max_log_lines (int): Size of the stderr ring buffer.
+        cancel_event (threading.Event): Terminates ffmpeg when set.
+        usage (dict): Filled with 'wall', 'cpu_user' and 'cpu_system' seconds
+            (CPU times are None where unavailable).
+        sinks (list[PipeSink]): Sinks the command writes to, connected to the process.
+
+    Returns:
+        tuple[int, str]: The exit code and the last stderr lines.
+
+    Raises:
+        SinkError: If a sink's callback failed.
+    """
+    parser = ProgressParser(duration, max_log_lines)
+    start = time.perf_counter()
+    pipes = Pipes(sinks)
+    try:
+        process = subprocess.Popen(
+            with_progress(command), stdin=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            stdout=pipes.stdout, pass_fds=pipes.pass_fds, text=True, errors='replace'
+        )
+    finally:
+        pipes.started()
+    exited = threading.Event()
+    if cancel_event is not None:
+        threading.Thread(
+            target=_terminate_on_cancel, args=(process, cancel_event, exited), daemon=True
+        ).start()
+    try:
+        for line in process.stderr:
+            snapshot = parser.feed(line)
+            if snapshot is not None and on_progress is not None:
+                on_progress(snapshot)
+    finally:
+        process.stderr.close()
+        cpu = _wait(process)
+        exited.set()
+    pipes.finish()
+    if usage is not None:
+        usage['wall'] = time.perf_counter() - start
+        usage['cpu_user'], usage['cpu_system'] = cpu or (None, None)
+    return process.returncode, parser.error_text()
@@ -0,0 +1,484 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from queue import SimpleQueue
+from backend.commands import audio_renditions, job_kind
+from backend.metrics import record_job
+from backend.options import PRIVATE_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Selects every audio stream of the input
+ALL_STREAMS = 'all'
+
+# Orders in which queued jobs are started
+POLICIES = ('fifo', 'shortest', 'fair')
+
+
+class JobStatus:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """One extraction job: an input file, its outputs and a snapshot of the settings."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, input_file, output_video, output_audio, options,
+                 video_stream=None, audio_streams=None, duration=None, max_retries=0, clips=None, owner=None):
+        """
+        Args:
+            input_file (str): Path of the media file to split.
+            output_video (str): Path of the video output.
+            output_audio (str): Path of the audio output (extension follows the codec).
+                May contain {index}, {lang} and {title}, filled in per extracted track.
+                Either output may be a sink instead (see `backend.sinks`).
+            options (dict): Plain copy of the settings the job runs with; the
+                PRIVATE_SETTINGS in it are dropped.
+            video_stream (int): Input stream index to use for video, or None for the default.
+            audio_streams (int, list[int] or str): Audio stream index(es) to extract,
+                ALL_STREAMS for every audio stream, or None for ffmpeg's default one.
+            duration (float): Input duration in seconds, probed on demand if None.
+            max_retries (int): How many times a failed job is re-queued.
+            clips (list[Clip]): Sections of the input to extract, each to its own files;
+                None or empty for the whole input. Output paths may contain {clip}.
+            owner (str): Who the job is for, shared fairly under the 'fair' policy;
+                None to share between input folders instead.
+        """
+        self.id = next(Job._ids)
+        self.input_file = input_file
+        self.output_video = output_video
+        self.output_audio = output_audio
+        self.options = {key: value for key, value in dict(options).items() if key not in PRIVATE_SETTINGS}
+        self.video_stream = video_stream
+        if isinstance(audio_streams, int):
+            audio_streams = [audio_streams]
+        self.audio_streams = audio_streams
+        self.duration = duration
+        self.max_retries = max_retries
+        self.clips = list(clips or [])
+        self.owner = owner
+
+        self.status = JobStatus.QUEUED
+        self.attempts = 0
+        self.progress = 0
+        self.error = None
+        self.outputs = []  # OutputSpecs, resolved from the probed streams when the job runs
+        self.cached = False  # outputs were restored from the output cache
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.metrics = None  # JobMetrics of the current attempt, set by the runner
+        self.threads = None  # ffmpeg -threads for video encodes, chosen by the scheduler
+        self.speed = None  # latest realtime speed factor reported by ffmpeg
+        self.estimate = None  # expected run time in seconds, from the scheduler's estimator
+        self.volume = None  # output_volume(), looked up once by the scheduler on submit
+        self.planned_kind = None  # kind of the planned outputs, set by the scheduler's estimator while queued
+
+    @property
+    def kind(self):
+        """
+        'transcode' if the job encodes any output, video or audio; 'copy' if it only copies streams.
+
+        Exact once the estimator has planned the outputs (smart copy may turn an
+        encode into a copy); until then, from the codecs of the outputs the job writes.
+        """
+        if self.planned_kind is not None:
+            return self.planned_kind
+        codecs = []
+        if self.output_video is not None:
+            codecs.append(self.options.get('video_codec'))
+        if self.output_audio is not None:
+            try:
+                codecs.extend(codec for codec, _ in audio_renditions(self.options))
+            except ValueError:
+                return 'transcode'  # bad ladder, fails when it runs
+        return 'transcode' if any(codec != 'copy' for codec in codecs) else 'copy'
+
+    @property
+    def elapsed(self):
+        """Wall time of the last attempt in seconds, or None if it hasn't finished."""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    @property
+    def group(self):
+        """What the 'fair' policy shares slots between: the owner, or else the input folder."""
+        return self.owner or os.path.dirname(os.path.abspath(self.input_file))
+
+    def output_volume(self):
+        """Device id of the filesystem the outputs are written to, or None if unknown."""
+        path = os.path.abspath(os.path.dirname(self.output_video or self.output_audio or self.input_file))
+        while True:
+            try:
+                return os.stat(path).st_dev
+            except OSError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    return None
+                path = parent  # the output folder is created later
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.status} {os.path.basename(self.input_file)}>"
+
+
+class JobQueue:
+    """Thread-safe FIFO of jobs that also keeps finished jobs for status display."""
+
+    def __init__(self):
+        self._jobs = []
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs.append(job)
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs)
+
+    def get(self, job_id):
+        with self._lock:
+            for job in self._jobs:
+                if job.id == job_id:
+                    return job
+        return None
+
+    def requeue(self, job):
+        """Move a job to the back of the queue for another attempt."""
+        with self._lock:
+            self._jobs.remove(job)
+            job.status = JobStatus.QUEUED
+            job.queued_at = time.time()
+            self._jobs.append(job)
+
+    def take(self, kinds, accept=None, key=None):
+        """
+        Mark and return a queued job whose kind is in `kinds` and that `accept` allows, or None.
+
+        The job with the lowest `key(job)` is taken; the first in queue order without a key or on ties.
+        """
+        with self._lock:
+            candidates = [
+                job for job in self._jobs
+                if job.status == JobStatus.QUEUED and job.kind in kinds and (accept is None or accept(job))
+            ]
+            if not candidates:
+                return None
+            job = min(candidates, key=key) if key is not None else candidates[0]
+            job.status = JobStatus.RUNNING
+            return job
+
+    def pending(self):
+        with self._lock:
+            return [job for job in self._jobs if job.status not in JobStatus.FINISHED]
+
+    def remove_finished(self):
+        with self._lock:
+            self._jobs = [job for job in self._jobs if job.status not in JobStatus.FINISHED]
+
+
+class Scheduler:
+    """
+    Run queued jobs in parallel, each as its own ffmpeg process.
+
+    Transcodes are CPU-bound, so their slots are a share of the CPU cores.
+    Stream copies are I/O-bound and get a separate number of slots so they
+    keep the disks busy without competing with the encoders. A controller
+    may move both limits with the measured load while the batch runs, and
+    `max_jobs` caps both kinds together where a slot can run either (workers).
+
+    Free slots go to queued jobs in the order of the policy: 'fifo' (queue
+    order), 'shortest' (lowest estimated run time first, with waiting time
+    counted against the estimate so long jobs aren't starved) or 'fair'
+    (the job group that has been given the least estimated work so far).
+    """
+
+    def __init__(self, runner, queue=None, cpu_share=0.5, io_jobs=2, on_update=None, journal=None,
+                 volume_jobs=0, controller=None, policy='fifo', estimator=None, max_jobs=0):
+        """
+        Args:
+            runner (callable): Executes one job, e.g. `backend.extractor.run_job`.
+                Called as runner(job, on_progress) and raises on failure.
+            queue (JobQueue): Queue to pull from; a new one is created if None.
+            cpu_share (float): Fraction of the CPU cores to use for transcodes.
+            io_jobs (int): Number of stream-copy jobs to run at once.
+            on_update (callable): Called with a job whenever its state or progress changes.
+            journal (Journal): Records every status change so a crashed batch can be resumed.
+            volume_jobs (int): Most jobs writing to the same output volume at once; 0 for no limit.
+            controller (ConcurrencyController): Adjusts the limits and -threads from system load.
+            policy (str): One of POLICIES.
+            estimator (CostEstimator): Plans jobs and estimates their run times, in a background
+                thread as jobs are submitted; without one, 'shortest' and 'fair' fall back to
+                queue order and a job's kind is told from its settings alone.
+            max_jobs (int): Most jobs running at once, whatever their kind; 0 for no limit.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.runner = runner
+        self.queue = queue or JobQueue()
+        self.limits = {
+            'transcode': max(1, int((os.cpu_count() or 1) * cpu_share)),
+            'copy': max(1, io_jobs)
+        }
+        self.on_update = on_update
+        self.journal = journal
+        self.volume_jobs = volume_jobs
+        self.controller = controller
+        self.policy = policy
+        self.estimator = estimator
+        self.max_jobs = max_jobs
+        self._running = {'transcode': 0, 'copy': 0}
+        self._volumes = {}  # st_dev -> running jobs writing there
+        self._served = {}  # Job.group -> estimated seconds of work started, for the 'fair' policy
+        self._to_estimate = SimpleQueue()
+        self._estimator_thread = None
+        self._condition = threading.Condition()
+        self._dispatcher = None
+        self._stopping = False
+
+    def submit(self, job):
+        # Stat'ed here rather than under the dispatch lock, and kept so a job's
+        # slot is given back on the volume it was counted on
+        job.volume = job.output_volume()
+        self.queue.add(job)
+        self._record(job)
+        self._notify(job)
+        if self.estimator is not None and job.estimate is None:
+            self._to_estimate.put(job)
+            if self._estimator_thread is None:
+                self._estimator_thread = threading.Thread(
+                    target=self._estimate, name="tracksep-estimator", daemon=True
+                )
+                self._estimator_thread.start()
+        with self._condition:
+            self._condition.notify_all()
+        return job
+
+    def cancel(self, job_id):
+        job = self.queue.get(job_id)
+        if job is None or job.status in JobStatus.FINISHED:
+            return False
+        job.cancel_event.set()
+        with self._condition:
+            if job.status == JobStatus.QUEUED:
+                job.status = JobStatus.CANCELLED
+                self._record(job)
+                self._notify(job)
+            self._condition.notify_all()
+        return True
+
+    def start(self):
+        if self._dispatcher is not None and self._dispatcher.is_alive():
+            return
+        self._stopping = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="tracksep-scheduler", daemon=True)
+        self._dispatcher.start()
+        if self.controller is not None:
+            self.controller.start(self)
+
+    def stop(self, cancel_running=False):
+        """
+        Stop dispatching new jobs, optionally cancelling the ones in flight.
+
+        Jobs cancelled here stay unfinished in the journal, so they are resumed next time.
+        """
+        if self.controller is not None:
+            self.controller.stop()
+        with self._condition:
+            self._stopping = True
+            if cancel_running:
+                for job in self.queue.pending():
+                    job.cancel_event.set()
+                    if job.status == JobStatus.QUEUED:
+                        job.status = JobStatus.CANCELLED
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every queued job has finished. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.queue.pending():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def set_limit(self, kind, limit):
+        """Change how many jobs of `kind` may run at once; running jobs are never interrupted."""
+        with self._condition:
+            self.limits[kind] = max(1, limit)
+            self._condition.notify_all()
+
+    def set_max_jobs(self, limit):
+        """Change how many jobs may run at once whatever their kind, 0 for no limit."""
+        with self._condition:
+            self.max_jobs = max(0, limit)
+            self._condition.notify_all()
+
+    def _free_kinds(self):
+        if self.max_jobs and sum(self._running.values()) >= self.max_jobs:
+            return []
+        return [kind for kind, limit in self.limits.items() if self._running[kind] < limit]
+
+    def _volume_free(self, job):
+        return not self.volume_jobs or self._volumes.get(job.volume, 0) < self.volume_jobs
+
+    def _priority(self, job, now, served):
+        """Sort key of a queued job under the policy; lower starts first."""
+        estimate = job.estimate if job.estimate is not None else float('inf')
+        if self.policy == 'shortest':
+            return estimate - (now - job.queued_at)
+        if self.policy == 'fair':
+            return served.get(job.group, 0.0), estimate
+        return 0  # fifo: ties keep queue order
+
+    def forecast(self):
+        """
+        Estimate when every unfinished job starts and finishes, at the current limits.
+
+        Returns:
+            dict: Job.id -> (start, finish) as epoch seconds, either None when unknown.
+        """
+        now = time.time()
+        forecast = {}
+        with self._condition:
+            pending = self.queue.pending()
+            limits = {kind: min(limit, self.max_jobs or limit) for kind, limit in self.limits.items()}
+            served = dict(self._served)
+        for kind, limit in limits.items():
+            # Times at which each slot becomes free; inf when a job ahead has no estimate
+            slots = []
+            queued = []
+            for job in pending:
+                if job.kind != kind:
+                    continue
+                if job.status == JobStatus.RUNNING:
+                    started = job.started_at or now
+                    finish = float('inf')
+                    if job.estimate is not None and job.progress:
+                        finish = now + job.estimate * (1 - job.progress / 100)
+                    elif job.estimate is not None:
+                        finish = max(now, started + job.estimate)
+                    forecast[job.id] = (started, finish)
+                    slots.append(finish)
+                else:
+                    queued.append(job)
+            slots.sort()
+            slots = slots[:max(limit, 1)] + [now] * (limit - len(slots))
+            heapq.heapify(slots)
+            while queued:
+                job = min(queued, key=lambda job: self._priority(job, now, served))
+                queued.remove(job)
+                start = heapq.heappop(slots)
+                finish = start + job.estimate if job.estimate is not None else float('inf')
+                heapq.heappush(slots, finish)
+                served[job.group] = served.get(job.group, 0.0) + (job.estimate or 0.0)
+                forecast[job.id] = (start, finish)
+        return {
+            job_id: tuple(None if value is None or value == float('inf') else value for value in times)
+            for job_id, times in forecast.items()
+        }
+
+    def _estimate(self):
+        while True:
+            job = self._to_estimate.get()
+            if job.status != JobStatus.QUEUED:
+                continue
+            estimate, outputs = self.estimator.plan(job)
+            with self._condition:
+                job.estimate = estimate
+                if outputs and job.status == JobStatus.QUEUED:
+                    # Only while queued, so a running job frees the kind of slot it took
+                    job.planned_kind = job_kind(outputs)
+                self._condition.notify_all()
+            self._notify(job)
+
+    def _dispatch(self):
+        with self._condition:
+            while not self._stopping:
+                now = time.time()
+                job = self.queue.take(
+                    self._free_kinds(), self._volume_free,
+                    lambda job: self._priority(job, now, self._served)
+                )
+                if job is None:
+                    self._condition.wait()
+                    continue
+                self._running[job.kind] += 1
+                self._served[job.group] = self._served.get(job.group, 0.0) + (job.estimate or 0.0)
+                self._volumes[job.volume] = self._volumes.get(job.volume, 0) + 1
+                if self.controller is not None:
+                    job.threads = self.controller.threads_for(self, job)
+                threading.Thread(
+                    target=self._execute, args=(job,),
+                    name=f"tracksep-job-{job.id}", daemon=True
+                ).start()
+
+    def _execute(self, job):
+        job.attempts += 1
+        job.error = None
+        job.started_at = time.time()
+        job.finished_at = None
+        job.speed = None
+        self._record(job)
+        self._notify(job)
+
+        def on_progress(percent):
+            job.progress = percent
+            self._notify(job)
+
+        try:
+            self.runner(job, on_progress)
+            status = JobStatus.DONE
+        except Exception as e:
+            job.error = str(e)
+            status = JobStatus.FAILED
+            logger.error(f"Job {job.id} ({job.input_file}) failed on attempt {job.attempts}: {e}")
+        job.finished_at = time.time()
+        if self.estimator is not None and status == JobStatus.DONE:
+            self.estimator.observe(job)
+        record_job(job, JobStatus.CANCELLED if job.cancelled else status)
+
+        with self._condition:
+            self._running[job.kind] -= 1
+            self._volumes[job.volume] -= 1
+            if job.cancelled:
+                job.status = JobStatus.CANCELLED
+            elif status == JobStatus.FAILED and job.attempts <= job.max_retries:
+                job.progress = 0
+                self.queue.requeue(job)
+            else:
+                job.status = status
+            # Journaled before waiters wake up, so a caller that exits after wait() doesn't lose it
+            self._record(job)
+            self._condition.notify_all()
+        self._notify(job)
+
+    def _record(self, job):
+        if self.journal is None:
+            return
+        if self._stopping and job.status == JobStatus.CANCELLED:
+            return  # interrupted by shutdown rather than cancelled by the user
+        self.journal.record(job)
+
+    def _notify(self, job):
+        if self.on_update is not None:
+            self.on_update(job)
@@ -0,0 +1,159 @@
+"""
+Append-only journal of batch job states, for resuming after a crash.
+
+Each line is a JSON record {'job', 'status', 'time', ...} where 'job' is a
+fingerprint of the input file (path, size, mtime) and everything that
+determines the outputs, so the same job gets the same fingerprint in the next
+session. 'queued' records also carry what's needed to rebuild the job; 'done'
+records carry the output paths. The latest record of a fingerprint wins.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from backend.clips import Clip
+from backend.jobs import Job, JobStatus
+from backend.probe_cache import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Rewrite the journal with only the latest record per job once it has this many lines
+COMPACT_LINES = 10000
+
+UNFINISHED = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+def default_journal_path():
+    return os.path.join(default_cache_dir(), 'journal.jsonl')
+
+
+def job_spec(job):
+    """Everything needed to rebuild a job, as JSON-compatible values."""
+    return {
+        'input': os.path.abspath(job.input_file),
+        'output_video': job.output_video and os.path.abspath(job.output_video),
+        'output_audio': job.output_audio and os.path.abspath(job.output_audio),
+        'options': job.options,
+        'video_stream': job.video_stream,
+        'audio_streams': job.audio_streams,
+        'clips': [[clip.start, clip.end] for clip in job.clips],
+        'owner': job.owner,
+        'duration': job.duration,
+        'max_retries': job.max_retries
+    }
+
+
+def job_from_spec(spec):
+    return Job(
+        spec['input'], spec['output_video'], spec['output_audio'], spec['options'],
+        spec['video_stream'], spec['audio_streams'], spec['duration'], spec['max_retries'],
+        clips=[Clip(start, end) for start, end in spec['clips']], owner=spec.get('owner')
+    )
+
+
+def fingerprint(job):
+    """Stable identity of a job: its input file as it is now plus the job spec."""
+    spec = job_spec(job)
+    del spec['duration'], spec['max_retries'], spec['owner']  # don't change what is produced
+    try:
+        stat = os.stat(job.input_file)
+        spec['input_stat'] = [stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        spec['input_stat'] = None
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Journal:
+    """Thread-safe writer and reader of the job journal."""
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        self._lock = threading.Lock()
+        self._fingerprints = {}  # Job.id -> fingerprint, fixed at submission
+
+    def record(self, job):
+        """Append the job's current status (and its spec, when it's queued)."""
+        with self._lock:
+            key = self._fingerprints.get(job.id)
+            if key is None:
+                key = self._fingerprints[job.id] = fingerprint(job)
+        entry = {'job': key, 'status': job.status, 'time': time.time()}
+        if job.status == JobStatus.QUEUED:
+            entry['spec'] = job_spec(job)
+        elif job.status == JobStatus.DONE:
+            entry['outputs'] = [os.path.abspath(output.path) for output in job.outputs]
+        elif job.status in JobStatus.FINISHED:
+            entry['error'] = job.error
+        self._append(entry)
+
+    def latest(self):
+        """Return the latest record of every job, with its last known spec, keyed by fingerprint."""
+        records = {}
+        lines = 0
+        with self._lock:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        lines += 1
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # a line cut short by a crash
+                        previous = records.get(entry.get('job'))
+                        if 'spec' not in entry and previous is not None and 'spec' in previous:
+                            entry['spec'] = previous['spec']
+                        records[entry.get('job')] = entry
+            except OSError:
+                return {}
+            if lines > COMPACT_LINES:
+                self._compact(records)
+        return records
+
+    def unfinished(self):
+        """Rebuild the jobs that were queued or running when the last session ended."""
+        jobs = []
+        for entry in self.latest().values():
+            if entry['status'] in UNFINISHED and 'spec' in entry:
+                try:
+                    job = job_from_spec(entry['spec'])
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Skipping unreadable journal entry {entry['job']}: {e}")
+                    continue
+                # Keep recording under the old key, even if the input changed since
+                with self._lock:
+                    self._fingerprints[job.id] = entry['job']
+                jobs.append(job)
+        return jobs
+
+    def completed(self, job, records=None):
+        """Check whether this exact job already finished and all its outputs are still there."""
+        entry = (records if records is not None else self.latest()).get(fingerprint(job))
+        if entry is None or entry['status'] != JobStatus.DONE:
+            return False
+        return all(os.path.isfile(path) for path in entry.get('outputs', []))
+
+    def _append(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())  # the point is to survive power loss
+            except OSError as e:
+                logger.warning(f"Could not write the job journal: {e}")
+
+    def _compact(self, records):
+        """Rewrite the journal with one record per job. Called with the lock held."""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in records.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not compact the job journal: {e}")
@@ -1,30 +1,94 @@
-import logging
-from PyQt5.QtCore import Q_ARG, QMetaObject, Qt
-
-class LogHandler(logging.Handler):
-    def __init__(self, widget):
-        """
-        Initialize the log handler.
-
-        Args:
-            widget (QWidget): A PyQt5 widget that implements an `append_log` method.
-        """
-        super().__init__()
-        self.widget = widget
-        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-    def emit(self, record):
-        """
-        Emit a log record to the attached PyQt5 widget.
-
-        Args:
-            record (LogRecord): The log record to process.
-        """
-        msg = self.format(record)
-        # Thread-safe update of UI via Qt
-        QMetaObject.invokeMethod(
-            self.widget, 
-            "append_log",
-            Qt.QueuedConnection,
-            Q_ARG(str, msg)
-        )
+import atexit
+import logging
+import logging.handlers
+import queue
+from collections import deque
+from PyQt5.QtCore import QTimer
+
+class LogHandler(logging.Handler):
+    def __init__(self, widget, fps=20, max_pending=10000):
+        """
+        Initialize the log handler.
+
+        Records are only queued by `emit`, from any thread; a timer in the GUI
+        thread hands them to the widget in one batch per frame, so a burst of
+        ffmpeg output costs a few repaints instead of one event per line.
+
+        Args:
+            widget (QWidget): A PyQt5 widget that implements an `append_records` method.
+            fps (int): How many times per second queued records are flushed to the widget.
+            max_pending (int): Records kept between flushes; older ones are dropped beyond that.
+        """
+        super().__init__()
+        self.widget = widget
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+
+        # The timer belongs to the widget, so it runs in (and stops with) the GUI thread
+        self.timer = QTimer(widget)
+        self.timer.setInterval(int(1000 / fps))
+        self.timer.timeout.connect(self.flush_to_widget)
+        self.timer.start()
+
+    def emit(self, record):
+        """
+        Queue a log record for the attached PyQt5 widget.
+
+        Args:
+            record (LogRecord): The log record to process.
+        """
+        try:
+            msg = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append((record.levelno, msg))  # deque appends are thread-safe
+
+    def flush_to_widget(self):
+        records = []
+        while self.pending:
+            records.append(self.pending.popleft())
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            records.insert(0, (logging.WARNING, f"... {dropped} log lines dropped ..."))
+        if records:
+            self.widget.append_records(records)
+
+    def close(self):
+        self.timer.stop()
+        super().close()
+
+
+def start_file_logging(path='tracksep.log', level=logging.INFO, max_bytes=5 * 1024 * 1024, backup_count=3):
+    """
+    Send every log record through a queue to a rotating log file and the console.
+
+    The handlers run in a background listener thread, so logging from worker
+    threads never waits for the disk. Replaces any handlers already on the
+    root logger. The listener is stopped (and the queue drained) at exit.
+
+    Returns:
+        QueueListener: The running listener.
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    stream_handler = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
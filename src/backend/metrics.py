@@ -0,0 +1,290 @@
+"""
+Per-job metrics, exported as JSON lines and as a Prometheus textfile.
+
+Every finished job attempt appends one JSON object to `jobs.jsonl` and
+rewrites `tracksep.prom`, which node_exporter's textfile collector can scrape
+(point --collector.textfile.directory at the metrics directory, or set the
+'metrics_dir' setting to the collector's directory). `jobs.jsonl` is cut
+down to its newest records once it passes MAX_JSONL_BYTES.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from backend.commands import codec_path
+from backend.probe_cache import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+JSONL_NAME = 'jobs.jsonl'
+TEXTFILE_NAME = 'tracksep.prom'
+
+# Counters exported to Prometheus: name -> (JobMetrics attribute or None for a count, help text)
+COUNTERS = {
+    'tracksep_jobs_total': (None, "Finished job attempts by status."),
+    'tracksep_cache_hits_total': ('cached', "Jobs served from the output cache."),
+    'tracksep_queue_wait_seconds_total': ('queue_wait', "Time jobs spent queued."),
+    'tracksep_probe_seconds_total': ('probe_seconds', "Time spent probing inputs."),
+    'tracksep_ffmpeg_wall_seconds_total': ('ffmpeg_wall', "Wall time of ffmpeg processes."),
+    'tracksep_ffmpeg_cpu_seconds_total': ('ffmpeg_cpu', "User plus system CPU time of ffmpeg processes."),
+    'tracksep_read_bytes_total': ('bytes_read', "Input bytes demuxed."),
+    'tracksep_written_bytes_total': ('bytes_written', "Output bytes written."),
+    'tracksep_media_seconds_total': ('media_seconds', "Seconds of media processed.")
+}
+
+# Once jobs.jsonl is this big it's cut down to its newest KEEP_LINES records,
+# which is plenty for the cost estimates that read it back
+MAX_JSONL_BYTES = 16 * 1024 * 1024
+KEEP_LINES = 10000
+
+_SAMPLE_LINE = re.compile(r'^(\w+)(\{[^}]*\})?\s+(\S+)$')
+
+
+class JobMetrics:
+    """Measurements of one job attempt, filled in by `run_job`."""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.input_file = job.input_file
+        self.kind = job.kind
+        self.attempt = job.attempts
+        self.queue_wait = max(0.0, job.started_at - job.queued_at) if job.started_at else 0.0
+        self.probe_seconds = 0.0
+        self.probe_source = None
+        self.phases = []
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.media_seconds = 0.0
+        self.cached = False
+        self.status = None
+        self.error = None
+        self.wall = None
+        self.codec_path = None
+
+    @property
+    def ffmpeg_wall(self):
+        return sum(phase['wall'] for phase in self.phases if phase.get('ffmpeg'))
+
+    @property
+    def ffmpeg_cpu(self):
+        """User plus system CPU seconds of every ffmpeg process, or None if the platform doesn't report it."""
+        times = [phase.get('cpu') for phase in self.phases if phase.get('ffmpeg')]
+        if not times or None in times:
+            return None
+        return sum(times)
+
+    @property
+    def speed_factor(self):
+        """Seconds of media processed per second of ffmpeg wall time (1.0 = realtime)."""
+        wall = self.ffmpeg_wall
+        return self.media_seconds / wall if wall and self.media_seconds else None
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block that doesn't run ffmpeg (e.g. a cache lookup)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({'name': name, 'wall': time.perf_counter() - start})
+
+    def add_command(self, name, usage, returncode, media_seconds=None, bytes_read=0):
+        """Record one ffmpeg run from the `usage` dict filled by `run_ffmpeg`."""
+        cpu = None
+        if usage.get('cpu_user') is not None:
+            cpu = usage['cpu_user'] + usage['cpu_system']
+        self.phases.append({
+            'name': name, 'ffmpeg': True, 'wall': usage.get('wall', 0.0), 'cpu': cpu, 'returncode': returncode
+        })
+        self.media_seconds += media_seconds or 0.0
+        self.bytes_read += bytes_read
+
+    def finish(self, status, error=None, outputs=()):
+        self.status = status
+        self.error = error
+        self.wall = sum(phase['wall'] for phase in self.phases) + self.probe_seconds
+        self.codec_path = codec_path(outputs) if outputs else None
+        self.bytes_written = 0
+        for output in outputs:
+            try:
+                self.bytes_written += os.path.getsize(output.path)
+            except OSError:
+                pass
+
+    def to_dict(self):
+        return {
+            'time': time.time(),
+            'job_id': self.job_id,
+            'input': self.input_file,
+            'kind': self.kind,
+            'codec_path': self.codec_path,
+            'attempt': self.attempt,
+            'status': self.status,
+            'error': self.error,
+            'cached': self.cached,
+            'queue_wait': self.queue_wait,
+            'probe_seconds': self.probe_seconds,
+            'probe_source': self.probe_source,
+            'phases': self.phases,
+            'ffmpeg_wall': self.ffmpeg_wall,
+            'ffmpeg_cpu': self.ffmpeg_cpu,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'media_seconds': self.media_seconds,
+            'speed_factor': self.speed_factor,
+            'wall': self.wall
+        }
+
+
+class MetricsRecorder:
+    """
+    Appends job metrics to a JSON lines file and keeps a Prometheus textfile current.
+
+    Counters continue from the existing textfile, so they keep growing across
+    runs of the CLI and the GUI. Also keeps a short in-memory history for
+    rolling throughput figures.
+    """
+
+    def __init__(self, directory=None, window=300):
+        self.directory = directory or os.path.join(default_cache_dir(), 'metrics')
+        self.window = window
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._counters = self._load_counters()
+
+    @property
+    def jsonl_path(self):
+        return os.path.join(self.directory, JSONL_NAME)
+
+    @property
+    def textfile_path(self):
+        return os.path.join(self.directory, TEXTFILE_NAME)
+
+    def record(self, metrics):
+        data = metrics.to_dict()
+        with self._lock:
+            self._count(data)
+            self._recent.append((time.monotonic(), data))
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(data) + "\n")
+                    size = f.tell()
+                if size > MAX_JSONL_BYTES:
+                    self._trim_jsonl()
+                self._write_textfile()
+            except OSError as e:
+                logger.warning(f"Could not write job metrics: {e}")
+
+    def _trim_jsonl(self):
+        with open(self.jsonl_path, 'r', encoding='utf-8') as f:
+            lines = deque(f, maxlen=KEEP_LINES)
+        tmp_path = f"{self.jsonl_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.jsonl_path)
+
+    def rolling(self):
+        """
+        Throughput over the last `window` seconds.
+
+        Returns:
+            dict: 'jobs', 'failed', 'media_seconds', 'bytes_written', 'realtime'
+            (media seconds per wall second of the window) and 'window'.
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0][0] > self.window:
+                self._recent.popleft()
+            recent = [data for _, data in self._recent]
+        media_seconds = sum(data['media_seconds'] for data in recent)
+        return {
+            'jobs': len(recent),
+            'failed': sum(1 for data in recent if data['status'] != 'done'),
+            'media_seconds': media_seconds,
+            'bytes_written': sum(data['bytes_written'] for data in recent),
+            'realtime': media_seconds / self.window,
+            'window': self.window
+        }
+
+    def _count(self, data):
+        for name, (attribute, _) in COUNTERS.items():
+            if attribute is None:
+                key = (name, f'{{status="{data["status"]}"}}')
+                value = 1
+            else:
+                key = (name, '')
+                # Byte counts and the cache hit flag stay integers, so they're exported exactly
+                value = data[attribute] or 0
+                value = int(value) if isinstance(value, (bool, int)) else float(value)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _load_counters(self):
+        counters = {}
+        try:
+            with open(self.textfile_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    match = _SAMPLE_LINE.match(line.strip())
+                    if match and match.group(1) in COUNTERS:
+                        counters[(match.group(1), match.group(2) or '')] = _parse_value(match.group(3))
+        except (OSError, ValueError):
+            pass
+        return counters
+
+    def _write_textfile(self):
+        lines = []
+        for name, (_, help_text) in COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (counter, labels), value in sorted(self._counters.items()):
+                if counter == name:
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+        last = self._recent[-1][1] if self._recent else None
+        if last is not None and last['speed_factor'] is not None:
+            lines.append("# HELP tracksep_last_speed_factor Realtime speed factor of the last finished job.")
+            lines.append("# TYPE tracksep_last_speed_factor gauge")
+            lines.append(f"tracksep_last_speed_factor {last['speed_factor']:g}")
+
+        # The textfile collector may read at any time, so replace the file atomically
+        tmp_path = f"{self.textfile_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.textfile_path)
+
+
+def _format_value(value):
+    """Exact text of a counter value (`:g` would round to 6 digits, and the rounded value is reloaded)."""
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+
+def default_recorder(directory=None):
+    """Return the shared recorder for `directory` ('' or None for the default location)."""
+    with _recorders_lock:
+        recorder = _recorders.get(directory or None)
+        if recorder is None:
+            recorder = _recorders[directory or None] = MetricsRecorder(directory or None)
+        return recorder
+
+
+def record_job(job, status):
+    """Finish and export the metrics of a job's last attempt, if it ran and metrics are enabled."""
+    if job.metrics is None or job.options.get('metrics') != 'true':
+        return
+    job.metrics.finish(status, job.error, job.outputs)
+    default_recorder(job.options.get('metrics_dir')).record(job.metrics)
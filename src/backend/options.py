@@ -0,0 +1,55 @@
+from pathlib import Path
+
+# Default value of every setting, shared by the Qt settings store and headless callers
+DEFAULTS = {
+    'default_output_folder': str(Path.home() / 'Videos'),
+    'ffmpeg_path': 'ffmpeg',
+    'video_template': '{filename}_video',
+    'audio_template': '{filename}_audio',
+    'theme': 'Fusion',
+    'logging_level': 'INFO',
+    'video_codec': 'copy',
+    'audio_codec': 'aac',
+    'audio_bitrate': '192k',
+    'audio_ladder': '',
+    'single_pass': 'true',
+    'smart_copy': 'true',
+    'chunked_encoding': 'false',
+    'chunk_seconds': '60',
+    'chunk_workers': '0',
+    'output_cache': 'false',
+    'output_cache_mb': '4096',
+    'metrics': 'true',
+    'metrics_dir': '',
+    'batch_cpu_share': '0.5',
+    'batch_io_jobs': '2',
+    'batch_retries': '1',
+    'batch_policy': 'shortest',
+    'adaptive_concurrency': 'true',
+    'batch_max_transcodes': '0',
+    'batch_max_copies': '8',
+    'batch_volume_jobs': '4',
+    'cluster_address': '',
+    'cluster_token': '',
+    'dark_mode': False
+}
+
+# Settings a job never carries: jobs are journaled to disk and sent to workers
+PRIVATE_SETTINGS = ('cluster_token',)
+
+
+class Options:
+    """In-memory settings with the same interface as `Settings`, without Qt."""
+
+    def __init__(self, overrides=None):
+        self.values = dict(DEFAULTS)
+        self.values.update(overrides or {})
+
+    def get(self, key):
+        return self.values.get(key, DEFAULTS.get(key))
+
+    def set(self, key, value):
+        self.values[key] = value
+
+    def snapshot(self):
+        return dict(self.values)
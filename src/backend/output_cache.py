@@ -0,0 +1,245 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from backend.probe_cache import default_cache_dir, ffprobe_version
+
+logger = logging.getLogger(__name__)
+
+# Bump when the meaning of a key or the manifest layout changes
+CACHE_FORMAT = 1
+
+# Bytes read from the start, middle and end of the input for the partial hash
+SAMPLE_SIZE = 1024 * 1024
+
+MANIFEST = 'manifest.json'
+
+
+def partial_hash(path, sample_size=SAMPLE_SIZE):
+    """
+    Hash the size and three samples (start, middle, end) of a file.
+
+    Cheap even for multi-GB inputs, and unlike mtime alone it notices a file
+    that was replaced by a different one with the same timestamp.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, size // 2 - sample_size // 2), max(0, size - sample_size)}):
+            f.seek(offset)
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def _place(source, target, copy=True):
+    """
+    Hardlink `source` to `target`, copying when linking isn't possible (other volume, FAT...).
+
+    With `copy` False, an OSError is raised instead of copying.
+    """
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+        return 'link'
+    except OSError:
+        if not copy:
+            raise
+        shutil.copy2(source, target)
+        return 'copy'
+
+
+class OutputCache:
+    """
+    Content-addressed store of finished extraction outputs.
+
+    An entry is keyed by the input's identity (size, mtime, partial hash), the
+    ffmpeg build and everything that shapes each output (stream, codec and its
+    options, bitrate, clip, container). A hit places the stored files at the
+    requested paths by hardlink (or copy) without running ffmpeg. Only outputs
+    that can be hardlinked into the store are kept, so caching never copies. Entries are
+    directories holding the files plus a manifest; the least recently used ones
+    are evicted once the store grows beyond `max_bytes`.
+    """
+
+    def __init__(self, directory=None, max_bytes=4 * 1024 ** 3):
+        self.directory = directory or os.path.join(default_cache_dir(), 'outputs')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, input_file, outputs, ffmpeg_path):
+        """Return the cache key for producing `outputs` from `input_file`, or None if it can't be read."""
+        try:
+            stat = os.stat(input_file)
+            sample = partial_hash(input_file)
+        except OSError:
+            return None
+        identity = [
+            # `-version` output identifies the ffmpeg build just as it does for ffprobe
+            CACHE_FORMAT, stat.st_size, stat.st_mtime_ns, sample, ffprobe_version(ffmpeg_path),
+            [
+                [
+                    output.kind, output.stream, os.path.splitext(output.path)[1].lower(),
+                    str(output.clip) if output.clip else None,
+                    output.codec_args()
+                ]
+                for output in outputs
+            ]
+        ]
+        return hashlib.sha1(json.dumps(identity).encode('utf-8')).hexdigest()
+
+    def restore(self, key, outputs):
+        """
+        Place the cached files of `key` at the output paths.
+
+        Returns:
+            bool: True on a hit; False if there is no complete, unmodified entry.
+        """
+        if key is None:
+            return False
+        entry = self._entry_dir(key)
+        manifest = self._read_manifest(entry)
+        if manifest is None or len(manifest['files']) != len(outputs):
+            return False
+
+        for stored in manifest['files']:
+            try:
+                stat = os.stat(os.path.join(entry, stored['name']))
+            except OSError:
+                stat = None
+            # Hardlinked outputs share the inode, so editing one in place changes the entry
+            if stat is None or (stat.st_size, stat.st_mtime_ns) != (stored['size'], stored['mtime_ns']):
+                logger.warning(f"Output cache entry {key} was modified, dropping it")
+                self.remove(key)
+                return False
+
+        for stored, output in zip(manifest['files'], outputs):
+            os.makedirs(os.path.dirname(os.path.abspath(output.path)), exist_ok=True)
+            method = _place(os.path.join(entry, stored['name']), output.path)
+            logger.info(f"Output cache hit: {output.path} ({method})")
+        self._touch(entry)
+        return True
+
+    def store(self, key, input_file, outputs):
+        """
+        Add freshly written outputs under `key`, then evict down to the size limit.
+
+        Outputs are only stored by hardlink. Those on another volume than the
+        cache (a NAS, an external disk) are skipped rather than copied, which
+        would write every multi-GB output twice before the job finishes.
+        """
+        if key is None:
+            return
+        staging = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        try:
+            os.makedirs(staging)
+            files = []
+            for position, output in enumerate(outputs):
+                name = f"{position}{os.path.splitext(output.path)[1]}"
+                try:
+                    _place(output.path, os.path.join(staging, name), copy=False)
+                except OSError as e:
+                    logger.info(f"Not caching outputs of {input_file}: can't hardlink {output.path} ({e})")
+                    shutil.rmtree(staging, ignore_errors=True)
+                    return
+                stat = os.stat(os.path.join(staging, name))
+                files.append({
+                    'name': name, 'kind': output.kind, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns
+                })
+            with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump({'input': os.path.abspath(input_file), 'created': time.time(), 'files': files}, f)
+            self.remove(key)
+            os.replace(staging, self._entry_dir(key))
+        except OSError as e:
+            logger.warning(f"Could not store outputs in the cache: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """
+        List the cached entries, most recently used first.
+
+        Returns:
+            list[dict]: 'key', 'input', 'files', 'bytes' and 'last_used' (epoch seconds) per entry.
+        """
+        entries = []
+        try:
+            scan = list(os.scandir(self.directory))
+        except OSError:
+            return entries
+        for item in scan:
+            if item.name.startswith('.') or not item.is_dir():
+                continue
+            manifest = self._read_manifest(item.path)
+            if manifest is None:
+                continue
+            entries.append({
+                'key': item.name,
+                'input': manifest.get('input'),
+                'files': len(manifest['files']),
+                'bytes': sum(stored['size'] for stored in manifest['files']),
+                'last_used': os.path.getmtime(os.path.join(item.path, MANIFEST))
+            })
+        entries.sort(key=lambda entry: entry['last_used'], reverse=True)
+        return entries
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'directory': self.directory,
+            'entries': len(entries),
+            'bytes': sum(entry['bytes'] for entry in entries),
+            'max_bytes': self.max_bytes
+        }
+
+    def evict(self):
+        """Drop the least recently used entries until the store fits in `max_bytes`."""
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry['bytes'] for entry in entries)
+            while entries and total > self.max_bytes:
+                entry = entries.pop()
+                self.remove(entry['key'])
+                total -= entry['bytes']
+
+    def remove(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def purge(self):
+        """Delete every entry. Outputs placed by hardlink elsewhere are unaffected."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def _read_manifest(self, entry):
+        try:
+            with open(os.path.join(entry, MANIFEST), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest.get('files'), list) else None
+
+    def _touch(self, entry):
+        try:
+            os.utime(os.path.join(entry, MANIFEST))  # mark as recently used for eviction
+        except OSError:
+            pass
+
+
+_default_cache = None
+
+
+def default_output_cache(max_bytes=None):
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = OutputCache()
+    if max_bytes is not None:
+        _default_cache.max_bytes = max_bytes
+    return _default_cache
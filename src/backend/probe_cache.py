@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of cached StreamInfo data changes
+CACHE_FORMAT = 3
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def default_cache_dir():
+    """Per-user cache directory for TrackSep (XDG on Linux, LOCALAPPDATA on Windows)."""
+    if sys.platform == "win32":
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == "darwin":
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'tracksep')
+
+
+def ffprobe_version(ffprobe_path):
+    """Return the first line of `ffprobe -version`, spawning it at most once per path."""
+    with _versions_lock:
+        if ffprobe_path in _versions:
+            return _versions[ffprobe_path]
+    try:
+        result = subprocess.run([ffprobe_path, "-version"], capture_output=True, text=True)
+        version = result.stdout.splitlines()[0] if result.stdout else ''
+    except OSError:
+        version = ''
+    with _versions_lock:
+        _versions[ffprobe_path] = version
+    return version
+
+
+class ProbeCache:
+    """
+    Two-level cache of ffprobe results.
+
+    Entries are keyed by (path, size, mtime, ffprobe version), so editing or
+    replacing a file, or upgrading FFmpeg, naturally invalidates them. The
+    in-memory level is a small LRU; the on-disk level stores one JSON file
+    per entry and evicts the least recently used ones beyond `max_disk_entries`.
+    """
+
+    def __init__(self, directory=None, max_memory_entries=256, max_disk_entries=5000):
+        self.directory = directory or os.path.join(default_cache_dir(), 'probe')
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def key(self, input_file, ffprobe_path):
+        """Return the cache key for a file, or None if it can't be stat'ed."""
+        try:
+            stat = os.stat(input_file)
+        except OSError:
+            return None
+        identity = [
+            CACHE_FORMAT, os.path.abspath(input_file), stat.st_size, stat.st_mtime_ns,
+            ffprobe_version(ffprobe_path)
+        ]
+        return hashlib.sha1(json.dumps(identity).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            os.utime(path)  # mark as recently used for eviction
+        except (OSError, ValueError):
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        if key is None:
+            return
+        self._remember(key, data)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self._path(key) + f".{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write probe cache entry: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % 64 == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used on-disk entries beyond the size limit."""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.directory)
+                if entry.name.endswith('.json')
+            ]
+        except OSError:
+            return
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        try:
+            for entry in os.scandir(self.directory):
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ProbeCache()
+    return _default_cache
@@ -0,0 +1,22 @@
+import logging
+from PyQt5.QtCore import QThread, pyqtSignal
+from backend.stream_info import StreamInfo
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeThread(QThread):
+    """Probe a file's streams off the GUI thread."""
+
+    probed = pyqtSignal(str, object)  # input file, StreamInfo
+
+    def __init__(self, input_file, ffmpeg_path, parent=None):
+        super().__init__(parent)
+        self.input_file = input_file
+        self.ffmpeg_path = ffmpeg_path
+
+    def run(self):
+        stream_info = StreamInfo(self.input_file, self.ffmpeg_path)
+        if stream_info.from_cache:
+            logger.info(f"Using cached stream info for {self.input_file}")
+        self.probed.emit(self.input_file, stream_info)
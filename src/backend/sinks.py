@@ -0,0 +1,248 @@
+"""
+Outputs written to a pipe instead of a file, so a consumer such as a
+speech-to-text stage can start on the audio while it's still being extracted.
+
+A sink takes the place of an output path (`backend.api.extract(input,
+{'audio': sink})`):
+
+- `PipeSink('-')`: the process's stdout; `PipeSink(3)`: an inherited file descriptor;
+  `PipeSink('/path/to/fifo')`: a named pipe, opened by ffmpeg like a file.
+  '-' and the path of an existing FIFO may be given as plain strings.
+- `CallbackSink(callback)`: a Python callable, called with each chunk of bytes.
+
+ffmpeg writes straight into the pipe: there's no temporary file, no rename
+at the end and no output cache. Formats that normally need a seekable file
+are muxed for streaming (fragmented MP4/M4A). With `raw=True`, audio is sent
+as headerless 16-bit little-endian PCM, the usual input of speech models.
+
+A callback runs on a thread of its own, fed through a queue of at most
+`max_chunks` chunks. When it falls behind, the queue fills, the thread
+reading ffmpeg's output stops, the pipe fills and ffmpeg waits: memory use
+stays bounded however slow the consumer is.
+"""
+import logging
+import os
+import queue
+import stat
+import subprocess
+import threading
+
+from backend.capabilities import MUXERS
+from backend.commands import audio_extension
+
+logger = logging.getLogger(__name__)
+
+# Muxer options for formats whose default layout is written with seeks
+STREAMING_MUXER_ARGS = {
+    'mp4': ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"],
+    'ipod': ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+}
+
+RAW_CODEC = 'pcm_s16le'
+RAW_FORMAT = 's16le'
+
+
+class SinkError(Exception):
+    """A sink can't be used, or its callback failed."""
+
+
+def is_fifo(path):
+    try:
+        return stat.S_ISFIFO(os.stat(path).st_mode)
+    except (OSError, TypeError, ValueError):
+        return False
+
+
+class PipeSink:
+    """An output sent to stdout, an inherited file descriptor or a named pipe."""
+
+    def __init__(self, target='-', raw=False, sample_rate=None, channels=None):
+        """
+        Args:
+            target (str or int): '-' for stdout, a file descriptor number, or the path of a FIFO.
+            raw (bool): Send audio as headerless s16le PCM instead of the encoded track.
+            sample_rate (int): With `raw`, resample to this rate, e.g. 16000.
+            channels (int): With `raw`, mix down to this many channels.
+        """
+        if target in ('-', 'pipe:', 'pipe:1'):
+            target = 1
+        if isinstance(target, int):
+            if target in (0, 2):
+                raise SinkError("ffmpeg reads stdin and reports progress on stderr; use stdout or another descriptor")
+        elif not is_fifo(target):
+            raise SinkError(f"{target} is not a named pipe")
+        self.target = target
+        self.raw = raw
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    @property
+    def fd(self):
+        """File descriptor ffmpeg inherits and writes to, or None for a FIFO."""
+        return self.target if isinstance(self.target, int) else None
+
+    @property
+    def url(self):
+        """What ffmpeg is told to write to."""
+        return f"pipe:{self.fd}" if self.fd is not None else self.target
+
+    def codec(self, codec):
+        """The codec an output sent here uses instead of the `codec` setting."""
+        return RAW_CODEC if self.raw else codec
+
+    def format_args(self, output):
+        """ffmpeg options for writing `output` (an OutputSpec) to a pipe, which can't seek."""
+        if self.raw:
+            args = []
+            if self.sample_rate:
+                args.extend(["-ar", str(self.sample_rate)])
+            if self.channels:
+                args.extend(["-ac", str(self.channels)])
+            return args + ["-f", RAW_FORMAT]
+        # A copied stream keeps the container of the codec that was asked for
+        muxer = MUXERS['mp4'] if output.kind == 'video' else MUXERS.get(audio_extension(output.requested_codec), 'ipod')
+        return STREAMING_MUXER_ARGS.get(muxer, []) + ["-f", muxer]
+
+    def __str__(self):
+        if self.fd == 1:
+            return 'stdout'
+        return f"fd {self.fd}" if self.fd is not None else self.target
+
+
+class CallbackSink(PipeSink):
+    """An output handed to a Python callable, chunk by chunk, while ffmpeg writes it."""
+
+    def __init__(self, callback, raw=False, sample_rate=None, channels=None, chunk_size=64 * 1024, max_chunks=16):
+        """
+        Args:
+            callback (callable): Called with each chunk (bytes), in order, on a
+                thread of its own. Every chunk has been delivered when the job
+                returns. An exception stops ffmpeg and fails the job.
+            chunk_size (int): Most bytes per chunk.
+            max_chunks (int): Chunks buffered for a callback that's behind.
+            Others as for PipeSink.
+        """
+        self.callback = callback
+        self.target = 1  # ffmpeg's stdout, connected to a pipe read by the sink
+        self.raw = raw
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+
+    def __str__(self):
+        return f"callback {getattr(self.callback, '__name__', repr(self.callback))}"
+
+
+def as_sink(target):
+    """
+    Return `target` as a sink if it names one ('-', a FIFO path or a sink object), else None for a file path.
+    """
+    if isinstance(target, PipeSink):
+        return target
+    if target == '-' or is_fifo(target):
+        return PipeSink(target)
+    return None
+
+
+class _Feeder:
+    """Reads one ffmpeg process's stdout into a bounded queue emptied by a callback thread."""
+
+    _END = object()
+
+    def __init__(self, sink, read_fd):
+        self.sink = sink
+        self.read_fd = read_fd
+        self.chunks = queue.Queue(sink.max_chunks)
+        self.error = None
+        self._failed = threading.Event()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._consumer = threading.Thread(target=self._consume, daemon=True)
+
+    def start(self):
+        self._reader.start()
+        self._consumer.start()
+
+    def _put(self, item):
+        while not self._failed.is_set():
+            try:
+                self.chunks.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self):
+        try:
+            while True:
+                data = os.read(self.read_fd, self.sink.chunk_size)
+                if not data or not self._put(data):
+                    break
+        finally:
+            # Closing the read end makes ffmpeg fail on its next write if the callback gave up
+            os.close(self.read_fd)
+            self._put(self._END)
+
+    def _consume(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is self._END:
+                return
+            try:
+                self.sink.callback(chunk)
+            except Exception as e:
+                logger.error(f"Output callback failed: {e}")
+                self.error = e
+                self._failed.set()
+                return
+
+    def join(self):
+        self._reader.join()
+        self._consumer.join()
+
+
+class Pipes:
+    """
+    Connects an ffmpeg process to the sinks of the outputs it writes.
+
+    Pass `stdout` and `pass_fds` to the process and call `started()` right
+    after spawning it, whether that worked or not; then `finish()` once it exited.
+    """
+
+    def __init__(self, sinks):
+        self.stdout = subprocess.DEVNULL
+        self.pass_fds = ()
+        self._feeder = None
+        self._write_fd = None
+        fds = [sink.fd for sink in sinks if sink.fd is not None]
+        if len(fds) != len(set(fds)):
+            raise SinkError("Outputs written by one ffmpeg process can't share a pipe")
+        for sink in sinks:
+            if isinstance(sink, CallbackSink):
+                read_fd, self._write_fd = os.pipe()
+                self._feeder = _Feeder(sink, read_fd)
+                self.stdout = self._write_fd
+            elif sink.fd == 1:
+                self.stdout = None  # inherit ours
+            elif sink.fd is not None:
+                self.pass_fds += (sink.fd,)
+
+    def started(self):
+        if self._write_fd is not None:
+            # ffmpeg holds the write end now; the reader sees EOF once it exits
+            os.close(self._write_fd)
+            self._write_fd = None
+        if self._feeder is not None:
+            self._feeder.start()
+
+    def finish(self):
+        """
+        Wait for every chunk to reach its callback.
+
+        Raises:
+            SinkError: If the callback raised.
+        """
+        if self._feeder is not None:
+            self._feeder.join()
+            if self._feeder.error is not None:
+                raise SinkError(f"Output callback failed: {self._feeder.error}") from self._feeder.error
@@ -0,0 +1,75 @@
+"""
+Startup profiling for the GUI.
+
+Run `python -m src.main --profile-startup` (or set TRACKSEP_PROFILE_STARTUP=1)
+to get the wall time of each startup phase (imports, settings, window
+construction, first paint) on stderr and in the log once the window is up.
+Without it the phases are still timed, which is cheap, but nothing is printed.
+"""
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+FLAG = '--profile-startup'
+ENV_VAR = 'TRACKSEP_PROFILE_STARTUP'
+
+
+class StartupProfile:
+    """Wall time of named startup phases, measured from when the profile was created."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases = []  # (name, seconds)
+        self._last = self.started
+
+    @classmethod
+    def from_argv(cls, argv=None):
+        """Enable profiling if FLAG is in `argv` (removed from it) or ENV_VAR is set."""
+        argv = sys.argv if argv is None else argv
+        enabled = os.environ.get(ENV_VAR, '') not in ('', '0')
+        if FLAG in argv:
+            argv.remove(FLAG)  # Qt would otherwise see it
+            enabled = True
+        return cls(enabled)
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of startup work."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases.append((name, self._last - start))
+
+    def mark(self, name):
+        """Record the time since the previous phase ended, e.g. until the event loop got to a timer."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+    def report(self):
+        """Table of phases and their share of the total."""
+        total = self.total or 1e-9
+        lines = [f"Startup took {self.total * 1000:.0f} ms:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {seconds * 1000:8.1f} ms  {seconds / total:4.0%}  {name}")
+        return "\n".join(lines)
+
+    def finish(self, name="first paint"):
+        """Mark the end of startup and print the report if profiling is enabled."""
+        self.mark(name)
+        if not self.enabled:
+            return
+        report = self.report()
+        print(report, file=sys.stderr)
+        logger.info(report)
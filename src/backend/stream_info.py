@@ -1,54 +1,150 @@
-import subprocess
-import json
-import logging
-
-# Configure logger
-logging.basicConfig(level=logging.ERROR)
-logger = logging.getLogger(__name__)
-
-
-class StreamInfo:
-    def __init__(self, input_file, ffmpeg_path):
-        self.input_file = input_file
-        self.ffmpeg_path = ffmpeg_path
-        self.video_streams = []
-        self.audio_streams = []
-        self.probe_streams()
-
-    def probe_streams(self):
-        try:
-            # Get ffprobe path from ffmpeg path
-            ffprobe_path = self.ffmpeg_path.replace('ffmpeg', 'ffprobe')
-            command = [
-                ffprobe_path,
-                "-v", "quiet",
-                "-print_format", "json",
-                "-show_streams",
-                self.input_file
-            ]
-            result = subprocess.run(
-                command, capture_output=True, text=True
-            )
-            
-            if result.returncode != 0:
-                logger.error(f"FFprobe failed: {result.stderr}")
-                return
-
-            streams = json.loads(result.stdout).get('streams', [])
-            
-            for stream in streams:
-                if (stream['codec_type'] == 'video'):
-                    self.video_streams.append({
-                        'index': stream['index'],
-                        'codec': stream['codec_name'],
-                        'resolution': f"{stream.get('width', '?')}x{stream.get('height', '?')}"
-                    })
-                elif (stream['codec_type'] == 'audio'):
-                    self.audio_streams.append({
-                        'index': stream['index'],
-                        'codec': stream['codec_name'],
-                        'channels': stream.get('channels', '?'),
-                        'sample_rate': stream.get('sample_rate', '?')
-                    })
-        except Exception as e:
-            logger.error(f"Error probing streams: {str(e)}")
+import subprocess
+import json
+import logging
+from backend.capabilities import ffprobe_path_for
+from backend.container_parser import ContainerParseError, parse_container
+from backend.probe_cache import default_cache
+
+# Configure logger
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+
+class StreamInfo:
+    def __init__(self, input_file, ffmpeg_path, cache=None, use_cache=True, use_native_parser=True, probe=True):
+        self.input_file = input_file
+        self.ffmpeg_path = ffmpeg_path
+        self.cache = (cache or default_cache()) if use_cache else None
+        self.use_native_parser = use_native_parser
+        self.video_streams = []
+        self.audio_streams = []
+        self.duration = None
+        self.from_cache = False
+        self.source = None  # 'cache', 'native' or 'ffprobe'
+        self._key = None
+        if probe:
+            self.probe_streams()
+
+    def probe_streams(self):
+        if not self.probe_local() and self.run_ffprobe(ffprobe_path_for(self.ffmpeg_path)):
+            self.probed('ffprobe')
+
+    def probe_local(self):
+        """
+        Fill in the streams from the probe cache or the container headers.
+
+        Returns:
+            bool: False if ffprobe has to be run; `backend.aio` runs it without blocking.
+        """
+        if self.cache:
+            self._key = self.cache.key(self.input_file, ffprobe_path_for(self.ffmpeg_path))
+            cached = self.cache.get(self._key)
+            if cached is not None:
+                self.load(cached)
+                self.from_cache = True
+                self.source = 'cache'
+                return True
+
+        if self.use_native_parser and self.parse_headers():
+            self.probed('native')
+            return True
+        return False
+
+    def probed(self, source):
+        """Record where the streams came from and cache them."""
+        self.source = source
+        if self.cache:
+            self.cache.put(self._key, self.to_dict())
+
+    def parse_headers(self):
+        """Read the stream table straight from MP4/MKV headers, skipping the ffprobe spawn."""
+        try:
+            self.load(parse_container(self.input_file))
+            return True
+        except ContainerParseError as e:
+            logger.debug(f"Falling back to ffprobe: {e}")
+            return False
+
+    def ffprobe_command(self, ffprobe_path):
+        return [
+            ffprobe_path,
+            "-v", "quiet",
+            "-print_format", "json",
+            "-show_streams",
+            "-show_format",
+            self.input_file
+        ]
+
+    def run_ffprobe(self, ffprobe_path):
+        try:
+            result = subprocess.run(
+                self.ffprobe_command(ffprobe_path), capture_output=True, text=True
+            )
+        except OSError as e:
+            logger.error(f"Error probing streams: {str(e)}")
+            return False
+        if result.returncode != 0:
+            logger.error(f"FFprobe failed: {result.stderr}")
+            return False
+        return self.load_ffprobe(result.stdout)
+
+    def load_ffprobe(self, output):
+        """Fill in the streams from ffprobe's JSON output. Returns False if it can't be read."""
+        try:
+            probe = json.loads(output)
+            streams = probe.get('streams', [])
+
+            try:
+                self.duration = float(probe.get('format', {}).get('duration'))
+            except (TypeError, ValueError):
+                self.duration = None
+            
+            for stream in streams:
+                if (stream['codec_type'] == 'video'):
+                    self.video_streams.append({
+                        'index': stream['index'],
+                        'codec': stream['codec_name'],
+                        'resolution': f"{stream.get('width', '?')}x{stream.get('height', '?')}",
+                        'bit_rate': stream.get('bit_rate')
+                    })
+                elif (stream['codec_type'] == 'audio'):
+                    self.audio_streams.append({
+                        'index': stream['index'],
+                        'codec': stream['codec_name'],
+                        'channels': stream.get('channels', '?'),
+                        'sample_rate': stream.get('sample_rate', '?'),
+                        'bit_rate': stream.get('bit_rate'),
+                        'language': stream.get('tags', {}).get('language'),
+                        'title': stream.get('tags', {}).get('title')
+                    })
+            return True
+        except Exception as e:
+            logger.error(f"Error probing streams: {str(e)}")
+            return False
+
+    def find_stream(self, index, kind):
+        """
+        Return the stream ffmpeg will use for `kind` ('video' or 'audio').
+
+        With no explicit index this is only known when there is a single candidate.
+        """
+        streams = self.video_streams if kind == 'video' else self.audio_streams
+        if index is None:
+            return streams[0] if len(streams) == 1 else None
+        for stream in streams:
+            if stream['index'] == index:
+                return stream
+        return None
+
+    def to_dict(self):
+        return {
+            'video_streams': self.video_streams,
+            'audio_streams': self.audio_streams,
+            'duration': self.duration
+        }
+
+    def load(self, data):
+        # Copy so callers can't modify the cached entry
+        self.video_streams = [dict(stream) for stream in data.get('video_streams', [])]
+        self.audio_streams = [dict(stream) for stream in data.get('audio_streams', [])]
+        self.duration = data.get('duration')
@@ -0,0 +1,365 @@
+"""
+Watch-folder ingestion: extract every recording dropped into a set of folders.
+
+New files are noticed through inotify on Linux (via ctypes, no extra
+dependency) and by polling elsewhere. A file is only queued once its size and
+modification time have stopped changing for `settle_seconds`, so recordings
+still being written or copied are left alone. A settled file is probed on a
+small thread pool, through the probe cache, so a slow ffprobe doesn't hold up
+the watch loop. Finished files are tracked in a JSON state file, so a
+restarted daemon skips them unless they change.
+"""
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.commands import output_paths
+from backend.concurrency import scheduler_from_options
+from backend.extractor import run_job
+from backend.jobs import ALL_STREAMS, Job, JobStatus
+from backend.probe_cache import default_cache_dir
+from backend.stream_info import StreamInfo
+
+logger = logging.getLogger(__name__)
+
+# Same types the GUI's file dialog offers
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov')
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+PROBE_WORKERS = 2  # settled files probed at once
+SAVE_INTERVAL = 5.0  # seconds between writes of the state file while files are being handled
+PRUNE_INTERVAL = 3600.0  # seconds between checks for state entries whose file is gone
+
+
+def default_state_path():
+    return os.path.join(default_cache_dir(), 'watch_state.json')
+
+
+def _signature(path):
+    """(size, mtime_ns) of a file, or None if it's gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class PollingWatcher:
+    """Finds new or changed files by listing the folders every `interval` seconds."""
+
+    def __init__(self, directories, interval=2.0):
+        self.directories = directories
+        self.interval = interval
+        self._seen = {}
+
+    def changes(self, timeout):
+        """Wait up to `timeout` seconds and return the paths that appeared or changed."""
+        time.sleep(min(timeout, self.interval))
+        changed = []
+        for path in scan(self.directories):
+            signature = _signature(path)
+            if signature is not None and self._seen.get(path) != signature:
+                self._seen[path] = signature
+                changed.append(path)
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Finds new or changed files through Linux inotify events."""
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directories):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+            self._directories[wd] = directory
+
+    def changes(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; fall back to a full listing
+                return list(scan(self._directories.values()))
+            if name and wd in self._directories:
+                changed.append(os.path.join(self._directories[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def make_watcher(directories, poll_interval=2.0):
+    """Return an inotify watcher where available, otherwise a polling one."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), polling instead")
+    return PollingWatcher(directories, poll_interval)
+
+
+def is_candidate(path, extensions=VIDEO_EXTENSIONS):
+    name = os.path.basename(path)
+    return not name.startswith('.') and name.lower().endswith(extensions)
+
+
+def scan(directories, extensions=VIDEO_EXTENSIONS):
+    """Yield the candidate files directly inside `directories`."""
+    for directory in directories:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            logger.warning(f"Cannot list {directory}: {e}")
+            continue
+        for entry in entries:
+            if entry.is_file() and is_candidate(entry.path, extensions):
+                yield entry.path
+
+
+class WatchState:
+    """
+    Durable record of the files the daemon has handled.
+
+    Keyed by absolute path; an entry only counts while the file still has the
+    recorded size and mtime, so a replaced recording is processed again.
+    Changes are written by `save`, at most every `save_interval` seconds; a
+    crash loses at most the files handled since then, which are redone.
+    """
+
+    def __init__(self, path=None, save_interval=SAVE_INTERVAL):
+        self.path = path or default_state_path()
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._files = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            self._files = {}
+
+    def handled(self, path):
+        """Check whether `path`, as it is now, was already processed, skipped or produced by a job."""
+        with self._lock:
+            entry = self._files.get(os.path.abspath(path))
+        return entry is not None and list(_signature(path) or []) == entry['signature']
+
+    def mark(self, path, status, error=None):
+        signature = _signature(path)
+        if signature is None:
+            return
+        with self._lock:
+            self._files[os.path.abspath(path)] = {
+                'signature': list(signature), 'status': status, 'error': error, 'time': time.time()
+            }
+            self._dirty = True
+
+    def prune(self):
+        """Forget the files that no longer exist. Returns how many entries were dropped."""
+        with self._lock:
+            paths = list(self._files)
+        gone = [path for path in paths if not os.path.exists(path)]  # stat'ed unlocked: may be a slow share
+        if gone:
+            with self._lock:
+                for path in gone:
+                    self._files.pop(path, None)
+                self._dirty = True
+        return len(gone)
+
+    def save(self, force=False):
+        """Write the changes, unless the last write was less than `save_interval` seconds ago and not `force`."""
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._saved_at < self.save_interval):
+                return
+            self._write()
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def _write(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self._files}, f, indent=1)
+        os.replace(tmp_path, self.path)  # a crash never leaves a half-written state file
+
+
+class WatchFolder:
+    """Watch folders and extract every file that settles in them through the batch scheduler."""
+
+    def __init__(self, directories, options, output_folder='', state=None,
+                 settle_seconds=10.0, poll_interval=2.0, audio_streams=ALL_STREAMS, on_update=None):
+        """
+        Args:
+            directories (list[str]): Folders to watch (not recursive).
+            options (dict): Settings snapshot for the jobs, including the batch limits.
+            output_folder (str): Where outputs go; empty writes next to each input.
+            state (WatchState): Processed-file record; the default state file if None.
+            settle_seconds (float): How long size and mtime must stay unchanged before a file is queued.
+            poll_interval (float): Listing interval when inotify isn't available.
+            audio_streams: Audio selection for every job (ALL_STREAMS by default).
+            on_update (callable): Called with each job whenever its state changes.
+        """
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.options = dict(options)
+        self.output_folder = output_folder
+        self.state = state or WatchState()
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.audio_streams = audio_streams
+        self.on_update = on_update
+        self.scheduler = scheduler_from_options(run_job, self.options, on_update=self._job_updated)
+        self._pending = {}  # path -> (signature, time it was last seen changing)
+        # Changed on probe and scheduler threads as well as the watch loop
+        self._lock = threading.Lock()
+        self._queued = set()  # probing, queued or running
+        self._outputs = set()  # files written by our own jobs, never inputs
+        self._probes = None
+
+    def run(self, stop_event):
+        """Watch until `stop_event` is set, then cancel the jobs still queued or running."""
+        watcher = make_watcher(self.directories, self.poll_interval)
+        logger.info(f"Watching {', '.join(self.directories)} ({type(watcher).__name__})")
+        self._probes = ThreadPoolExecutor(PROBE_WORKERS, thread_name_prefix='tracksep-probe')
+        self.scheduler.start()
+        # Files dropped while the daemon wasn't running
+        for path in scan(self.directories):
+            self._notice(path)
+        pruned_at = 0.0
+        try:
+            while not stop_event.is_set():
+                if time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                    self.state.prune()
+                    pruned_at = time.monotonic()
+                for path in watcher.changes(timeout=1.0):
+                    if is_candidate(path):
+                        self._notice(path)
+                self._enqueue_settled()
+                self.state.save()
+        finally:
+            watcher.close()
+            # Probes still waiting are dropped; the files are picked up again on the next start
+            self._probes.shutdown(wait=True, cancel_futures=True)
+            # Cancelled jobs aren't recorded as handled, so they run again after a restart
+            self.scheduler.stop(cancel_running=True)
+            self.scheduler.wait(timeout=30)
+            self.state.save(force=True)
+
+    def _notice(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            ours = path in self._queued or path in self._outputs
+        if ours or self.state.handled(path):
+            return
+        signature = _signature(path)
+        if signature is not None and self._pending.get(path, (None,))[0] != signature:
+            self._pending[path] = (signature, time.monotonic())
+
+    def _enqueue_settled(self):
+        now = time.monotonic()
+        for path, (signature, since) in list(self._pending.items()):
+            current = _signature(path)
+            if current is None:
+                del self._pending[path]  # deleted or moved away
+            elif current != signature:
+                self._pending[path] = (current, now)  # still growing
+            elif now - since >= self.settle_seconds:
+                del self._pending[path]
+                with self._lock:
+                    if path in self._outputs:
+                        continue
+                    self._queued.add(path)
+                self._probes.submit(self._enqueue, path)
+
+    def _enqueue(self, path):
+        """Probe a settled file and queue its job; runs on the probe pool."""
+        try:
+            stream_info = StreamInfo(path, self.options.get('ffmpeg_path'))  # cached, see backend.probe_cache
+        except Exception:
+            logger.exception(f"Probing {path} failed")  # noticed again when it changes
+            with self._lock:
+                self._queued.discard(path)
+            return
+        if not stream_info.video_streams and not stream_info.audio_streams:
+            logger.warning(f"Skipping {path}: no audio or video streams")
+            self.state.mark(path, 'skipped', "no audio or video streams")
+            with self._lock:
+                self._queued.discard(path)
+            return
+
+        output_video, output_audio = output_paths(
+            path, self.output_folder, self.options['video_template'],
+            self.options['audio_template'], self.options['audio_codec']
+        )
+        job = Job(
+            path,
+            output_video if stream_info.video_streams else None,
+            output_audio if stream_info.audio_streams else None,
+            self.options, audio_streams=self.audio_streams if stream_info.audio_streams else None,
+            duration=stream_info.duration, max_retries=int(self.options['batch_retries'])
+        )
+        # Planned output names are known up front except for per-track placeholders
+        with self._lock:
+            self._outputs.update(os.path.abspath(p) for p in (output_video, output_audio) if p)
+        logger.info(f"Queued {path}")
+        self.scheduler.submit(job)
+
+    def _job_updated(self, job):
+        with self._lock:
+            self._outputs.update(os.path.abspath(output.path) for output in job.outputs)
+            if job.status in JobStatus.FINISHED:
+                self._queued.discard(job.input_file)
+        if job.status in JobStatus.FINISHED:
+            if job.status == JobStatus.CANCELLED:
+                return  # interrupted by shutdown, so redo it on the next start
+            # Failed files aren't retried until they change; edit or touch them to try again
+            self.state.mark(job.input_file, job.status, job.error)
+            for output in job.outputs:
+                self.state.mark(output.path, 'output')
+            if job.status == JobStatus.DONE:
+                logger.info(f"Finished {job.input_file}")
+            else:
+                logger.error(f"Failed {job.input_file}: {job.error}")
+        if self.on_update is not None:
+            self.on_update(job)
@@ -0,0 +1,440 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+from backend.api import ExtractionResult, extract, make_options
+from backend.clips import ClipError, clip_from_fields, parse_clip
+from backend.commands import output_paths, parse_audio_ladder
+from backend.concurrency import scheduler_from_options
+from backend.extractor import run_job
+from backend.jobs import ALL_STREAMS, POLICIES, Job, JobStatus
+from backend.journal import Journal
+from backend.output_cache import default_output_cache
+from backend.sinks import PipeSink, SinkError, is_fifo
+
+# The cluster, watch-folder and capability modules are imported by the modes that use
+# them, so a plain extraction doesn't pay for them
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1  # at least one job failed
+EXIT_USAGE = 2  # bad arguments (also used by argparse)
+EXIT_NO_INPUT = 3  # no input matched
+EXIT_INTERRUPTED = 130
+
+
+def expand_inputs(patterns):
+    """Expand glob patterns (shells on Windows don't) and drop duplicates, keeping order."""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path) and path not in files:
+                files.append(path)
+    return files
+
+
+def parse_audio_streams(value):
+    if value.strip().lower() == ALL_STREAMS:
+        return ALL_STREAMS
+    try:
+        return [int(index) for index in value.split(',') if index.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'all' or comma-separated stream indexes, got {value!r}")
+
+
+def parse_clip_arg(value):
+    try:
+        return parse_clip(value)
+    except ClipError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_ladder_arg(value):
+    try:
+        parse_audio_ladder(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def parse_address_arg(value):
+    from backend.cluster import parse_address
+    try:
+        parse_address(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def parse_path_map(value):
+    remote, separator, local = value.partition('=')
+    if not separator or not remote or not local:
+        raise argparse.ArgumentTypeError(f"expected REMOTE=LOCAL, got {value!r}")
+    return remote, local
+
+
+def parse_pipe_target(value):
+    """'-' for stdout, 'fd:N' for an inherited file descriptor, else the path of a FIFO."""
+    if value.startswith('fd:'):
+        try:
+            return int(value[3:])
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected fd:NUMBER, got {value!r}")
+    if value != '-' and not is_fifo(value):
+        raise argparse.ArgumentTypeError(f"{value} is not a named pipe (create it with mkfifo)")
+    return value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="tracksep-cli",
+        description="Separate video and audio tracks with FFmpeg, without the GUI."
+    )
+    parser.add_argument("inputs", nargs="*", help="input files or glob patterns (e.g. 'masters/**/*.mkv')")
+    parser.add_argument("-o", "--output-dir", default="", help="output folder (default: next to each input)")
+    parser.add_argument("--video-template", help="video filename template, e.g. '{filename}_video'")
+    parser.add_argument("--audio-template",
+                        help="audio filename template, e.g. '{filename}_audio_{lang}'; also accepts {index} and {title}")
+    parser.add_argument("--video-codec", help="copy, h264, h265 or vp9")
+    parser.add_argument("--audio-codec", help="aac, mp3, flac or opus")
+    parser.add_argument("--audio-bitrate", help="e.g. 192k")
+    parser.add_argument("--audio-ladder", type=parse_ladder_arg,
+                        help="encode each audio track to several formats in one pass, e.g. 'aac:192k,mp3:320k,flac'")
+    parser.add_argument("--video-stream", type=int, help="input stream index to use for video")
+    parser.add_argument("--audio-streams", type=parse_audio_streams,
+                        help="audio stream indexes to extract, comma-separated, or 'all'")
+    parser.add_argument("--start", help="extract from this time on (seconds or [HH:]MM:SS[.mmm])")
+    parser.add_argument("--end", help="extract up to this time")
+    parser.add_argument("--duration", help="extract this much from --start")
+    parser.add_argument("--clip", dest="clips", action="append", type=parse_clip_arg, default=[],
+                        help="cut a clip, 'START-END' or 'START+DURATION'; repeat for several clips in one pass "
+                             "(output templates accept {clip})")
+    parser.add_argument("--no-video", action="store_true", help="skip the video output")
+    parser.add_argument("--no-audio", action="store_true", help="skip the audio output")
+    parser.add_argument("--audio-to", metavar="PIPE", type=parse_pipe_target,
+                        help="stream the audio of a single input into PIPE instead of a file: '-' for stdout, "
+                             "fd:N or a FIFO path")
+    parser.add_argument("--raw-pcm", action="store_true",
+                        help="with --audio-to: send 16-bit little-endian PCM instead of the encoded track")
+    parser.add_argument("--sample-rate", type=int, help="with --raw-pcm: resample, e.g. 16000")
+    parser.add_argument("--channels", type=int, help="with --raw-pcm: mix down to this many channels")
+    parser.add_argument("--always-encode", action="store_true", help="re-encode even when a stream already matches the target codec")
+    parser.add_argument("--separate-passes", action="store_true", help="run one ffmpeg process per output")
+    parser.add_argument("--chunked", action="store_true", help="encode h264/h265/vp9 video in parallel segments")
+    parser.add_argument("--chunk-seconds", type=float, help="segment length for --chunked (default 60)")
+    parser.add_argument("--chunk-workers", type=int, help="parallel segment encoders (default: cores / 4)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse outputs of identical earlier extractions and keep new ones (off by default)")
+    parser.add_argument("--cache-info", action="store_true", help="list the output cache entries and exit")
+    parser.add_argument("--purge-cache", action="store_true", help="empty the output cache and exit")
+    parser.add_argument("--watch", metavar="DIR", action="append", default=[],
+                        help="keep running and extract every file that settles in DIR (repeatable)")
+    parser.add_argument("--settle-seconds", type=float, default=10.0,
+                        help="with --watch: how long a file must stop changing before it's processed")
+    parser.add_argument("--state-file", help="with --watch: where processed files are recorded")
+    parser.add_argument("--resume", action="store_true",
+                        help="also rerun the jobs left unfinished by an interrupted or crashed run")
+    parser.add_argument("--force", action="store_true",
+                        help="extract even inputs the job journal lists as done with their outputs present")
+    parser.add_argument("--ffmpeg", help="path to the ffmpeg executable")
+    parser.add_argument("--cpu-share", type=float, help="share of CPU cores used for parallel transcodes")
+    parser.add_argument("--io-jobs", type=int, help="number of parallel stream-copy jobs")
+    parser.add_argument("--policy", choices=POLICIES,
+                        help="order queued jobs start in: fifo, shortest (default) or fair between input folders")
+    parser.add_argument("--max-transcodes", type=int, help="cap on parallel transcodes (default: cores)")
+    parser.add_argument("--max-copies", type=int, help="cap on parallel stream-copy jobs (default 8)")
+    parser.add_argument("--volume-jobs", type=int, help="most jobs writing to one output disk at once, 0 for no limit (default 4)")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                        help="keep --cpu-share/--io-jobs slots instead of adapting them to the system load")
+    parser.add_argument("--retries", type=int, help="retries per failed job")
+    parser.add_argument("--coordinator", metavar="ADDRESS", type=parse_address_arg,
+                        help="run the jobs on workers that connect to ADDRESS (host:port, :port or unix:/path)")
+    parser.add_argument("--worker", metavar="ADDRESS", type=parse_address_arg,
+                        help="run jobs for the coordinator at ADDRESS until interrupted")
+    parser.add_argument("--slots", type=int, default=1, help="with --worker: jobs run at once (default 1)")
+    parser.add_argument("--path-map", metavar="REMOTE=LOCAL", action="append", type=parse_path_map, default=[],
+                        help="with --worker: the coordinator's paths under REMOTE are under LOCAL here (repeatable)")
+    parser.add_argument("--cluster-token", default=os.environ.get('TRACKSEP_CLUSTER_TOKEN'),
+                        help="shared secret of the coordinator and its workers (default: $TRACKSEP_CLUSTER_TOKEN)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON on stdout")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log ffmpeg commands and output (-vv for debug)")
+    return parser
+
+
+def options_from_args(args):
+    overrides = {
+        'ffmpeg_path': args.ffmpeg,
+        'video_template': args.video_template,
+        'audio_template': args.audio_template,
+        'video_codec': args.video_codec,
+        'audio_codec': args.audio_codec,
+        'audio_bitrate': args.audio_bitrate,
+        'audio_ladder': args.audio_ladder,
+        'batch_cpu_share': args.cpu_share,
+        'batch_io_jobs': args.io_jobs,
+        'batch_retries': args.retries,
+        'batch_policy': args.policy,
+        'batch_max_transcodes': args.max_transcodes,
+        'batch_max_copies': args.max_copies,
+        'batch_volume_jobs': args.volume_jobs,
+        'chunk_seconds': args.chunk_seconds,
+        'chunk_workers': args.chunk_workers
+    }
+    overrides = {key: str(value) for key, value in overrides.items() if value is not None}
+    if args.separate_passes:
+        overrides['single_pass'] = 'false'
+    if args.always_encode:
+        overrides['smart_copy'] = 'false'
+    if args.chunked:
+        overrides['chunked_encoding'] = 'true'
+    if args.cache:
+        overrides['output_cache'] = 'true'
+    if args.fixed_concurrency:
+        overrides['adaptive_concurrency'] = 'false'
+    return make_options(overrides)
+
+
+def print_result(result):
+    if result.ok:
+        outputs = ", ".join(f"{output['path']} [{output['mode']}]" for output in result.outputs)
+        cached = ", cached" if result.cached else ""
+        print(f"OK     {result.input_file} -> {outputs} ({result.elapsed:.1f}s{cached})", file=sys.stderr)
+    else:
+        print(f"{result.status.upper():<6} {result.input_file}: {result.error}", file=sys.stderr)
+
+
+def show_cache(as_json):
+    cache = default_output_cache()
+    if as_json:
+        json.dump(dict(cache.stats(), items=cache.entries()), sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    stats = cache.stats()
+    print(f"{stats['directory']}: {stats['entries']} entries, {stats['bytes'] / 1024 ** 2:.1f} MB")
+    for entry in cache.entries():
+        print(f"{entry['key'][:12]}  {entry['bytes'] / 1024 ** 2:9.1f} MB  {entry['files']} files  {entry['input']}")
+
+
+def unsupported(options, video=True, audio=True):
+    """Print why the configured ffmpeg can't run jobs with `options`; True if it can't."""
+    from backend.capabilities import ffmpeg_capabilities
+    capabilities = ffmpeg_capabilities(options['ffmpeg_path'])
+    problems = capabilities.problems(options, video, audio) if capabilities else []
+    for problem in problems:
+        print(f"tracksep-cli: {problem}", file=sys.stderr)
+    return bool(problems)
+
+
+def watch(args):
+    """Run the watch-folder daemon until interrupted."""
+    from backend.watch import WatchFolder, WatchState
+    for directory in args.watch:
+        if not os.path.isdir(directory):
+            print(f"tracksep-cli: not a directory: {directory}", file=sys.stderr)
+            return EXIT_USAGE
+    options = options_from_args(args)
+    if unsupported(options):
+        return EXIT_USAGE
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    def report(job):
+        if job.status in (JobStatus.DONE, JobStatus.FAILED):
+            result = ExtractionResult.from_job(job)
+            if args.json:
+                print(json.dumps(result.to_dict()), flush=True)
+            else:
+                print_result(result)
+
+    daemon = WatchFolder(
+        args.watch, options, args.output_dir, WatchState(args.state_file),
+        settle_seconds=args.settle_seconds, audio_streams=args.audio_streams or ALL_STREAMS,
+        on_update=report
+    )
+    stop_event = threading.Event()
+    try:
+        daemon.run(stop_event)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED  # run() cancelled the jobs in flight on its way out
+    return EXIT_OK
+
+
+def stream(args, input_file, options, clips):
+    """Extract one input with its audio going into a pipe, so a consumer can start on it right away."""
+    try:
+        sink = PipeSink(args.audio_to, args.raw_pcm, args.sample_rate, args.channels)
+    except SinkError as e:
+        print(f"tracksep-cli: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    output_video, _ = output_paths(
+        input_file, args.output_dir, options['video_template'], options['audio_template'], options['audio_codec']
+    )
+    outputs = {'audio': sink}
+    if not args.no_video:
+        outputs['video'] = output_video
+    try:
+        result = extract(input_file, outputs, options, args.video_stream, args.audio_streams, clips=clips)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    if args.json:
+        print(json.dumps(result.to_dict()))
+    else:
+        print_result(result)
+    return EXIT_OK if result.ok else EXIT_FAILED
+
+
+def worker(args):
+    """Run jobs for a coordinator until interrupted."""
+    from backend.cluster import Worker
+    # Only what depends on this machine replaces the settings each job comes with; the rest of it defaults
+    overrides = {'ffmpeg_path': args.ffmpeg, 'chunk_workers': args.chunk_workers}
+    overrides = {key: str(value) for key, value in overrides.items() if value is not None}
+    if args.cache:
+        overrides['output_cache'] = 'true'
+    daemon = Worker(args.worker, overrides, args.slots, args.cluster_token, args.path_map)
+    try:
+        daemon.run(threading.Event())
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED  # run() cancelled the jobs in flight, which go back to the coordinator
+    return EXIT_OK
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.purge_cache or args.cache_info:
+        if args.purge_cache:
+            default_output_cache().purge()
+        if args.cache_info:
+            show_cache(args.json)
+        return EXIT_OK
+    if not args.inputs and not args.watch and not args.resume and not args.worker:
+        parser.error("no input files given")
+    if args.no_video and args.no_audio:
+        parser.error("--no-video and --no-audio leave nothing to extract")
+    try:
+        clip = clip_from_fields(args.start, args.end, args.duration)
+    except ClipError as e:
+        parser.error(str(e))
+    clips = ([clip] if clip else []) + args.clips
+    if args.audio_to is not None:
+        if args.no_audio or args.watch or args.worker or args.coordinator or args.resume:
+            parser.error("--audio-to can't be combined with --no-audio, --watch, --worker, --coordinator or --resume")
+        if args.audio_to == '-' and args.json:
+            parser.error("--audio-to - writes the audio to stdout, where --json would go")
+    elif args.raw_pcm:
+        parser.error("--raw-pcm needs --audio-to")
+    if (args.sample_rate or args.channels) and not args.raw_pcm:
+        parser.error("--sample-rate and --channels need --raw-pcm")
+
+    # Backend modules call basicConfig on import, so replace their handlers
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    logging.basicConfig(
+        level=[logging.ERROR, logging.INFO, logging.DEBUG][min(args.verbose, 2)],
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.worker:
+        return worker(args)
+    if args.watch:
+        return watch(args)
+
+    inputs = expand_inputs(args.inputs)
+    if args.audio_to is not None:
+        if len(inputs) != 1:
+            print("tracksep-cli: --audio-to takes exactly one input file", file=sys.stderr)
+            return EXIT_USAGE
+        options = options_from_args(args)
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        return stream(args, inputs[0], options, clips)
+    journal = Journal()
+    resumed = journal.unfinished() if args.resume else []
+    if not inputs and not resumed:
+        print("tracksep-cli: no input files matched" if args.inputs else "tracksep-cli: nothing to resume",
+              file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    options = options_from_args(args)
+    coordinator = None
+    if args.coordinator:
+        from backend.cluster import Coordinator, cluster_scheduler
+        # Workers check the jobs against their own ffmpeg builds
+        coordinator = Coordinator(args.coordinator, args.cluster_token)
+        try:
+            coordinator.start()
+        except OSError as e:
+            print(f"tracksep-cli: can't listen on {args.coordinator}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+        print(f"Waiting for workers on {coordinator.listening_address}", file=sys.stderr)
+        scheduler = cluster_scheduler(coordinator, options, journal=journal)
+    else:
+        # Refuse settings the ffmpeg build can't produce before anything is queued
+        if inputs and unsupported(options, not args.no_video, not args.no_audio):
+            return EXIT_USAGE
+        scheduler = scheduler_from_options(run_job, options, journal=journal)
+    records = journal.latest()
+    if resumed:
+        from backend.capabilities import ffmpeg_capabilities
+    for job in resumed:
+        capabilities = ffmpeg_capabilities(job.options.get('ffmpeg_path'))
+        problems = capabilities.job_problems(job) if capabilities else []
+        if problems:
+            # Left unfinished in the journal, to resume once ffmpeg is fixed
+            print(f"SKIP   {job.input_file}: {'; '.join(problems)}", file=sys.stderr)
+            continue
+        print(f"RESUME {job.input_file}", file=sys.stderr)
+        scheduler.submit(job)
+    for input_file in inputs:
+        output_video, output_audio = output_paths(
+            input_file, args.output_dir, options['video_template'],
+            options['audio_template'], options['audio_codec']
+        )
+        job = Job(
+            input_file,
+            None if args.no_video else output_video,
+            None if args.no_audio else output_audio,
+            options, args.video_stream, args.audio_streams,
+            max_retries=int(options['batch_retries']), clips=clips
+        )
+        if any(os.path.abspath(input_file) == other.input_file for other in resumed):
+            continue  # already queued as a resumed job
+        if not args.force and journal.completed(job, records):
+            print(f"SKIP   {input_file}: already extracted (use --force to redo)", file=sys.stderr)
+            continue
+        scheduler.submit(job)
+
+    scheduler.start()
+    try:
+        while not scheduler.wait(timeout=0.5):
+            pass  # short waits keep Ctrl+C responsive
+    except KeyboardInterrupt:
+        scheduler.stop(cancel_running=True)
+        scheduler.wait(timeout=10)
+        return EXIT_INTERRUPTED
+    finally:
+        if coordinator is not None:
+            coordinator.stop()
+
+    results = [ExtractionResult.from_job(job) for job in scheduler.queue.jobs()]
+    if args.json:
+        json.dump([result.to_dict() for result in results], sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for result in results:
+            print_result(result)
+
+    return EXIT_OK if all(result.ok for result in results) else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,61 +1,55 @@
-import sys
-import os
-import logging
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtGui import QIcon
-from ui.main_window import MainWindow
-from ui.log_widget import LogWidget
-from backend.log_handler import LogHandler
-from backend.settings import Settings
-
-def main():
-    # Initialize the application
-    app = QApplication(sys.argv)
-
-    # Initialize settings
-    settings = Settings()
-
-    # Apply theme from settings
-    theme = settings.get("theme")
-    app.setStyle(theme)
-    if settings.get("dark_mode") == "true":
-        from PyQt5.QtGui import QPalette, QColor
-        palette = QPalette()
-        palette.setColor(QPalette.Window, QColor(53, 53, 53))
-        palette.setColor(QPalette.WindowText, Qt.white)
-        app.setPalette(palette)
-
-    # Set the application icon
-    icon_path = os.path.join(os.path.dirname(__file__), "../assets/icon.ico")
-    if os.path.exists(icon_path):
-        app.setWindowIcon(QIcon(icon_path))
-
-    # Set up logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('tracksep.log'),
-            logging.StreamHandler()
-        ]
-    )
-    logger = logging.getLogger(__name__)
-
-    # Create log widget and handler
-    log_widget = LogWidget()
-    log_handler = LogHandler(log_widget)
-    logger.addHandler(log_handler)
-
-    # Create main window and pass settings
-    window = MainWindow()
-    window.log_widget = log_widget  # Attach the log widget
-    window.settings = settings      # Pass settings to the main window
-    window.show()
-
-    # Start the application
-    logger.info("Track Separator application started.")
-    sys.exit(app.exec_())
-
-if __name__ == "__main__":
-    main()
+import sys
+import os
+import logging
+from backend.startup import StartupProfile
+
+def main():
+    profile = StartupProfile.from_argv()
+
+    # Only what's needed to show the window is imported here; the settings dialog,
+    # stream probing, batch running and audio analysis load when first used
+    with profile.phase("import Qt"):
+        from PyQt5.QtCore import QTimer
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtGui import QIcon
+    with profile.phase("import main window"):
+        from ui.main_window import MainWindow
+        from backend.log_handler import start_file_logging
+        from backend.settings import Settings
+
+    # Initialize the application
+    with profile.phase("create application"):
+        app = QApplication(sys.argv)
+
+    # Initialize settings; the main window applies the theme from them
+    with profile.phase("load settings"):
+        settings = Settings()
+
+    # Set the application icon
+    icon_path = os.path.join(os.path.dirname(__file__), "../assets/icon.ico")
+    if os.path.exists(icon_path):
+        app.setWindowIcon(QIcon(icon_path))
+
+    # Set up logging; file and console writes happen on a background thread
+    with profile.phase("start logging"):
+        start_file_logging('tracksep.log', getattr(logging, settings.get('logging_level'), logging.INFO))
+    logger = logging.getLogger(__name__)
+
+    # Create main window with the same settings; it shows the log in its own widget
+    with profile.phase("create main window"):
+        window = MainWindow(settings)
+    with profile.phase("show main window"):
+        window.show()
+    # Runs once the event loop has handled the first show and paint events
+    QTimer.singleShot(0, profile.finish)
+    # Then ask about unfinished batch jobs, which reads the journal, and find out
+    # what the configured FFmpeg supports, for the settings dialog and job checks
+    QTimer.singleShot(0, window.offer_resume)
+    QTimer.singleShot(0, window.probe_ffmpeg)
+
+    # Start the application
+    logger.info("Track Separator application started.")
+    sys.exit(app.exec_())
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-# This file can be empty or used to import UI components for easy access.
+# This file can be empty or used to import UI components for easy access.
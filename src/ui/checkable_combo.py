@@ -0,0 +1,82 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from PyQt5.QtWidgets import QComboBox
+
+
+class CheckableComboBox(QComboBox):
+    """A combo box whose items can be ticked to select any subset of them."""
+
+    def __init__(self, parent=None, all_text=None):
+        """
+        Args:
+            all_text (str): If set, a first item with this text toggles every other item.
+        """
+        super().__init__(parent)
+        self.all_text = all_text
+        self.setModel(QStandardItemModel(self))
+        self.setEditable(True)
+        self.lineEdit().setReadOnly(True)
+        self.view().pressed.connect(self.handle_item_pressed)
+        self.model().dataChanged.connect(self.update_text)
+        self.currentIndexChanged.connect(self.update_text)  # selecting an item would overwrite the summary
+        self.keep_open = False
+        self.clear()
+
+    def clear(self):
+        super().clear()
+        if self.all_text:
+            item = QStandardItem(self.all_text)
+            item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsUserCheckable)
+            item.setData(Qt.Unchecked, Qt.CheckStateRole)
+            self.model().appendRow(item)
+        self.update_text()
+
+    def addItem(self, text, data=None, checked=False):
+        item = QStandardItem(text)
+        item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsUserCheckable)
+        item.setData(data, Qt.UserRole)
+        item.setData(Qt.Checked if checked else Qt.Unchecked, Qt.CheckStateRole)
+        self.model().appendRow(item)
+        self.update_text()
+
+    def data_items(self):
+        """Items carrying data, i.e. everything except the 'all' toggle."""
+        first = 1 if self.all_text else 0
+        return [self.model().item(row) for row in range(first, self.model().rowCount())]
+
+    def handle_item_pressed(self, index):
+        item = self.model().itemFromIndex(index)
+        state = Qt.Unchecked if item.checkState() == Qt.Checked else Qt.Checked
+        self.model().blockSignals(True)
+        item.setCheckState(state)
+        if self.all_text and index.row() == 0:
+            for data_item in self.data_items():
+                data_item.setCheckState(state)
+        elif self.all_text:
+            all_checked = all(data_item.checkState() == Qt.Checked for data_item in self.data_items())
+            self.model().item(0).setCheckState(Qt.Checked if all_checked else Qt.Unchecked)
+        self.model().blockSignals(False)
+        self.update_text()
+        self.keep_open = True
+
+    def hidePopup(self):
+        # Stay open while the user ticks several items
+        if self.keep_open:
+            self.keep_open = False
+            return
+        super().hidePopup()
+
+    def checked_data(self):
+        return [item.data(Qt.UserRole) for item in self.data_items() if item.checkState() == Qt.Checked]
+
+    def all_checked(self):
+        items = self.data_items()
+        return bool(items) and all(item.checkState() == Qt.Checked for item in items)
+
+    def update_text(self, *args):
+        checked = [item.text().split(':')[0] for item in self.data_items() if item.checkState() == Qt.Checked]
+        if self.all_checked() and self.all_text:
+            text = self.all_text
+        else:
+            text = ", ".join(checked) if checked else "None"
+        self.lineEdit().setText(text)
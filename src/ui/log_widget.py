@@ -1,39 +1,99 @@
-from PyQt5.QtGui import QTextCursor
-from PyQt5.QtWidgets import QHBoxLayout, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit
-from PyQt5.QtCore import pyqtSlot
-
-class LogWidget(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setup_ui()
-        self.expanded = False
-
-    def setup_ui(self):
-        self.layout = QVBoxLayout(self)
-        
-        # Header with expand button
-        header_layout = QHBoxLayout()
-        self.expand_button = QPushButton("▶")  # Right arrow
-        self.expand_button.setFixedWidth(30)
-        self.expand_button.clicked.connect(self.toggle_expansion)
-        header_layout.addWidget(self.expand_button)
-        header_layout.addWidget(QLabel("Logs"))
-        header_layout.addStretch()
-        self.layout.addLayout(header_layout)
-        
-        # Log text area
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        self.log_text.setMaximumHeight(200)
-        self.log_text.hide()
-        self.layout.addWidget(self.log_text)
-        
-    def toggle_expansion(self):
-        self.expanded = not self.expanded
-        self.expand_button.setText("▼" if self.expanded else "▶")
-        self.log_text.setVisible(self.expanded)
-        
-    @pyqtSlot(str)
-    def append_log(self, message):
-        self.log_text.append(message)
-        self.log_text.moveCursor(QTextCursor.End)
+import logging
+from collections import deque
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtWidgets import QComboBox, QHBoxLayout, QLineEdit, QPlainTextEdit, QWidget, QVBoxLayout, QPushButton, QLabel
+from PyQt5.QtCore import pyqtSlot
+
+LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR
+}
+
+class LogWidget(QWidget):
+    def __init__(self, parent=None, max_lines=5000):
+        """
+        Args:
+            max_lines (int): Size of the ring buffer; the oldest lines are discarded beyond it.
+        """
+        super().__init__(parent)
+        self.records = deque(maxlen=max_lines)  # (levelno, text)
+        self.min_level = logging.DEBUG
+        self.search_text = ""
+        self.setup_ui(max_lines)
+        self.expanded = False
+
+    def setup_ui(self, max_lines):
+        self.layout = QVBoxLayout(self)
+
+        # Header with expand button
+        header_layout = QHBoxLayout()
+        self.expand_button = QPushButton("▶")  # Right arrow
+        self.expand_button.setFixedWidth(30)
+        self.expand_button.clicked.connect(self.toggle_expansion)
+        header_layout.addWidget(self.expand_button)
+        header_layout.addWidget(QLabel("Logs"))
+        header_layout.addStretch()
+
+        # Level filter and search, only shown with the log
+        self.level_combo = QComboBox()
+        self.level_combo.addItems(list(LEVELS))
+        self.level_combo.currentTextChanged.connect(self.set_level)
+        self.search_field = QLineEdit()
+        self.search_field.setPlaceholderText("Search logs")
+        self.search_field.textChanged.connect(self.set_search)
+        self.level_combo.hide()
+        self.search_field.hide()
+        header_layout.addWidget(self.level_combo)
+        header_layout.addWidget(self.search_field)
+        self.layout.addLayout(header_layout)
+
+        # Log text area; a plain text view with a block limit stays fast with thousands of lines
+        self.log_text = QPlainTextEdit()
+        self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(max_lines)
+        self.log_text.setMaximumHeight(200)
+        self.log_text.hide()
+        self.layout.addWidget(self.log_text)
+
+    def toggle_expansion(self):
+        self.expanded = not self.expanded
+        self.expand_button.setText("▼" if self.expanded else "▶")
+        self.log_text.setVisible(self.expanded)
+        self.level_combo.setVisible(self.expanded)
+        self.search_field.setVisible(self.expanded)
+
+    def matches(self, levelno, text):
+        return levelno >= self.min_level and self.search_text in text.lower()
+
+    def append_records(self, records):
+        """Add a batch of (levelno, text) records, appending the visible ones in one update."""
+        self.records.extend(records)
+        visible = [text for levelno, text in records if self.matches(levelno, text)]
+        if visible:
+            self.log_text.appendPlainText("\n".join(visible))
+            self.log_text.moveCursor(QTextCursor.End)
+
+    @pyqtSlot(str)
+    def append_log(self, message):
+        self.append_records([(logging.INFO, message)])
+
+    def set_level(self, level_name):
+        self.min_level = LEVELS[level_name]
+        self.refresh()
+
+    def set_search(self, text):
+        self.search_text = text.lower()
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild the view from the ring buffer with the current filter."""
+        self.log_text.setPlainText("\n".join(
+            text for levelno, text in self.records if self.matches(levelno, text)
+        ))
+        self.log_text.moveCursor(QTextCursor.End)
+
+    def clear(self):
+        self.records.clear()
+        self.log_text.clear()
@@ -1,338 +1,746 @@
-import os
-import logging
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor, QFont, QIcon, QPalette
-from PyQt5.QtWidgets import QApplication, QFileDialog, QFormLayout, QGroupBox, QHBoxLayout, QMainWindow, QMessageBox, QProgressBar, QVBoxLayout, QWidget, QPushButton, QLabel
-from backend.settings import Settings
-from backend.log_handler import LogHandler
-from ui.settings_dialog import QComboBox, QDialog, QLineEdit, SettingsDialog
-from backend.stream_info import StreamInfo
-from ui.log_widget import LogWidget
-from backend.worker_thread import WorkerThread
-
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.settings = Settings()
-        self.setWindowTitle("Track Separator")
-        self.setGeometry(100, 100, 800, 600)
-        
-        # Apply theme
-        self.apply_theme()
-        
-        self.input_file = None
-        self.stream_info = None
-        
-        # Initialize logging widget
-        self.log_widget = LogWidget()
-        self.logger = logging.getLogger(__name__)
-        log_handler = LogHandler(self.log_widget)
-        self.logger.addHandler(log_handler)
-        self.init_ui()
-
-    def apply_theme(self):
-        app = QApplication.instance()
-        theme = self.settings.get('theme')
-        app.setStyle(theme)
-
-        unsupported_themes = ['windowsvista', 'Macintosh']
-        if theme in unsupported_themes:
-            self.settings.set('dark_mode', 'false')
-            app.setPalette(app.style().standardPalette())
-            app.setStyleSheet("")
-        elif self.settings.get('dark_mode') == 'true':
-            palette = QPalette()
-            palette.setColor(QPalette.Window, QColor(53, 53, 53))
-            palette.setColor(QPalette.WindowText, Qt.white)
-            palette.setColor(QPalette.Base, QColor(25, 25, 25))
-            palette.setColor(QPalette.AlternateBase, QColor(53, 53, 53))
-            palette.setColor(QPalette.ToolTipBase, Qt.white)
-            palette.setColor(QPalette.ToolTipText, Qt.white)
-            palette.setColor(QPalette.Text, Qt.white)
-            palette.setColor(QPalette.Button, QColor(53, 53, 53))
-            palette.setColor(QPalette.ButtonText, Qt.white)
-            palette.setColor(QPalette.BrightText, Qt.red)
-            palette.setColor(QPalette.Link, QColor(42, 130, 218))
-            palette.setColor(QPalette.Highlight, QColor(42, 130, 218))
-            palette.setColor(QPalette.HighlightedText, Qt.black)
-            app.setPalette(palette)
-
-            # Fix tooltip style in dark mode for all themes
-            app.setStyleSheet("QToolTip { color: #ffffff; background-color: #2a82da; border: 1px solid white; }")
-        else:  # If not dark mode, reset to default palette
-            app.setPalette(app.style().standardPalette())
-
-    def init_ui(self):
-        main_widget = QWidget()
-        layout = QVBoxLayout()
-        layout.setSpacing(20)
-
-        # Title
-        title_label = QLabel("Track Separator")
-        title_label.setFont(QFont('Arial', 18, QFont.Bold))
-        title_label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(title_label)
-
-        # Input File Section
-        input_group = QGroupBox("Input File")
-        input_layout = QVBoxLayout()
-        
-        file_select_layout = QHBoxLayout()
-        self.file_path_field = QLineEdit()
-        self.file_path_field.setPlaceholderText("No file selected")
-        self.file_path_field.setReadOnly(True)
-        
-        self.file_button = QPushButton("Browse")
-        self.file_button.setMinimumWidth(100)
-        self.clear_button = QPushButton("Clear")
-        self.clear_button.setMinimumWidth(100)
-        file_select_layout.addWidget(self.file_path_field)
-        file_select_layout.addWidget(self.file_button)
-        file_select_layout.addWidget(self.clear_button)
-        
-        input_layout.addLayout(file_select_layout)
-
-        # Stream Selection
-        streams_layout = QHBoxLayout()
-        
-        self.video_stream_combo = QComboBox()
-        self.video_stream_combo.setEnabled(False)
-        self.audio_stream_combo = QComboBox()
-        self.audio_stream_combo.setEnabled(False)
-        
-        video_stream_layout = QVBoxLayout()
-        video_stream_layout.addWidget(QLabel("Video Stream:"))
-        video_stream_layout.addWidget(self.video_stream_combo)
-        
-        audio_stream_layout = QVBoxLayout()
-        audio_stream_layout.addWidget(QLabel("Audio Stream:"))
-        audio_stream_layout.addWidget(self.audio_stream_combo)
-        
-        streams_layout.addLayout(video_stream_layout)
-        streams_layout.addLayout(audio_stream_layout)
-        input_layout.addLayout(streams_layout)
-        
-        input_group.setLayout(input_layout)
-        layout.addWidget(input_group)
-
-        # Output Settings Section
-        output_group = QGroupBox("Output Settings")
-        output_layout = QVBoxLayout()
-
-        # Output folder selection
-        folder_layout = QHBoxLayout()
-        self.output_folder_field = QLineEdit()
-        self.output_folder_field.setPlaceholderText("Select output folder or use same as input")
-        self.output_folder_field.setText(self.settings.get('default_output_folder'))
-        
-        self.output_button = QPushButton("Browse")
-        self.same_as_input = QPushButton("Same as Input")
-        
-        folder_layout.addWidget(self.output_folder_field)
-        folder_layout.addWidget(self.output_button)
-        folder_layout.addWidget(self.same_as_input)
-        output_layout.addLayout(folder_layout)
-
-        # Custom filename templates
-        filename_group = QGroupBox("Output Filenames")
-        filename_layout = QFormLayout()
-        
-        self.video_filename = QLineEdit()
-        self.video_filename.setText(self.settings.get('video_template'))
-        self.audio_filename = QLineEdit()
-        self.audio_filename.setText(self.settings.get('audio_template'))
-        
-        filename_layout.addRow("Video:", self.video_filename)
-        filename_layout.addRow("Audio:", self.audio_filename)
-        
-        filename_group.setLayout(filename_layout)
-        output_layout.addWidget(filename_group)
-        
-        output_group.setLayout(output_layout)
-        layout.addWidget(output_group)
-
-        # Progress Section
-        progress_group = QGroupBox("Progress")
-        progress_layout = QVBoxLayout()
-        
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setTextVisible(True)
-        progress_layout.addWidget(self.progress_bar)
-        
-        self.status_label = QLabel("Status: Ready")
-        progress_layout.addWidget(self.status_label)
-        
-        progress_group.setLayout(progress_layout)
-        layout.addWidget(progress_group)
-
-        # Buttons
-        button_layout = QHBoxLayout()
-        
-        self.settings_button = QPushButton("Settings")
-        self.settings_button.setIcon(QIcon.fromTheme("preferences-system"))
-        
-        self.extract_button = QPushButton("Extract")
-        self.extract_button.setIcon(QIcon.fromTheme("media-playback-start"))
-        self.extract_button.setEnabled(False)
-        
-        button_layout.addWidget(self.settings_button)
-        button_layout.addStretch()
-        button_layout.addWidget(self.extract_button)
-        
-        layout.addLayout(button_layout)
-        
-        # Add log widget
-        layout.addWidget(self.log_widget)
-
-        # Set up the main widget
-        main_widget.setLayout(layout)
-        self.setCentralWidget(main_widget)
-
-        # Connect signals
-        self.file_button.clicked.connect(self.browse_file)
-        self.clear_button.clicked.connect(self.clear_fields)
-        self.output_button.clicked.connect(self.browse_output_folder)
-        self.same_as_input.clicked.connect(self.use_input_folder)
-        self.settings_button.clicked.connect(self.show_settings)
-        self.extract_button.clicked.connect(self.extract)
-
-    def clear_fields(self):
-        self.file_path_field.clear()
-        self.video_stream_combo.clear()
-        self.audio_stream_combo.clear()
-        self.progress_bar.setValue(0)
-        self.status_label.setText("Status: Ready")
-        self.log_widget.log_text.clear()
-        self.extract_button.setEnabled(False)
-
-    def browse_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select Video File", "",
-            "Video Files (*.mp4 *.mkv *.avi *.mov);;All Files (*.*)"
-        )
-        if file_path:
-            self.input_file = file_path
-            self.file_path_field.setText(file_path)
-            self.extract_button.setEnabled(True)
-            
-            # Probe for streams
-            self.stream_info = StreamInfo(file_path, self.settings.get('ffmpeg_path'))
-            
-            # Update stream selection combos
-            self.video_stream_combo.clear()
-            self.audio_stream_combo.clear()
-            
-            for stream in self.stream_info.video_streams:
-                self.video_stream_combo.addItem(
-                    f"Stream {stream['index']}: {stream['codec']} ({stream['resolution']})",
-                    stream['index']
-                )
-            
-            for stream in self.stream_info.audio_streams:
-                self.audio_stream_combo.addItem(
-                    f"Stream {stream['index']}: {stream['codec']} ({stream['channels']} ch, {stream['sample_rate']} Hz)",
-                    stream['index']
-                )
-            
-            self.video_stream_combo.setEnabled(True)
-            self.audio_stream_combo.setEnabled(True)
-
-            if not self.output_folder_field.text():
-                self.use_input_folder()
-
-    def browse_output_folder(self):
-        folder_path = QFileDialog.getExistingDirectory(
-            self, "Select Output Folder",
-            self.output_folder_field.text()
-        )
-        if folder_path:
-            self.output_folder_field.setText(folder_path)
-
-    def use_input_folder(self):
-        if self.input_file:
-            self.output_folder_field.setText(os.path.dirname(self.input_file))
-
-    def show_settings(self):
-        dialog = SettingsDialog(self.settings, self)
-        if dialog.exec_() == QDialog.Accepted:
-            # Re-read settings in case they were changed
-            self.settings = Settings()
-            self.apply_theme()
-
-    def extract(self):
-        if not self.input_file:
-            self.status_label.setText("Error: No input file selected.")
-            return
-            
-        if not self.output_folder_field.text():
-            self.status_label.setText("Error: No output folder selected.")
-            return
-
-        # Get selected streams
-        video_stream = None
-        audio_stream = None
-        
-        if self.video_stream_combo.currentData() is not None:
-            video_stream = self.video_stream_combo.currentData()
-            
-        if self.audio_stream_combo.currentData() is not None:
-            audio_stream = self.audio_stream_combo.currentData()
-
-        # Prepare output filenames
-        input_filename = os.path.splitext(os.path.basename(self.input_file))[0]
-        video_template = self.video_filename.text() or self.settings.get('video_template')
-        audio_template = self.audio_filename.text() or self.settings.get('audio_template')
-
-        # Determine the correct file extension for the audio output
-        audio_extension = {
-            'aac': 'm4a',
-            'mp3': 'mp3',
-            'flac': 'flac'
-        }.get(self.settings.get('audio_codec'), 'm4a')
-        
-        output_video = os.path.join(
-            self.output_folder_field.text(),
-            f"{video_template.format(filename=input_filename)}.mp4"
-        )
-        output_audio = os.path.join(
-            self.output_folder_field.text(),
-            f"{audio_template.format(filename=input_filename)}.{audio_extension}"
-        )
-
-        # Disable buttons during extraction
-        self.file_button.setEnabled(False)
-        self.clear_button.setEnabled(False)
-        self.output_button.setEnabled(False)
-        self.same_as_input.setEnabled(False)
-        self.settings_button.setEnabled(False)
-        self.extract_button.setEnabled(False)
-
-        # Start extraction
-        self.worker = WorkerThread(
-            self.input_file, output_video, output_audio,
-            self.settings, video_stream, audio_stream
-        )
-        self.worker.progress.connect(self.update_progress)
-        self.worker.error.connect(self.display_error)
-        self.worker.finished.connect(self.enable_buttons)
-        self.worker.start()
-
-        self.status_label.setText("Processing...")
-
-    def update_progress(self, value):
-        self.progress_bar.setValue(value)
-        if value == 100:
-            self.status_label.setText("Extraction Complete!")
-
-    def display_error(self, message):
-        self.status_label.setText(f"Error: {message}")
-        QMessageBox.critical(self, "Error", message)
-        self.enable_buttons()
-
-    def enable_buttons(self):
-        self.file_button.setEnabled(True)
-        self.clear_button.setEnabled(True)
-        self.output_button.setEnabled(True)
-        self.same_as_input.setEnabled(True)
-        self.settings_button.setEnabled(True)
-        self.extract_button.setEnabled(True)
+import functools
+import os
+import logging
+import time
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QColor, QFont, QIcon, QPalette
+from PyQt5.QtWidgets import QAbstractItemView, QApplication, QComboBox, QDialog, QFileDialog, QFormLayout, QGroupBox, QHBoxLayout, QHeaderView, QLineEdit, QMainWindow, QMessageBox, QProgressBar, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QPushButton, QLabel
+from backend.settings import Settings
+from backend.log_handler import LogHandler
+from backend.capabilities import capabilities_future
+from backend.capabilities_watcher import when_probed
+from ui.waveform_widget import WaveformWidget
+from ui.log_widget import LogWidget
+from ui.checkable_combo import CheckableComboBox
+from backend.jobs import ALL_STREAMS, Job, JobStatus
+from backend.commands import output_paths
+from backend.clips import ClipError, clip_from_fields, parse_clips
+from backend.metrics import default_recorder
+
+# The settings dialog, stream probing, the batch runner (extractor, scheduler,
+# estimates), the journal and the audio analysis (NumPy) are imported where
+# they're first used, so they don't delay the first paint of the window.
+
+class MainWindow(QMainWindow):
+    def __init__(self, settings=None):
+        super().__init__()
+        self.settings = settings or Settings()
+        self.setWindowTitle("Track Separator")
+        self.setGeometry(100, 100, 800, 600)
+        
+        # Apply theme
+        self.apply_theme()
+        
+        self.input_file = None
+        self.stream_info = None
+        self.batch = None
+        self.job_rows = {}
+        self.journal = None  # opened on first use, see job_journal()
+        
+        # Initialize logging widget
+        self.log_widget = LogWidget()
+        self.logger = logging.getLogger(__name__)
+        # On the root logger so backend and ffmpeg messages show up too
+        self.log_handler = LogHandler(self.log_widget)
+        logging.getLogger().addHandler(self.log_handler)
+        self.init_ui()
+
+    def job_journal(self):
+        """The batch journal, opened on first use."""
+        if self.journal is None:
+            from backend.journal import Journal
+            self.journal = Journal()
+        return self.journal
+
+    def offer_resume(self):
+        """
+        Offer to requeue the batch jobs that were queued or running when the last session ended.
+
+        Called once the window is up, so reading the journal doesn't hold up the first paint.
+        """
+        jobs = self.job_journal().unfinished()
+        if not jobs:
+            return
+        answer = QMessageBox.question(
+            self, "Resume Batch",
+            f"{len(jobs)} batch job(s) did not finish last time. Resume them?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if answer != QMessageBox.Yes:
+            for job in jobs:
+                job.status = JobStatus.CANCELLED
+                self.journal.record(job)  # don't ask again
+            return
+        self.start_batch()
+        for job in jobs:
+            # Each job runs with the FFmpeg and settings it was queued with
+            when_probed(
+                job.options.get('ffmpeg_path'),
+                lambda capabilities, job=job: self.resume_job(job, capabilities), self
+            )
+
+    def resume_job(self, job, capabilities):
+        problems = capabilities.job_problems(job) if capabilities else []
+        if problems:
+            # Left unfinished in the journal, to resume once FFmpeg is fixed
+            self.logger.warning(f"Not resuming {job.input_file}: {'; '.join(problems)}")
+            self.status_label.setText(f"Error: {problems[0]}")
+            return
+        self.ensure_batch().submit(job)
+
+    def probe_ffmpeg(self):
+        """Probe the configured FFmpeg's encoders and muxers in the background, so later checks are instant."""
+        capabilities_future(self.settings.get('ffmpeg_path'))
+
+    def check_capabilities(self, then, on_refused=None):
+        """
+        Call `then()` if the configured FFmpeg can produce the chosen outputs, else tell the user.
+
+        Waits for the background probe without blocking the window. `on_refused()` is
+        called instead of `then()` when the settings aren't supported.
+        """
+        options = self.settings.snapshot()
+
+        def checked(capabilities):
+            problems = capabilities.problems(options) if capabilities else []
+            if problems:
+                self.status_label.setText(f"Error: {problems[0]}")
+                QMessageBox.critical(self, "Unsupported Settings", "\n".join(problems))
+                if on_refused is not None:
+                    on_refused()
+                return
+            then()
+
+        if not when_probed(options['ffmpeg_path'], checked, self):
+            self.status_label.setText("Checking FFmpeg...")
+
+    def apply_theme(self):
+        app = QApplication.instance()
+        theme = self.settings.get('theme')
+        app.setStyle(theme)
+
+        unsupported_themes = ['windowsvista', 'Macintosh']
+        if theme in unsupported_themes:
+            self.settings.set('dark_mode', 'false')
+            app.setPalette(app.style().standardPalette())
+            app.setStyleSheet("")
+        elif self.settings.get('dark_mode') == 'true':
+            palette = QPalette()
+            palette.setColor(QPalette.Window, QColor(53, 53, 53))
+            palette.setColor(QPalette.WindowText, Qt.white)
+            palette.setColor(QPalette.Base, QColor(25, 25, 25))
+            palette.setColor(QPalette.AlternateBase, QColor(53, 53, 53))
+            palette.setColor(QPalette.ToolTipBase, Qt.white)
+            palette.setColor(QPalette.ToolTipText, Qt.white)
+            palette.setColor(QPalette.Text, Qt.white)
+            palette.setColor(QPalette.Button, QColor(53, 53, 53))
+            palette.setColor(QPalette.ButtonText, Qt.white)
+            palette.setColor(QPalette.BrightText, Qt.red)
+            palette.setColor(QPalette.Link, QColor(42, 130, 218))
+            palette.setColor(QPalette.Highlight, QColor(42, 130, 218))
+            palette.setColor(QPalette.HighlightedText, Qt.black)
+            app.setPalette(palette)
+
+            # Fix tooltip style in dark mode for all themes
+            app.setStyleSheet("QToolTip { color: #ffffff; background-color: #2a82da; border: 1px solid white; }")
+        else:  # If not dark mode, reset to default palette
+            app.setPalette(app.style().standardPalette())
+
+    def init_ui(self):
+        main_widget = QWidget()
+        layout = QVBoxLayout()
+        layout.setSpacing(20)
+
+        # Title
+        title_label = QLabel("Track Separator")
+        title_label.setFont(QFont('Arial', 18, QFont.Bold))
+        title_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(title_label)
+
+        # Input File Section
+        input_group = QGroupBox("Input File")
+        input_layout = QVBoxLayout()
+        
+        file_select_layout = QHBoxLayout()
+        self.file_path_field = QLineEdit()
+        self.file_path_field.setPlaceholderText("No file selected")
+        self.file_path_field.setReadOnly(True)
+        
+        self.file_button = QPushButton("Browse")
+        self.file_button.setMinimumWidth(100)
+        self.clear_button = QPushButton("Clear")
+        self.clear_button.setMinimumWidth(100)
+        file_select_layout.addWidget(self.file_path_field)
+        file_select_layout.addWidget(self.file_button)
+        file_select_layout.addWidget(self.clear_button)
+        
+        input_layout.addLayout(file_select_layout)
+
+        # Stream Selection
+        streams_layout = QHBoxLayout()
+        
+        self.video_stream_combo = QComboBox()
+        self.video_stream_combo.setEnabled(False)
+        self.audio_stream_combo = CheckableComboBox(all_text="All audio streams")
+        self.audio_stream_combo.setEnabled(False)
+        
+        video_stream_layout = QVBoxLayout()
+        video_stream_layout.addWidget(QLabel("Video Stream:"))
+        video_stream_layout.addWidget(self.video_stream_combo)
+        
+        audio_stream_layout = QVBoxLayout()
+        audio_stream_layout.addWidget(QLabel("Audio Streams:"))
+        audio_stream_layout.addWidget(self.audio_stream_combo)
+        
+        streams_layout.addLayout(video_stream_layout)
+        streams_layout.addLayout(audio_stream_layout)
+        input_layout.addLayout(streams_layout)
+
+        # Waveform and loudness preview of every audio stream
+        preview_header = QHBoxLayout()
+        self.analyze_button = QPushButton("Analyze Audio")
+        self.analyze_button.setEnabled(False)
+        preview_header.addWidget(QLabel("Audio Preview:"))
+        preview_header.addStretch()
+        preview_header.addWidget(self.analyze_button)
+        input_layout.addLayout(preview_header)
+        self.preview_layout = QFormLayout()
+        input_layout.addLayout(self.preview_layout)
+        self.waveforms = {}  # stream index -> (WaveformWidget, stats QLabel)
+        self.analysis_thread = None
+
+        # Time range selection
+        range_layout = QHBoxLayout()
+        self.start_field = QLineEdit()
+        self.start_field.setPlaceholderText("Start (e.g. 1:30)")
+        self.end_field = QLineEdit()
+        self.end_field.setPlaceholderText("End (empty for end of file)")
+        self.clips_field = QLineEdit()
+        self.clips_field.setPlaceholderText("More clips, e.g. 5:00-5:30, 10:00+20")
+        range_layout.addWidget(QLabel("Range:"))
+        range_layout.addWidget(self.start_field)
+        range_layout.addWidget(self.end_field)
+        range_layout.addWidget(self.clips_field, 2)
+        input_layout.addLayout(range_layout)
+        
+        input_group.setLayout(input_layout)
+        layout.addWidget(input_group)
+
+        # Output Settings Section
+        output_group = QGroupBox("Output Settings")
+        output_layout = QVBoxLayout()
+
+        # Output folder selection
+        folder_layout = QHBoxLayout()
+        self.output_folder_field = QLineEdit()
+        self.output_folder_field.setPlaceholderText("Select output folder or use same as input")
+        self.output_folder_field.setText(self.settings.get('default_output_folder'))
+        
+        self.output_button = QPushButton("Browse")
+        self.same_as_input = QPushButton("Same as Input")
+        
+        folder_layout.addWidget(self.output_folder_field)
+        folder_layout.addWidget(self.output_button)
+        folder_layout.addWidget(self.same_as_input)
+        output_layout.addLayout(folder_layout)
+
+        # Custom filename templates
+        filename_group = QGroupBox("Output Filenames")
+        filename_layout = QFormLayout()
+        
+        self.video_filename = QLineEdit()
+        self.video_filename.setText(self.settings.get('video_template'))
+        self.audio_filename = QLineEdit()
+        self.audio_filename.setText(self.settings.get('audio_template'))
+        
+        filename_layout.addRow("Video:", self.video_filename)
+        filename_layout.addRow("Audio:", self.audio_filename)
+        
+        filename_group.setLayout(filename_layout)
+        output_layout.addWidget(filename_group)
+        
+        output_group.setLayout(output_layout)
+        layout.addWidget(output_group)
+
+        # Progress Section
+        progress_group = QGroupBox("Progress")
+        progress_layout = QVBoxLayout()
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(True)
+        progress_layout.addWidget(self.progress_bar)
+        
+        self.status_label = QLabel("Status: Ready")
+        progress_layout.addWidget(self.status_label)
+        
+        progress_group.setLayout(progress_layout)
+        layout.addWidget(progress_group)
+
+        # Batch Queue Section
+        batch_group = QGroupBox("Batch Queue")
+        batch_layout = QVBoxLayout()
+
+        self.batch_table = QTableWidget(0, 6)
+        self.batch_table.setHorizontalHeaderLabels(["File", "Type", "Status", "Progress", "Est. Start", "Est. Finish"])
+        self.batch_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.batch_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.batch_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.batch_table.setMaximumHeight(160)
+        batch_layout.addWidget(self.batch_table)
+
+        batch_buttons = QHBoxLayout()
+        self.add_files_button = QPushButton("Add Files")
+        self.add_current_button = QPushButton("Add Current")
+        self.add_current_button.setEnabled(False)
+        self.start_batch_button = QPushButton("Start Batch")
+        self.cancel_job_button = QPushButton("Cancel Selected")
+        self.clear_finished_button = QPushButton("Clear Finished")
+        batch_buttons.addWidget(self.add_files_button)
+        batch_buttons.addWidget(self.add_current_button)
+        batch_buttons.addStretch()
+        batch_buttons.addWidget(self.cancel_job_button)
+        batch_buttons.addWidget(self.clear_finished_button)
+        batch_buttons.addWidget(self.start_batch_button)
+        batch_layout.addLayout(batch_buttons)
+
+        self.throughput_label = QLabel("Throughput: no finished jobs yet")
+        batch_layout.addWidget(self.throughput_label)
+
+        batch_group.setLayout(batch_layout)
+        layout.addWidget(batch_group)
+
+        # Buttons
+        button_layout = QHBoxLayout()
+        
+        self.settings_button = QPushButton("Settings")
+        self.settings_button.setIcon(QIcon.fromTheme("preferences-system"))
+        
+        self.extract_button = QPushButton("Extract")
+        self.extract_button.setIcon(QIcon.fromTheme("media-playback-start"))
+        self.extract_button.setEnabled(False)
+        
+        button_layout.addWidget(self.settings_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.extract_button)
+        
+        layout.addLayout(button_layout)
+        
+        # Add log widget
+        layout.addWidget(self.log_widget)
+
+        # Set up the main widget
+        main_widget.setLayout(layout)
+        self.setCentralWidget(main_widget)
+
+        # Connect signals
+        self.file_button.clicked.connect(self.browse_file)
+        self.clear_button.clicked.connect(self.clear_fields)
+        self.analyze_button.clicked.connect(self.analyze_audio)
+        self.output_button.clicked.connect(self.browse_output_folder)
+        self.same_as_input.clicked.connect(self.use_input_folder)
+        self.settings_button.clicked.connect(self.show_settings)
+        self.extract_button.clicked.connect(self.extract)
+        self.add_files_button.clicked.connect(self.add_files_to_batch)
+        self.add_current_button.clicked.connect(self.add_current_to_batch)
+        self.start_batch_button.clicked.connect(self.start_batch)
+        self.cancel_job_button.clicked.connect(self.cancel_selected_jobs)
+        self.clear_finished_button.clicked.connect(self.clear_finished_jobs)
+
+    def clear_fields(self):
+        self.input_file = None
+        self.stream_info = None
+        self.clear_previews()
+        self.file_path_field.clear()
+        self.video_stream_combo.clear()
+        self.audio_stream_combo.clear()
+        self.start_field.clear()
+        self.end_field.clear()
+        self.clips_field.clear()
+        self.progress_bar.setValue(0)
+        self.status_label.setText("Status: Ready")
+        self.log_widget.clear()
+        self.extract_button.setEnabled(False)
+        self.add_current_button.setEnabled(False)
+
+    def browse_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Video File", "",
+            "Video Files (*.mp4 *.mkv *.avi *.mov);;All Files (*.*)"
+        )
+        if file_path:
+            self.input_file = file_path
+            self.stream_info = None
+            self.file_path_field.setText(file_path)
+            self.video_stream_combo.clear()
+            self.audio_stream_combo.clear()
+            self.video_stream_combo.setEnabled(False)
+            self.audio_stream_combo.setEnabled(False)
+            self.extract_button.setEnabled(False)
+            self.add_current_button.setEnabled(False)
+            self.clear_previews()
+            self.status_label.setText("Probing streams...")
+
+            # Probe for streams without blocking the UI
+            from backend.probe_thread import ProbeThread
+            probe_thread = ProbeThread(file_path, self.settings.get('ffmpeg_path'), self)
+            probe_thread.probed.connect(self.on_streams_probed)
+            probe_thread.finished.connect(probe_thread.deleteLater)
+            probe_thread.start()
+
+            if not self.output_folder_field.text():
+                self.use_input_folder()
+
+    def on_streams_probed(self, file_path, stream_info):
+        if file_path != self.input_file:
+            return  # a different file was selected while this one was probing
+        self.stream_info = stream_info
+
+        # Update stream selection combos
+        self.video_stream_combo.clear()
+        self.audio_stream_combo.clear()
+
+        for stream in self.stream_info.video_streams:
+            self.video_stream_combo.addItem(
+                f"Stream {stream['index']}: {stream['codec']} ({stream['resolution']})",
+                stream['index']
+            )
+
+        for position, stream in enumerate(self.stream_info.audio_streams):
+            label = f"Stream {stream['index']}: {stream['codec']} ({stream['channels']} ch, {stream['sample_rate']} Hz)"
+            if stream.get('language'):
+                label += f" [{stream['language']}]"
+            if stream.get('title'):
+                label += f" {stream['title']}"
+            self.audio_stream_combo.addItem(label, stream['index'], checked=position == 0)
+
+        self.video_stream_combo.setEnabled(True)
+        self.audio_stream_combo.setEnabled(True)
+        self.extract_button.setEnabled(True)
+        self.add_current_button.setEnabled(True)
+        self.status_label.setText("Status: Ready")
+        self.show_previews()
+
+    def clear_previews(self):
+        if self.analysis_thread is not None:
+            self.analysis_thread.cancel()
+            self.analysis_thread = None
+        while self.preview_layout.rowCount():
+            self.preview_layout.removeRow(0)
+        self.waveforms = {}
+        self.analyze_button.setEnabled(False)
+
+    def show_previews(self):
+        """Add a preview row per audio stream, filled in from the analysis cache where possible."""
+        from backend import audio_analysis
+        for stream in self.stream_info.audio_streams:
+            waveform = WaveformWidget()
+            stats = QLabel("Not analyzed")
+            row = QVBoxLayout()
+            row.addWidget(waveform)
+            row.addWidget(stats)
+            self.preview_layout.addRow(f"Stream {stream['index']}:", row)
+            self.waveforms[stream['index']] = (waveform, stats)
+            analysis = audio_analysis.cached_analysis(self.input_file, stream['index'])
+            if analysis is not None:
+                self.on_audio_analyzed(self.input_file, stream['index'], analysis)
+        self.analyze_button.setEnabled(audio_analysis.available() and bool(self.waveforms))
+        if not audio_analysis.available():
+            self.analyze_button.setToolTip("Install NumPy to preview audio streams")
+
+    def analyze_audio(self):
+        """Decode every audio stream in the background and draw its waveform and levels."""
+        from backend.analysis_thread import AnalysisThread
+        if self.analysis_thread is not None:
+            self.analysis_thread.cancel()
+        for waveform, stats in self.waveforms.values():
+            if waveform.analysis is None:
+                stats.setText("Analyzing...")
+        pending = [index for index, (waveform, _) in self.waveforms.items() if waveform.analysis is None]
+        self.analysis_thread = AnalysisThread(
+            self.input_file, self.settings.get('ffmpeg_path'), pending, self.stream_info.duration, self
+        )
+        self.analysis_thread.analyzed.connect(self.on_audio_analyzed)
+        self.analysis_thread.failed.connect(self.on_audio_analysis_failed)
+        self.analysis_thread.finished.connect(self.analysis_thread.deleteLater)
+        self.analysis_thread.start()
+
+    def on_audio_analyzed(self, file_path, index, analysis):
+        if file_path != self.input_file or index not in self.waveforms:
+            return
+        waveform, stats = self.waveforms[index]
+        waveform.set_analysis(analysis)
+        stats.setText(analysis.summary())
+
+    def on_audio_analysis_failed(self, file_path, index, message):
+        if file_path == self.input_file and index in self.waveforms:
+            self.waveforms[index][1].setText(f"Analysis failed: {message}")
+
+    def browse_output_folder(self):
+        folder_path = QFileDialog.getExistingDirectory(
+            self, "Select Output Folder",
+            self.output_folder_field.text()
+        )
+        if folder_path:
+            self.output_folder_field.setText(folder_path)
+
+    def use_input_folder(self):
+        if self.input_file:
+            self.output_folder_field.setText(os.path.dirname(self.input_file))
+
+    def show_settings(self):
+        from ui.settings_dialog import SettingsDialog
+        dialog = SettingsDialog(self.settings, self)
+        if dialog.exec_() == QDialog.Accepted:
+            # The dialog wrote to the same QSettings, so only the theme needs redoing
+            self.apply_theme()
+
+    def selected_audio_streams(self):
+        """Return ALL_STREAMS, a list of ticked stream indexes, or None if the file has no audio streams."""
+        if not self.audio_stream_combo.data_items():
+            return None
+        if self.audio_stream_combo.all_checked():
+            return ALL_STREAMS
+        return self.audio_stream_combo.checked_data()
+
+    def selected_clips(self):
+        """Return the clips entered in the range fields ([] for the whole file). Raises ClipError."""
+        clip = clip_from_fields(self.start_field.text(), self.end_field.text())
+        return ([clip] if clip else []) + parse_clips(self.clips_field.text())
+
+    def output_paths(self, input_file):
+        """Build the video and audio output paths for an input from the filename templates."""
+        return output_paths(
+            input_file, self.output_folder_field.text(),
+            self.video_filename.text() or self.settings.get('video_template'),
+            self.audio_filename.text() or self.settings.get('audio_template'),
+            self.settings.get('audio_codec')
+        )
+
+    def extract(self):
+        if not self.input_file:
+            self.status_label.setText("Error: No input file selected.")
+            return
+            
+        if not self.output_folder_field.text():
+            self.status_label.setText("Error: No output folder selected.")
+            return
+
+        # Get selected streams
+        video_stream = None
+
+        if self.video_stream_combo.currentData() is not None:
+            video_stream = self.video_stream_combo.currentData()
+
+        audio_streams = self.selected_audio_streams()
+        if audio_streams == []:
+            self.status_label.setText("Error: No audio stream selected.")
+            return
+
+        try:
+            clips = self.selected_clips()
+        except ClipError as e:
+            self.status_label.setText(f"Error: {e}")
+            return
+
+        output_video, output_audio = self.output_paths(self.input_file)
+        self.extract_button.setEnabled(False)  # until the FFmpeg check answers
+        self.check_capabilities(
+            functools.partial(
+                self.start_extraction, self.input_file, output_video, output_audio, video_stream, audio_streams,
+                self.stream_info.duration if self.stream_info else None, clips
+            ),
+            lambda: self.extract_button.setEnabled(True)
+        )
+
+    def start_extraction(self, input_file, output_video, output_audio, video_stream, audio_streams, duration, clips):
+        # Disable buttons during extraction
+        self.file_button.setEnabled(False)
+        self.clear_button.setEnabled(False)
+        self.output_button.setEnabled(False)
+        self.same_as_input.setEnabled(False)
+        self.settings_button.setEnabled(False)
+        self.extract_button.setEnabled(False)
+
+        # Start extraction
+        self.progress_bar.setValue(0)
+        from backend.worker_thread import WorkerThread
+        self.worker = WorkerThread(
+            input_file, output_video, output_audio,
+            self.settings, video_stream, audio_streams, duration, clips
+        )
+        self.worker.progress.connect(self.update_progress)
+        self.worker.stats.connect(self.update_stats)
+        self.worker.error.connect(self.display_error)
+        self.worker.finished.connect(self.enable_buttons)
+        self.worker.start()
+
+        self.status_label.setText("Processing...")
+
+    def update_progress(self, value):
+        self.progress_bar.setValue(value)
+        if value == 100:
+            self.status_label.setText("Extraction Complete!")
+
+    def update_stats(self, stats):
+        if stats['done']:
+            return
+        parts = []
+        if stats['speed'] is not None:
+            parts.append(f"{stats['speed']:.2f}x")
+        if stats['fps']:
+            parts.append(f"{stats['fps']:.0f} fps")
+        if stats['bitrate'] and stats['bitrate'] != 'N/A':
+            parts.append(stats['bitrate'])
+        if stats['eta'] is not None:
+            minutes, seconds = divmod(int(stats['eta']), 60)
+            hours, minutes = divmod(minutes, 60)
+            parts.append(f"ETA {hours:02d}:{minutes:02d}:{seconds:02d}")
+        self.status_label.setText("Processing... " + ", ".join(parts))
+
+    def ensure_batch(self):
+        if self.batch is None:
+            from backend.worker_thread import BatchRunner
+            self.batch = BatchRunner(self.settings, self, self.job_journal())
+            self.batch.job_updated.connect(self.update_job_row)
+            # Estimates move with progress; every few seconds is plenty for a clock time
+            self.forecast_timer = QTimer(self)
+            self.forecast_timer.timeout.connect(self.update_forecast)
+            self.forecast_timer.start(2000)
+        return self.batch
+
+    def queue_job(self, input_file, video_stream=None, audio_streams=None, duration=None, clips=None):
+        output_video, output_audio = self.output_paths(input_file)
+        job = Job(
+            input_file, output_video, output_audio, self.settings.snapshot(),
+            video_stream, audio_streams, duration,
+            max_retries=int(self.settings.get('batch_retries')), clips=clips
+        )
+        self.ensure_batch().submit(job)
+
+    def add_files_to_batch(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Select Video Files", "",
+            "Video Files (*.mp4 *.mkv *.avi *.mov);;All Files (*.*)"
+        )
+        if not file_paths:
+            return
+
+        def queue_all():
+            for file_path in file_paths:
+                # Streams and duration are resolved by the worker, not the GUI thread
+                self.queue_job(file_path)
+
+        self.check_capabilities(queue_all)
+
+    def add_current_to_batch(self):
+        if not self.input_file:
+            return
+        audio_streams = self.selected_audio_streams()
+        if audio_streams == []:
+            self.status_label.setText("Error: No audio stream selected.")
+            return
+        try:
+            clips = self.selected_clips()
+        except ClipError as e:
+            self.status_label.setText(f"Error: {e}")
+            return
+        self.check_capabilities(functools.partial(
+            self.queue_job,
+            self.input_file,
+            self.video_stream_combo.currentData(),
+            audio_streams,
+            self.stream_info.duration if self.stream_info else None,
+            clips
+        ))
+
+    def start_batch(self):
+        self.ensure_batch().start()
+        self.status_label.setText("Batch running...")
+
+    def cancel_selected_jobs(self):
+        if self.batch is None:
+            return
+        rows = {index.row() for index in self.batch_table.selectionModel().selectedRows()}
+        for job_id, row in self.job_rows.items():
+            if row in rows:
+                self.batch.cancel(job_id)
+
+    def clear_finished_jobs(self):
+        if self.batch is None:
+            return
+        self.batch.clear_finished()
+        self.batch_table.setRowCount(0)
+        self.job_rows = {}
+        for job in self.batch.jobs():
+            self.update_job_row(job)
+
+    def update_job_row(self, job):
+        row = self.job_rows.get(job.id)
+        if row is None:
+            row = self.batch_table.rowCount()
+            self.batch_table.insertRow(row)
+            self.job_rows[job.id] = row
+            self.batch_table.setItem(row, 0, QTableWidgetItem(os.path.basename(job.input_file)))
+            self.batch_table.setItem(row, 1, QTableWidgetItem(job.kind))
+            for column in range(2, 6):
+                self.batch_table.setItem(row, column, QTableWidgetItem())
+
+        if job.cached:
+            self.batch_table.item(row, 1).setText("cached")
+        elif job.outputs:
+            self.batch_table.item(row, 1).setText(
+                ", ".join(f"{output.kind} {output.mode}" for output in job.outputs)
+            )
+
+        status = job.status
+        if job.status == JobStatus.RUNNING and job.attempts > 1:
+            status = f"{status} (attempt {job.attempts})"
+        self.batch_table.item(row, 2).setText(status)
+        self.batch_table.item(row, 2).setToolTip(job.error or "")
+        self.batch_table.item(row, 3).setText(f"{job.progress}%")
+
+        if job.status == JobStatus.FAILED:
+            self.logger.error(f"Batch job failed: {job.input_file}: {job.error}")
+        if job.status in JobStatus.FINISHED:
+            self.batch_table.item(row, 4).setText("")
+            self.batch_table.item(row, 5).setText("")
+            self.update_throughput()
+
+    def update_forecast(self):
+        """Show when each unfinished batch job is expected to start and finish."""
+        if self.batch is None:
+            return
+
+        def clock(value):
+            return time.strftime("%H:%M", time.localtime(value)) if value is not None else "?"
+
+        for job_id, (start, finish) in self.batch.forecast().items():
+            row = self.job_rows.get(job_id)
+            if row is not None:
+                self.batch_table.item(row, 4).setText(clock(start))
+                self.batch_table.item(row, 5).setText(clock(finish))
+
+    def update_throughput(self):
+        """Show the rolling throughput of recently finished jobs (single and batch)."""
+        stats = default_recorder(self.settings.get('metrics_dir')).rolling()
+        if not stats['jobs']:
+            return
+        self.throughput_label.setText(
+            f"Last {stats['window'] // 60} min: {stats['jobs']} jobs ({stats['failed']} failed), "
+            f"{stats['media_seconds'] / 60:.1f} min of media, {stats['realtime']:.2f}x realtime, "
+            f"{stats['bytes_written'] / 1024 ** 2:.1f} MB written"
+        )
+
+    def display_error(self, message):
+        self.status_label.setText(f"Error: {message}")
+        QMessageBox.critical(self, "Error", message)
+        self.enable_buttons()
+
+    def enable_buttons(self):
+        self.update_throughput()
+        self.file_button.setEnabled(True)
+        self.clear_button.setEnabled(True)
+        self.output_button.setEnabled(True)
+        self.same_as_input.setEnabled(True)
+        self.settings_button.setEnabled(True)
+        self.extract_button.setEnabled(True)
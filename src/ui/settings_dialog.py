@@ -1,160 +1,347 @@
-import sys
-from PyQt5.QtWidgets import QDialog, QFileDialog, QFormLayout, QHBoxLayout, QStyleFactory, QVBoxLayout, QTabWidget, QLineEdit, QComboBox, QCheckBox, QPushButton, QWidget
-
-class SettingsDialog(QDialog):
-    def __init__(self, settings, parent=None):
-        super().__init__(parent)
-        self.settings = settings
-        self.setWindowTitle("Preferences")
-        self.setMinimumWidth(500)
-        self.setup_ui()
-
-    def setup_ui(self):
-        layout = QVBoxLayout()
-        tabs = QTabWidget()
-
-        # General Settings Tab
-        general_tab = QWidget()
-        general_layout = QFormLayout()
-
-        self.output_folder = QLineEdit(self.settings.get('default_output_folder'))
-        browse_button = QPushButton("Browse...")
-        browse_button.clicked.connect(self.browse_output_folder)
-        output_layout = QHBoxLayout()
-        output_layout.addWidget(self.output_folder)
-        output_layout.addWidget(browse_button)
-
-        self.ffmpeg_path = QLineEdit(self.settings.get('ffmpeg_path'))
-        ffmpeg_browse = QPushButton("Browse...")
-        ffmpeg_browse.clicked.connect(self.browse_ffmpeg)
-        ffmpeg_layout = QHBoxLayout()
-        ffmpeg_layout.addWidget(self.ffmpeg_path)
-        ffmpeg_layout.addWidget(ffmpeg_browse)
-
-        self.video_template = QLineEdit(self.settings.get('video_template'))
-        self.audio_template = QLineEdit(self.settings.get('audio_template'))
-        
-        general_layout.addRow("Default Output Folder:", output_layout)
-        general_layout.addRow("FFmpeg Path:", ffmpeg_layout)
-        general_layout.addRow("Video Filename Template:", self.video_template)
-        general_layout.addRow("Audio Filename Template:", self.audio_template)
-        
-        general_tab.setLayout(general_layout)
-
-        # Advanced Settings Tab
-        advanced_tab = QWidget()
-        advanced_layout = QFormLayout()
-
-        self.video_codec = QComboBox()
-        self.video_codec.addItems(['copy', 'h264', 'h265', 'vp9'])
-        self.video_codec.setCurrentText(self.settings.get('video_codec'))
-
-        self.audio_codec = QComboBox()
-        self.audio_codec.addItems(['aac', 'mp3', 'flac'])
-        self.audio_codec.setCurrentText(self.settings.get('audio_codec'))
-
-        self.audio_bitrate = QComboBox()
-        self.audio_bitrate.addItems(['128k', '192k', '256k', '320k'])
-        self.audio_bitrate.setCurrentText(self.settings.get('audio_bitrate'))
-
-        self.logging_level = QComboBox()
-        self.logging_level.addItems(['DEBUG', 'INFO', 'WARNING', 'ERROR'])
-        self.logging_level.setCurrentText(self.settings.get('logging_level'))
-
-        advanced_layout.addRow("Video Codec:", self.video_codec)
-        advanced_layout.addRow("Audio Codec:", self.audio_codec)
-        advanced_layout.addRow("Audio Bitrate:", self.audio_bitrate)
-        advanced_layout.addRow("Logging Level:", self.logging_level)
-        
-        advanced_tab.setLayout(advanced_layout)
-
-        # Appearance Tab
-        appearance_tab = QWidget()
-        appearance_layout = QFormLayout()
-
-        self.theme = QComboBox()
-        self.theme.addItems(QStyleFactory.keys())
-        self.theme.setCurrentText(self.settings.get('theme'))
-        self.theme.currentTextChanged.connect(self.on_theme_change)
-
-        self.dark_mode = QCheckBox("Enable Dark Mode")
-        self.dark_mode.setChecked(self.settings.get('dark_mode') == 'true')
-
-        appearance_layout.addRow("Theme:", self.theme)
-        appearance_layout.addRow("", self.dark_mode)
-        
-        appearance_tab.setLayout(appearance_layout)
-
-        # Add tabs
-        tabs.addTab(general_tab, "General")
-        tabs.addTab(advanced_tab, "Advanced")
-        tabs.addTab(appearance_tab, "Appearance")
-
-        # Buttons
-        button_layout = QHBoxLayout()
-        help_button = QPushButton("?")
-        help_button.setFixedWidth(30)
-        help_button.clicked.connect(self.open_help)
-        save_button = QPushButton("Save")
-        cancel_button = QPushButton("Cancel")
-        save_button.clicked.connect(self.save_settings)
-        cancel_button.clicked.connect(self.reject)
-        button_layout.addWidget(help_button)
-        button_layout.addStretch()
-        button_layout.addWidget(save_button)
-        button_layout.addWidget(cancel_button)
-
-        layout.addWidget(tabs)
-        layout.addLayout(button_layout)
-        self.setLayout(layout)
-
-    def on_theme_change(self, theme):
-        unsupported_themes = ['windowsvista', 'Macintosh']  # Remove 'Windows' from unsupported themes
-        if theme in unsupported_themes:
-            self.previous_dark_mode = self.dark_mode.isChecked()
-            self.dark_mode.setChecked(False)
-            self.dark_mode.setEnabled(False)
-        else:
-            if hasattr(self, 'previous_dark_mode'):
-                self.dark_mode.setChecked(self.previous_dark_mode)
-            self.dark_mode.setEnabled(True)
-
-    def browse_output_folder(self):
-        folder = QFileDialog.getExistingDirectory(
-            self, "Select Default Output Folder",
-            self.output_folder.text()
-        )
-        if folder:
-            self.output_folder.setText(folder)
-
-    def browse_ffmpeg(self):
-        file_filter = "FFmpeg executable (*)"
-        if sys.platform == "win32":
-            file_filter = "FFmpeg executable (*.exe)"
-        
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select FFmpeg Executable",
-            self.ffmpeg_path.text(), file_filter
-        )
-        if file_path:
-            self.ffmpeg_path.setText(file_path)
-
-    def open_help(self):
-        import webbrowser
-        webbrowser.open('https://github.com/RGB-Outl4w')
-
-    def save_settings(self):
-        self.settings.set('default_output_folder', self.output_folder.text())
-        self.settings.set('ffmpeg_path', self.ffmpeg_path.text())
-        self.settings.set('video_template', self.video_template.text())
-        self.settings.set('audio_template', self.audio_template.text())
-        self.settings.set('video_codec', self.video_codec.currentText())
-        self.settings.set('audio_codec', self.audio_codec.currentText())
-        self.settings.set('audio_bitrate', self.audio_bitrate.currentText())
-        self.settings.set('logging_level', self.logging_level.currentText())
-        self.settings.set('theme', self.theme.currentText())
-        self.settings.set('dark_mode', str(self.dark_mode.isChecked()).lower())
-
-        # Force settings to sync
-        self.settings.settings.sync()
-        self.accept()
+import sys
+from backend.capabilities import VIDEO_CODECS, capabilities_future
+from backend.capabilities_watcher import when_probed
+from backend.cluster import parse_address
+from backend.output_cache import default_output_cache
+from backend.commands import AUDIO_EXTENSIONS, parse_audio_ladder
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QDialog, QFileDialog, QFormLayout, QHBoxLayout, QLabel, QMessageBox, QSpinBox, QStyleFactory, QVBoxLayout, QTabWidget, QLineEdit, QComboBox, QCheckBox, QPushButton, QWidget
+
+class SettingsDialog(QDialog):
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+        self.setWindowTitle("Preferences")
+        self.setMinimumWidth(500)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        tabs = QTabWidget()
+
+        # General Settings Tab
+        general_tab = QWidget()
+        general_layout = QFormLayout()
+
+        self.output_folder = QLineEdit(self.settings.get('default_output_folder'))
+        browse_button = QPushButton("Browse...")
+        browse_button.clicked.connect(self.browse_output_folder)
+        output_layout = QHBoxLayout()
+        output_layout.addWidget(self.output_folder)
+        output_layout.addWidget(browse_button)
+
+        self.ffmpeg_path = QLineEdit(self.settings.get('ffmpeg_path'))
+        ffmpeg_browse = QPushButton("Browse...")
+        ffmpeg_browse.clicked.connect(self.browse_ffmpeg)
+        ffmpeg_layout = QHBoxLayout()
+        ffmpeg_layout.addWidget(self.ffmpeg_path)
+        ffmpeg_layout.addWidget(ffmpeg_browse)
+        # The codec lists follow the binary; probing is cached, so this is instant after the first time
+        self.ffmpeg_path.editingFinished.connect(self.fill_codecs)
+        self.ffmpeg_version = QLabel()
+        self.ffmpeg_version.setWordWrap(True)
+
+        self.video_template = QLineEdit(self.settings.get('video_template'))
+        self.audio_template = QLineEdit(self.settings.get('audio_template'))
+        
+        general_layout.addRow("Default Output Folder:", output_layout)
+        general_layout.addRow("FFmpeg Path:", ffmpeg_layout)
+        general_layout.addRow("FFmpeg Version:", self.ffmpeg_version)
+        general_layout.addRow("Video Filename Template:", self.video_template)
+        general_layout.addRow("Audio Filename Template:", self.audio_template)
+        
+        general_tab.setLayout(general_layout)
+
+        # Advanced Settings Tab
+        advanced_tab = QWidget()
+        advanced_layout = QFormLayout()
+
+        self.video_codec = QComboBox()
+        self.audio_codec = QComboBox()
+        self.fill_codecs()
+
+        self.audio_bitrate = QComboBox()
+        self.audio_bitrate.addItems(['128k', '192k', '256k', '320k'])
+        self.audio_bitrate.setCurrentText(self.settings.get('audio_bitrate'))
+
+        self.audio_ladder = QLineEdit(self.settings.get('audio_ladder'))
+        self.audio_ladder.setPlaceholderText("e.g. aac:192k, mp3:320k, flac (overrides the codec above)")
+        self.audio_ladder.setToolTip("Encode every audio track to each of these formats in one pass")
+
+        self.single_pass = QCheckBox("Extract all outputs in a single pass")
+        self.single_pass.setChecked(self.settings.get('single_pass') == 'true')
+
+        self.smart_copy = QCheckBox("Copy streams that already match the target codec")
+        self.smart_copy.setChecked(self.settings.get('smart_copy') == 'true')
+
+        self.chunked_encoding = QCheckBox("Encode h264/h265/vp9 video in parallel segments")
+        self.chunked_encoding.setChecked(self.settings.get('chunked_encoding') == 'true')
+
+        self.chunk_seconds = QSpinBox()
+        self.chunk_seconds.setRange(5, 3600)
+        self.chunk_seconds.setSuffix(" s")
+        self.chunk_seconds.setValue(int(self.settings.get('chunk_seconds')))
+
+        self.chunk_workers = QSpinBox()
+        self.chunk_workers.setRange(0, 256)
+        self.chunk_workers.setSpecialValueText("Auto")
+        self.chunk_workers.setValue(int(self.settings.get('chunk_workers')))
+
+        self.output_cache = QCheckBox("Reuse outputs of identical earlier extractions")
+        self.output_cache.setChecked(self.settings.get('output_cache') == 'true')
+
+        self.output_cache_size = QSpinBox()
+        self.output_cache_size.setRange(1, 10000)
+        self.output_cache_size.setSuffix(" GB")
+        self.output_cache_size.setValue(max(1, int(self.settings.get('output_cache_mb')) // 1024))
+
+        self.cache_usage = QLabel()
+        clear_cache_button = QPushButton("Clear Cache")
+        clear_cache_button.clicked.connect(self.clear_output_cache)
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(self.output_cache_size)
+        cache_layout.addWidget(self.cache_usage)
+        cache_layout.addWidget(clear_cache_button)
+        self.update_cache_usage()
+
+        self.batch_policy = QComboBox()
+        for label, policy in (("First in, first out", 'fifo'), ("Shortest job first", 'shortest'),
+                              ("Fair share between folders", 'fair')):
+            self.batch_policy.addItem(label, policy)
+        self.batch_policy.setCurrentIndex(max(0, self.batch_policy.findData(self.settings.get('batch_policy'))))
+        self.adaptive_concurrency = QCheckBox("Adjust parallel batch jobs to the measured system load")
+        self.adaptive_concurrency.setChecked(self.settings.get('adaptive_concurrency') == 'true')
+        self.max_transcodes = QSpinBox()
+        self.max_transcodes.setRange(0, 256)
+        self.max_transcodes.setSpecialValueText("Auto")
+        self.max_transcodes.setValue(int(self.settings.get('batch_max_transcodes')))
+        self.max_copies = QSpinBox()
+        self.max_copies.setRange(1, 64)
+        self.max_copies.setValue(int(self.settings.get('batch_max_copies')))
+        self.volume_jobs = QSpinBox()
+        self.volume_jobs.setRange(0, 64)
+        self.volume_jobs.setSpecialValueText("No limit")
+        self.volume_jobs.setValue(int(self.settings.get('batch_volume_jobs')))
+        self.cluster_address = QLineEdit(self.settings.get('cluster_address'))
+        self.cluster_address.setPlaceholderText("Empty: run batch jobs here; e.g. :7600 to hand them to workers")
+        self.cluster_address.setToolTip("Start workers with: tracksep-cli --worker HOST:PORT")
+        self.cluster_token = QLineEdit(self.settings.get('cluster_token'))
+        self.cluster_token.setEchoMode(QLineEdit.Password)
+
+        self.metrics = QCheckBox("Record job metrics (JSON lines and Prometheus textfile)")
+        self.metrics.setChecked(self.settings.get('metrics') == 'true')
+        self.metrics_dir = QLineEdit(self.settings.get('metrics_dir'))
+        self.metrics_dir.setPlaceholderText("Default: TrackSep cache folder")
+
+        self.logging_level = QComboBox()
+        self.logging_level.addItems(['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+        self.logging_level.setCurrentText(self.settings.get('logging_level'))
+
+        advanced_layout.addRow("Video Codec:", self.video_codec)
+        advanced_layout.addRow("Audio Codec:", self.audio_codec)
+        advanced_layout.addRow("Audio Bitrate:", self.audio_bitrate)
+        advanced_layout.addRow("Audio Ladder:", self.audio_ladder)
+        advanced_layout.addRow("", self.single_pass)
+        advanced_layout.addRow("", self.smart_copy)
+        advanced_layout.addRow("", self.chunked_encoding)
+        advanced_layout.addRow("Segment Length:", self.chunk_seconds)
+        advanced_layout.addRow("Parallel Encoders:", self.chunk_workers)
+        advanced_layout.addRow("", self.output_cache)
+        advanced_layout.addRow("Output Cache Size:", cache_layout)
+        advanced_layout.addRow("Batch Order:", self.batch_policy)
+        advanced_layout.addRow("", self.adaptive_concurrency)
+        advanced_layout.addRow("Max Parallel Transcodes:", self.max_transcodes)
+        advanced_layout.addRow("Max Parallel Copies:", self.max_copies)
+        advanced_layout.addRow("Jobs per Output Disk:", self.volume_jobs)
+        advanced_layout.addRow("Worker Coordinator Address:", self.cluster_address)
+        advanced_layout.addRow("Worker Token:", self.cluster_token)
+        advanced_layout.addRow("", self.metrics)
+        advanced_layout.addRow("Metrics Folder:", self.metrics_dir)
+        advanced_layout.addRow("Logging Level:", self.logging_level)
+        
+        advanced_tab.setLayout(advanced_layout)
+
+        # Appearance Tab
+        appearance_tab = QWidget()
+        appearance_layout = QFormLayout()
+
+        self.theme = QComboBox()
+        self.theme.addItems(QStyleFactory.keys())
+        self.theme.setCurrentText(self.settings.get('theme'))
+        self.theme.currentTextChanged.connect(self.on_theme_change)
+
+        self.dark_mode = QCheckBox("Enable Dark Mode")
+        self.dark_mode.setChecked(self.settings.get('dark_mode') == 'true')
+
+        appearance_layout.addRow("Theme:", self.theme)
+        appearance_layout.addRow("", self.dark_mode)
+        
+        appearance_tab.setLayout(appearance_layout)
+
+        # Add tabs
+        tabs.addTab(general_tab, "General")
+        tabs.addTab(advanced_tab, "Advanced")
+        tabs.addTab(appearance_tab, "Appearance")
+
+        # Buttons
+        button_layout = QHBoxLayout()
+        help_button = QPushButton("?")
+        help_button.setFixedWidth(30)
+        help_button.clicked.connect(self.open_help)
+        save_button = QPushButton("Save")
+        cancel_button = QPushButton("Cancel")
+        save_button.clicked.connect(self.save_settings)
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(help_button)
+        button_layout.addStretch()
+        button_layout.addWidget(save_button)
+        button_layout.addWidget(cancel_button)
+
+        layout.addWidget(tabs)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def on_theme_change(self, theme):
+        unsupported_themes = ['windowsvista', 'Macintosh']  # Remove 'Windows' from unsupported themes
+        if theme in unsupported_themes:
+            self.previous_dark_mode = self.dark_mode.isChecked()
+            self.dark_mode.setChecked(False)
+            self.dark_mode.setEnabled(False)
+        else:
+            if hasattr(self, 'previous_dark_mode'):
+                self.dark_mode.setChecked(self.previous_dark_mode)
+            self.dark_mode.setEnabled(True)
+
+    def update_cache_usage(self):
+        stats = default_output_cache().stats()
+        self.cache_usage.setText(f"{stats['bytes'] / 1024 ** 3:.2f} GB in {stats['entries']} entries")
+
+    def clear_output_cache(self):
+        answer = QMessageBox.question(self, "Clear Cache", "Delete all cached outputs?")
+        if answer == QMessageBox.Yes:
+            default_output_cache().purge()
+            self.update_cache_usage()
+
+    def browse_output_folder(self):
+        folder = QFileDialog.getExistingDirectory(
+            self, "Select Default Output Folder",
+            self.output_folder.text()
+        )
+        if folder:
+            self.output_folder.setText(folder)
+
+    def browse_ffmpeg(self):
+        file_filter = "FFmpeg executable (*)"
+        if sys.platform == "win32":
+            file_filter = "FFmpeg executable (*.exe)"
+        
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select FFmpeg Executable",
+            self.ffmpeg_path.text(), file_filter
+        )
+        if file_path:
+            self.ffmpeg_path.setText(file_path)
+            self.fill_codecs()
+
+    def fill_codecs(self):
+        """
+        List the codecs the chosen FFmpeg can encode, with the encoder each one uses as its tooltip.
+
+        An FFmpeg that wasn't probed yet is probed in the background; every codec is
+        listed meanwhile.
+        """
+        path = self.ffmpeg_path.text()
+        if not when_probed(path, lambda capabilities: self.show_codecs(path, capabilities), self):
+            self.show_codecs(path, None)
+            self.ffmpeg_version.setText("Checking FFmpeg...")
+
+    def show_codecs(self, path, capabilities):
+        if path != self.ffmpeg_path.text():
+            return  # the path was changed while this one was probed
+        if capabilities is None:
+            # Not found or not FFmpeg: offer everything and let the jobs report what fails
+            self.ffmpeg_version.setText("FFmpeg not found; codecs are not checked")
+            codec_lists = (['copy'] + list(VIDEO_CODECS), list(AUDIO_EXTENSIONS))
+        else:
+            self.ffmpeg_version.setText(capabilities.version)
+            codec_lists = (capabilities.video_codecs(), capabilities.audio_codecs())
+
+        combos = ((self.video_codec, 'video_codec'), (self.audio_codec, 'audio_codec'))
+        for (combo, key), codecs in zip(combos, codec_lists):
+            current = combo.currentText() or self.settings.get(key)
+            combo.clear()
+            for codec in codecs:
+                combo.addItem(codec)
+                encoder = capabilities.encoder_for(codec) if capabilities and codec != 'copy' else None
+                if encoder:
+                    combo.setItemData(combo.count() - 1, f"Encoded with {encoder}", Qt.ToolTipRole)
+            if current and current not in codecs:
+                # Keep the saved choice visible so it isn't changed silently
+                combo.addItem(current)
+                combo.setItemData(combo.count() - 1, "Not supported by this FFmpeg", Qt.ToolTipRole)
+            combo.setCurrentText(current)
+
+    def open_help(self):
+        import webbrowser
+        webbrowser.open('https://github.com/RGB-Outl4w')
+
+    def save_settings(self):
+        try:
+            parse_audio_ladder(self.audio_ladder.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Audio Ladder", str(e))
+            return
+        if self.cluster_address.text().strip():
+            try:
+                parse_address(self.cluster_address.text().strip())
+            except ValueError as e:
+                QMessageBox.warning(self, "Invalid Coordinator Address", str(e))
+                return
+        future = capabilities_future(self.ffmpeg_path.text())
+        if not future.done():
+            # Save once the probe answers rather than freezing the dialog until then
+            self.ffmpeg_version.setText("Checking FFmpeg...")
+            when_probed(self.ffmpeg_path.text(), lambda capabilities: self.save_settings(), self)
+            return
+        capabilities = future.result()
+        if capabilities is not None:
+            problems = capabilities.problems({
+                'video_codec': self.video_codec.currentText(),
+                'audio_codec': self.audio_codec.currentText(),
+                'audio_bitrate': self.audio_bitrate.currentText(),
+                'audio_ladder': self.audio_ladder.text()
+            })
+            if problems:
+                QMessageBox.warning(self, "Unsupported Codec", "\n".join(problems))
+                return
+        self.settings.set('default_output_folder', self.output_folder.text())
+        self.settings.set('ffmpeg_path', self.ffmpeg_path.text())
+        self.settings.set('video_template', self.video_template.text())
+        self.settings.set('audio_template', self.audio_template.text())
+        self.settings.set('video_codec', self.video_codec.currentText())
+        self.settings.set('audio_codec', self.audio_codec.currentText())
+        self.settings.set('audio_bitrate', self.audio_bitrate.currentText())
+        self.settings.set('audio_ladder', self.audio_ladder.text().strip())
+        self.settings.set('single_pass', str(self.single_pass.isChecked()).lower())
+        self.settings.set('smart_copy', str(self.smart_copy.isChecked()).lower())
+        self.settings.set('chunked_encoding', str(self.chunked_encoding.isChecked()).lower())
+        self.settings.set('chunk_seconds', str(self.chunk_seconds.value()))
+        self.settings.set('chunk_workers', str(self.chunk_workers.value()))
+        self.settings.set('output_cache', str(self.output_cache.isChecked()).lower())
+        self.settings.set('output_cache_mb', str(self.output_cache_size.value() * 1024))
+        self.settings.set('batch_policy', self.batch_policy.currentData())
+        self.settings.set('adaptive_concurrency', str(self.adaptive_concurrency.isChecked()).lower())
+        self.settings.set('batch_max_transcodes', str(self.max_transcodes.value()))
+        self.settings.set('batch_max_copies', str(self.max_copies.value()))
+        self.settings.set('batch_volume_jobs', str(self.volume_jobs.value()))
+        self.settings.set('cluster_address', self.cluster_address.text().strip())
+        self.settings.set('cluster_token', self.cluster_token.text())
+        self.settings.set('metrics', str(self.metrics.isChecked()).lower())
+        self.settings.set('metrics_dir', self.metrics_dir.text())
+        self.settings.set('logging_level', self.logging_level.currentText())
+        self.settings.set('theme', self.theme.currentText())
+        self.settings.set('dark_mode', str(self.dark_mode.isChecked()).lower())
+
+        # Force settings to sync
+        self.settings.settings.sync()
+        self.accept()
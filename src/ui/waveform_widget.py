@@ -0,0 +1,42 @@
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QColor, QPainter, QPen
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+
+class WaveformWidget(QWidget):
+    """Draws the min/max peak buckets of an AudioAnalysis as a waveform."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.analysis = None
+        self.setMinimumHeight(40)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def sizeHint(self):
+        return QSize(400, 40)
+
+    def set_analysis(self, analysis):
+        self.analysis = analysis
+        self.setToolTip(analysis.summary() if analysis is not None else "")
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().base())
+        width, height = self.width(), self.height()
+        middle = height / 2
+        painter.setPen(QPen(self.palette().mid().color()))
+        painter.drawLine(0, int(middle), width, int(middle))
+        if self.analysis is None or not self.analysis.maximums:
+            return
+
+        painter.setPen(QPen(QColor(42, 130, 218)))
+        minimums, maximums = self.analysis.minimums, self.analysis.maximums
+        count = len(maximums)
+        for x in range(width):
+            # Each pixel column covers a range of buckets; draw their overall extent
+            first = x * count // width
+            last = max(first + 1, (x + 1) * count // width)
+            low = min(minimums[first:last])
+            high = max(maximums[first:last])
+            painter.drawLine(x, int(middle - high * middle), x, int(middle - low * middle))
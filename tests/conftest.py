@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend is imported as `backend.*`, like the application and the benchmarks do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
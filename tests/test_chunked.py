@@ -0,0 +1,36 @@
+import os
+import stat
+
+import pytest
+
+from backend.chunked import ChunkedEncodingError, probe_video_timing
+
+
+def fake_ffmpeg(directory, probe_output):
+    """An ffmpeg path whose ffprobe, next to it, prints `probe_output` and exits 0."""
+    for name, body in (('ffmpeg', ''), ('ffprobe', f"cat <<'EOF'\n{probe_output}\nEOF\n")):
+        path = directory / name
+        path.write_text(f"#!/bin/sh\n{body}")
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(directory / 'ffmpeg')
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="the fake ffprobe is a shell script")
+def test_probe_video_timing(tmp_path):
+    ffmpeg = fake_ffmpeg(tmp_path, '{"streams": [{"start_time": "0.040"}], "format": {"duration": "12.5"}}')
+    assert probe_video_timing(ffmpeg, 'in.mkv') == (12.5, 0.04)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="the fake ffprobe is a shell script")
+@pytest.mark.parametrize('output', ['Segmentation fault', '', '[1, 2]'])
+def test_garbage_from_ffprobe(tmp_path, output):
+    with pytest.raises(ChunkedEncodingError):
+        probe_video_timing(fake_ffmpeg(tmp_path, output), 'in.mkv')
+
+
+def test_ffprobe_that_cannot_run(tmp_path):
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_text('')
+    (tmp_path / 'ffprobe').write_text('')  # not executable
+    with pytest.raises(ChunkedEncodingError):
+        probe_video_timing(str(ffmpeg), 'in.mkv')
@@ -0,0 +1,38 @@
+import importlib
+import os
+import runpy
+import subprocess
+import sys
+
+import pytest
+import setuptools
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+@pytest.fixture
+def setup_args(monkeypatch):
+    """The keyword arguments setup.py passes to setuptools.setup()."""
+    captured = {}
+    monkeypatch.setattr(setuptools, 'setup', lambda **kwargs: captured.update(kwargs))
+    monkeypatch.chdir(ROOT)
+    runpy.run_path('setup.py')
+    return captured
+
+
+def test_console_scripts_are_installed_and_importable(setup_args):
+    installed = set(setup_args.get('py_modules', [])) | set(setup_args['packages'])
+    for script in setup_args['entry_points']['console_scripts']:
+        name, _, target = (part.strip() for part in script.partition('='))
+        module, _, function = target.partition(':')
+        assert module.split('.')[0] in installed, f"{name}: {module} isn't installed"
+        # package_dir maps src/ to the install root, which conftest puts on sys.path
+        assert callable(getattr(importlib.import_module(module), function)), name
+
+
+def test_cli_imports_stay_light():
+    heavy = ('backend.cluster', 'backend.watch', 'PyQt5')
+    code = f"import sys, cli; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(ROOT, 'src'),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
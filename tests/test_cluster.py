@@ -0,0 +1,178 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from backend.cluster import PROTOCOL_VERSION, Coordinator, Worker, format_address, map_path, parse_address
+from backend.jobs import Job, JobStatus, Scheduler
+from backend.options import Options
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('coordinator:7600', ('coordinator', 7600)),
+    ('10.0.0.5:7600', ('10.0.0.5', 7600)),
+    ('[::1]:7600', ('::1', 7600)),
+    (':7600', ('', 7600)),
+    ('unix:/run/tracksep.sock', '/run/tracksep.sock')
+])
+def test_parse_address(text, expected):
+    assert parse_address(text) == expected
+
+
+@pytest.mark.parametrize('text', ['coordinator', 'coordinator:', 'coordinator:port', '7600'])
+def test_parse_address_rejects(text):
+    with pytest.raises(ValueError):
+        parse_address(text)
+
+
+@pytest.mark.parametrize('address', [('coordinator', 7600), '/run/tracksep.sock'])
+def test_format_address_round_trips(address):
+    assert parse_address(format_address(address)) == address
+
+
+@pytest.mark.skipif(os.sep != '/', reason="POSIX paths")
+@pytest.mark.parametrize('path, expected', [
+    ('/srv/media/show/ep1.mkv', '/mnt/media/show/ep1.mkv'),
+    ('/srv/media', '/mnt/media'),
+    ('/srv/media-archive/ep1.mkv', '/data/media-archive/ep1.mkv'),  # '/srv/media' is part of a name there
+    ('/srv/other/ep1.mkv', '/data/other/ep1.mkv'),
+    ('/home/ep1.mkv', '/home/ep1.mkv'),
+    (None, None),
+    ('', '')
+])
+def test_map_path(path, expected):
+    path_map = [('/srv/media/', '/mnt/media'), ('/srv', '/data/'), ('/srv/media', '/unused')]
+    assert map_path(path, path_map) == expected
+
+
+def test_worker_settings_replace_the_coordinators():
+    worker = Worker(':7600', {'chunk_workers': '4'})
+    # Left out, the ffmpeg and cache settings still come from this machine's defaults
+    assert worker.options == {'ffmpeg_path': 'ffmpeg', 'chunk_workers': '4', 'output_cache': 'false',
+                              'output_cache_mb': '4096'}
+
+
+@pytest.fixture
+def cluster():
+    """A coordinator on localhost with a fifo scheduler, and a function that starts workers for it."""
+    coordinator = Coordinator('127.0.0.1:0', 'secret', lease_ttl=0.5, heartbeat=0.1)
+    coordinator.start()
+    scheduler = Scheduler(coordinator.run_job)
+    coordinator.attach(scheduler)
+    stops = []
+
+    def start_worker(runner, slots=1, **kwargs):
+        stop = threading.Event()
+        worker = Worker(coordinator.listening_address, slots=slots, token='secret', runner=runner, **kwargs)
+        thread = threading.Thread(target=worker.run, args=(stop,), daemon=True)
+        thread.start()
+        stops.append((stop, thread))
+        wait_for(lambda: len(coordinator.workers) >= slots)
+        return stop, thread
+
+    yield coordinator, scheduler, start_worker
+    for stop, _ in stops:
+        stop.set()
+    coordinator.stop()
+    for _, thread in stops:
+        thread.join(5)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def make_job(tmp_path, name, audio=True, estimate=None):
+    options = dict(Options().snapshot(), metrics='false', ffmpeg_path='/coordinator/ffmpeg', cluster_token='secret')
+    job = Job(str(tmp_path / f"{name}.mkv"), str(tmp_path / f"{name}.mp4"),
+              str(tmp_path / f"{name}.m4a") if audio else None, options)
+    job.estimate = estimate
+    return job
+
+
+def test_worker_runs_a_leased_job(cluster, tmp_path):
+    coordinator, scheduler, start_worker = cluster
+    seen = []
+
+    def runner(job, on_progress):
+        seen.append(job.options)
+        on_progress(50)
+        time.sleep(1.0)  # twice the lease TTL: only the heartbeats keep the lease
+
+    start_worker(runner, slots=2, options={'ffmpeg_path': '/worker/ffmpeg'})
+    assert scheduler.max_jobs == 2
+    progress = []
+    scheduler.on_update = lambda job: progress.append(job.progress)
+    job = scheduler.submit(make_job(tmp_path, 'a'))
+    scheduler.start()
+    assert scheduler.wait(10)
+
+    assert (job.status, job.attempts) == (JobStatus.DONE, 1)
+    assert 50 in progress  # carried by a heartbeat
+    assert seen[0]['ffmpeg_path'] == '/worker/ffmpeg'
+    assert 'cluster_token' not in seen[0]
+
+
+def test_one_slot_runs_jobs_in_policy_order(cluster, tmp_path):
+    coordinator, scheduler, start_worker = cluster
+    scheduler.policy = 'shortest'
+    order = []
+    running = []
+
+    def runner(job, on_progress):
+        order.append(os.path.basename(job.input_file))
+        running.append(sum(job.status == JobStatus.RUNNING for job in scheduler.queue.jobs()))
+
+    start_worker(runner)
+    # A transcode and copies: one limit for both kinds, so only the next job by the policy is handed out
+    for name, audio, estimate in (('long', True, 30), ('short', False, 10), ('medium', True, 20)):
+        scheduler.submit(make_job(tmp_path, name, audio, estimate))
+    scheduler.start()
+    assert scheduler.wait(10)
+
+    assert order == ['short.mkv', 'medium.mkv', 'long.mkv']
+    assert running == [1, 1, 1]
+
+
+class _SilentWorker:
+    """Takes a lease over the raw protocol, then stops answering or disconnects."""
+
+    def __init__(self, address):
+        host, port = parse_address(address)
+        self.sock = socket.create_connection((host, port), timeout=5)
+        self.rfile = self.sock.makefile('rb')
+        self.request({'type': 'hello', 'version': PROTOCOL_VERSION, 'worker': 'silent', 'token': 'secret'})
+
+    def request(self, message):
+        self.sock.sendall(json.dumps(message).encode('utf-8') + b"\n")
+        return json.loads(self.rfile.readline())
+
+
+@pytest.mark.parametrize('disconnect', [False, True])
+def test_lost_lease_goes_to_another_worker(cluster, tmp_path, disconnect):
+    coordinator, scheduler, start_worker = cluster
+    silent = _SilentWorker(coordinator.listening_address)
+    wait_for(lambda: coordinator.workers == ['silent'])
+    job = scheduler.submit(make_job(tmp_path, 'a'))
+    scheduler.start()
+    lease = silent.request({'type': 'lease', 'wait': 5})
+    assert lease['type'] == 'job' and lease['job']['input'] == job.input_file
+    assert 'cluster_token' not in lease['job']['options']
+    if disconnect:
+        silent.sock.close()
+
+    ran = []
+    start_worker(lambda job, on_progress: ran.append(job.input_file), name='backup')
+    assert scheduler.wait(10)
+
+    assert ran == [job.input_file]
+    assert (job.status, job.attempts) == (JobStatus.DONE, 1)  # requeued by the coordinator, not retried
+    if not disconnect:
+        assert silent.request({'type': 'heartbeat', 'lease': lease['lease']}) == {'type': 'lost'}
+        silent.sock.close()
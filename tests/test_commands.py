@@ -0,0 +1,55 @@
+import pytest
+
+from backend.commands import _source_matches, effective_audio_codec, parse_audio_ladder, parse_bitrate
+
+
+def test_parse_bitrate():
+    assert parse_bitrate('192k') == 192000
+    assert parse_bitrate('2M') == 2000000
+    assert parse_bitrate('1.5m') == 1500000
+    assert parse_bitrate('128000') == 128000
+    assert parse_bitrate(None) is None
+    assert parse_bitrate('fast') is None
+
+
+def test_parse_audio_ladder():
+    assert parse_audio_ladder('aac:192k, MP3:320k ,flac') == [('aac', '192k'), ('mp3', '320k'), ('flac', None)]
+    assert parse_audio_ladder('aac:128k,aac:64k') == [('aac', '128k'), ('aac', '64k')]
+
+
+@pytest.mark.parametrize('value', [None, '', ' , '])
+def test_parse_audio_ladder_empty(value):
+    assert parse_audio_ladder(value) == []
+
+
+@pytest.mark.parametrize('value', ['wav', 'aac:loud', 'aac:128k, aac:128k', 'opus, opus'])
+def test_parse_audio_ladder_rejects(value):
+    with pytest.raises(ValueError):
+        parse_audio_ladder(value)
+
+
+def stream(codec, bit_rate=None, sample_rate='48000'):
+    return {'index': 1, 'codec': codec, 'bit_rate': bit_rate, 'sample_rate': sample_rate}
+
+
+@pytest.mark.parametrize('source, codec, target, expected', [
+    (stream('aac', '128000'), 'aac', 192000, True),
+    (stream('aac', '200000'), 'aac', 192000, True),  # VBR sources may sit a little above the target
+    (stream('aac', '320000'), 'aac', 192000, False),
+    (stream('aac', None), 'aac', 192000, False),  # unknown bitrate, maybe far above the target
+    (stream('aac', 'N/A'), 'aac', 192000, False),
+    (stream('aac', None), 'aac', None, True),  # no target bitrate to compare with
+    (stream('flac', None), 'flac', 192000, True),  # lossless: the bitrate doesn't matter
+    (stream('mp3', '128000'), 'aac', 192000, False),
+    (stream('hevc'), 'h265', None, True),
+    (None, 'aac', 192000, False)
+])
+def test_source_matches(source, codec, target, expected):
+    assert _source_matches(source, codec, target) is expected
+
+
+def test_effective_audio_codec():
+    assert effective_audio_codec('aac', '192k', stream('aac', '128000')) == 'copy'
+    assert effective_audio_codec('aac', '192k', stream('aac', None)) == 'aac'
+    assert effective_audio_codec('aac', '192k', stream('aac', '128000', sample_rate='0')) == 'aac'
+    assert effective_audio_codec('copy', '192k', stream('aac', '128000')) == 'copy'
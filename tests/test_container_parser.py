@@ -0,0 +1,242 @@
+"""MP4 and Matroska header parsing, against small files built box by box and element by element."""
+import struct
+
+import pytest
+
+from backend import container_parser as cp
+from backend.container_parser import ContainerParseError, parse_container
+
+
+# --- MP4 ---------------------------------------------------------------------
+
+def box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def large_box(box_type, payload=b''):
+    """A box with a 64-bit size field."""
+    return struct.pack('>I4sQ', 1, box_type, 16 + len(payload)) + payload
+
+
+def full_box(box_type, payload, version=0):
+    return box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+
+def mvhd(timescale, duration):
+    return full_box(b'mvhd', struct.pack('>IIII', 0, 0, timescale, duration) + b'\0' * 80)
+
+
+def mdhd(language):
+    packed = 0
+    for letter in language:
+        packed = (packed << 5) | (ord(letter) - 0x60)
+    return full_box(b'mdhd', struct.pack('>IIIIH', 0, 0, 48000, 0, packed) + b'\0' * 2)
+
+
+def trak(handler, sample_entry, language='und'):
+    hdlr = full_box(b'hdlr', b'\0' * 4 + handler + b'\0' * 12 + b'\0')
+    stsd = full_box(b'stsd', struct.pack('>I', 1) + sample_entry)
+    return box(b'trak', box(b'mdia', mdhd(language) + hdlr + box(b'minf', box(b'stbl', stsd))))
+
+
+def video_entry(fourcc, width, height):
+    return box(fourcc, b'\0' * 24 + struct.pack('>HH', width, height) + b'\0' * 50)
+
+
+def audio_entry(fourcc, channels, sample_rate, children=b''):
+    return box(
+        fourcc,
+        b'\0' * 8 + struct.pack('>H', 0) + b'\0' * 6 + struct.pack('>HH', channels, 16) + b'\0' * 4
+        + struct.pack('>I', sample_rate << 16) + children
+    )
+
+
+def esds(object_type, avg_bitrate):
+    decoder_config = bytes([object_type, 0x15, 0, 0, 0]) + struct.pack('>II', avg_bitrate, avg_bitrate)
+    es_descriptor = b'\0\x01\0' + bytes([0x04, len(decoder_config)]) + decoder_config
+    return full_box(b'esds', bytes([0x03, len(es_descriptor)]) + es_descriptor)
+
+
+def write_mp4(tmp_path, *top_level):
+    path = tmp_path / 'in.mp4'
+    path.write_bytes(box(b'ftyp', b'isom\0\0\0\0isomiso2') + b''.join(top_level))
+    return str(path)
+
+
+def test_mp4_streams_and_duration(tmp_path):
+    moov = box(b'moov', mvhd(1000, 90500) + b''.join([
+        trak(b'vide', video_entry(b'avc1', 1920, 1080)),
+        trak(b'soun', audio_entry(b'mp4a', 2, 48000, esds(0x40, 128000)), language='eng'),
+        trak(b'soun', audio_entry(b'Opus', 6, 48000), language='jpn')
+    ]))
+    info = parse_container(write_mp4(tmp_path, moov))
+
+    assert info['duration'] == pytest.approx(90.5)
+    assert info['video_streams'] == [{'index': 0, 'codec': 'h264', 'resolution': '1920x1080', 'bit_rate': None}]
+    aac, opus = info['audio_streams']
+    assert aac == {
+        'index': 1, 'codec': 'aac', 'channels': 2, 'sample_rate': '48000',
+        'bit_rate': '128000', 'language': 'eng', 'title': None
+    }
+    assert (opus['index'], opus['codec'], opus['channels'], opus['language']) == (2, 'opus', 6, 'jpn')
+
+
+def test_mp4_moov_after_large_mdat(tmp_path):
+    mdat = large_box(b'mdat', b'\0' * 4096)
+    moov = box(b'moov', mvhd(600, 1200) + trak(b'vide', video_entry(b'hvc1', 3840, 2160)))
+    info = parse_container(write_mp4(tmp_path, mdat, moov))
+
+    assert info['duration'] == pytest.approx(2.0)
+    assert info['video_streams'][0]['codec'] == 'hevc'
+    assert info['video_streams'][0]['resolution'] == '3840x2160'
+
+
+def test_mp4_track_indexes_count_skipped_traks(tmp_path):
+    moov = box(b'moov', mvhd(1, 10) + b''.join([
+        trak(b'text', box(b'tx3g', b'\0' * 8)),
+        trak(b'soun', audio_entry(b'fLaC', 2, 44100))
+    ]))
+    info = parse_container(write_mp4(tmp_path, moov))
+
+    assert info['video_streams'] == []
+    assert [(s['index'], s['codec'], s['sample_rate']) for s in info['audio_streams']] == [(1, 'flac', '44100')]
+
+
+@pytest.mark.parametrize('moov', [
+    box(b'moov', trak(b'vide', video_entry(b'xxxx', 640, 480))),  # unknown codec
+    box(b'moov', trak(b'soun', audio_entry(b'mp4a', 2, 48000))),  # mp4a without esds
+    box(b'moov', mvhd(1, 10))[:-4]  # truncated
+])
+def test_mp4_unusable_headers_raise(tmp_path, moov):
+    with pytest.raises(ContainerParseError):
+        parse_container(write_mp4(tmp_path, moov))
+
+
+def test_mp4_without_moov_raises(tmp_path):
+    with pytest.raises(ContainerParseError):
+        parse_container(write_mp4(tmp_path, box(b'mdat', b'\0' * 64)))
+
+
+def test_corrupt_box_size_raises():
+    data = struct.pack('>I4s', 4, b'trak')
+    with pytest.raises(ContainerParseError):
+        list(cp._iter_boxes(data))
+
+
+# --- Matroska ----------------------------------------------------------------
+
+def vint_size(size):
+    for length in range(1, 9):
+        if size < (1 << (7 * length)) - 1:
+            return ((1 << (7 * length)) | size).to_bytes(length, 'big')
+    raise ValueError(size)
+
+
+def element(element_id, payload=b''):
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + vint_size(len(payload)) + payload
+
+
+def uint(element_id, value, length=None):
+    return element(element_id, value.to_bytes(length or max(1, (value.bit_length() + 7) // 8), 'big'))
+
+
+def string(element_id, value):
+    return element(element_id, value.encode('utf-8'))
+
+
+def double(element_id, value):
+    return element(element_id, struct.pack('>d', value))
+
+
+def ebml_header(doctype='matroska'):
+    return element(cp.EBML_HEADER, string(cp.EBML_DOCTYPE, doctype))
+
+
+def info(duration_ms):
+    return element(cp.INFO, uint(cp.TIMECODE_SCALE, 1000000) + double(cp.DURATION, duration_ms))
+
+
+def tracks(*entries):
+    return element(cp.TRACKS, b''.join(element(cp.TRACK_ENTRY, b''.join(entry)) for entry in entries))
+
+
+VIDEO_TRACK = [
+    uint(cp.TRACK_TYPE, 1), string(cp.CODEC_ID, 'V_MPEG4/ISO/AVC'),
+    element(cp.VIDEO, uint(cp.PIXEL_WIDTH, 1280) + uint(cp.PIXEL_HEIGHT, 720))
+]
+OPUS_TRACK = [
+    uint(cp.TRACK_TYPE, 2), string(cp.CODEC_ID, 'A_OPUS'), string(cp.LANGUAGE, 'jpn'),
+    string(cp.NAME, 'Commentary'),
+    element(cp.AUDIO, double(cp.SAMPLING_FREQUENCY, 48000.0) + uint(cp.CHANNELS, 2))
+]
+PCM_TRACK = [
+    uint(cp.TRACK_TYPE, 2), string(cp.CODEC_ID, 'A_PCM/INT/LIT'), string(cp.LANGUAGE, 'ger'),
+    string(cp.LANGUAGE_BCP47, 'de-CH'), element(cp.AUDIO, uint(cp.BIT_DEPTH, 24))
+]
+
+
+def write_mkv(tmp_path, segment_children, doctype='matroska'):
+    path = tmp_path / 'in.mkv'
+    path.write_bytes(ebml_header(doctype) + element(cp.SEGMENT, b''.join(segment_children)))
+    return str(path)
+
+
+def test_read_vint():
+    assert cp._read_vint(b'\x81', 0, keep_marker=False) == (1, 1)
+    assert cp._read_vint(b'\x40\x02', 0, keep_marker=False) == (2, 2)
+    assert cp._read_vint(b'\xff', 0, keep_marker=False) == (cp.UNKNOWN_SIZE, 1)
+    assert cp._read_vint(b'\x1a\x45\xdf\xa3', 0, keep_marker=True) == (cp.EBML_HEADER, 4)
+    with pytest.raises(ContainerParseError):
+        cp._read_vint(b'\x00', 0, keep_marker=False)
+    with pytest.raises(ContainerParseError):
+        cp._read_vint(b'\x20\x00', 0, keep_marker=False)
+
+
+def test_matroska_streams_and_duration(tmp_path):
+    path = write_mkv(tmp_path, [info(90500.0), tracks(VIDEO_TRACK, OPUS_TRACK, PCM_TRACK)])
+    result = parse_container(path)
+
+    assert result['duration'] == pytest.approx(90.5)
+    assert result['video_streams'] == [{'index': 0, 'codec': 'h264', 'resolution': '1280x720', 'bit_rate': None}]
+    opus, pcm = result['audio_streams']
+    assert opus == {
+        'index': 1, 'codec': 'opus', 'channels': 2, 'sample_rate': '48000',
+        'bit_rate': None, 'language': 'jpn', 'title': 'Commentary'
+    }
+    # Absent fields take the Matroska defaults; the BCP 47 language wins over the legacy one
+    assert (pcm['codec'], pcm['channels'], pcm['sample_rate'], pcm['language']) == ('pcm_s24le', 1, '8000', 'de-CH')
+
+
+def test_matroska_tracks_after_cluster_found_via_seek_head(tmp_path):
+    info_element = info(2000.0)
+    cluster = element(cp.CLUSTER, b'\0' * 256)
+
+    def seek_head(tracks_position):
+        seek = element(cp.SEEK, uint(cp.SEEK_ID, cp.TRACKS) + uint(cp.SEEK_POSITION, tracks_position, 8))
+        return element(cp.SEEK_HEAD, seek)
+
+    tracks_position = len(seek_head(0)) + len(info_element) + len(cluster)
+    path = write_mkv(
+        tmp_path, [seek_head(tracks_position), info_element, cluster, tracks(OPUS_TRACK)], doctype='webm'
+    )
+    result = parse_container(path)
+
+    assert result['duration'] == pytest.approx(2.0)
+    assert [s['codec'] for s in result['audio_streams']] == ['opus']
+
+
+@pytest.mark.parametrize('doctype, children', [
+    ('avi', [tracks(VIDEO_TRACK)]),  # not Matroska
+    ('matroska', [info(1000.0)]),  # no Tracks
+    ('matroska', [tracks([uint(cp.TRACK_TYPE, 2), string(cp.CODEC_ID, 'A_UNKNOWN')])])
+])
+def test_matroska_unusable_headers_raise(tmp_path, doctype, children):
+    with pytest.raises(ContainerParseError):
+        parse_container(write_mkv(tmp_path, children, doctype))
+
+
+def test_unknown_format_raises(tmp_path):
+    path = tmp_path / 'in.avi'
+    path.write_bytes(b'RIFF\0\0\0\0AVI LIST' + b'\0' * 64)
+    with pytest.raises(ContainerParseError):
+        parse_container(str(path))
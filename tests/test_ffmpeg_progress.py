@@ -0,0 +1,67 @@
+import pytest
+
+from backend.ffmpeg_progress import ProgressParser, with_progress
+
+
+def feed_block(parser, **fields):
+    """Feed one -progress block, ending with its 'progress' line; return the snapshot."""
+    progress = fields.pop('progress', 'continue')
+    for key, value in fields.items():
+        assert parser.feed(f"{key}={value}\n") is None
+    return parser.feed(f"progress={progress}\n")
+
+
+def test_snapshot_percent_and_eta():
+    parser = ProgressParser(duration=100)
+    snapshot = feed_block(parser, frame=250, fps='50.00', bitrate='128.0kbits/s', out_time_us=25000000, speed='2.5x')
+
+    assert snapshot['percent'] == pytest.approx(25.0)
+    assert snapshot['out_time'] == pytest.approx(25.0)
+    assert snapshot['speed'] == pytest.approx(2.5)
+    assert snapshot['fps'] == pytest.approx(50.0)
+    assert snapshot['bitrate'] == '128.0kbits/s'
+    assert snapshot['eta'] == pytest.approx(30.0)  # 75 s of input left at 2.5x
+    assert not snapshot['done']
+
+
+def test_end_block_is_complete():
+    snapshot = feed_block(ProgressParser(duration=100), out_time_us=99000000, speed='1x', progress='end')
+    assert (snapshot['percent'], snapshot['eta'], snapshot['done']) == (100.0, 0.0, True)
+
+
+def test_unknown_duration_and_missing_values():
+    snapshot = feed_block(ProgressParser(duration=0), out_time_us='N/A', speed='N/A', fps='0.00')
+    assert snapshot['percent'] is None
+    assert snapshot['eta'] is None
+    assert snapshot['out_time'] is None
+    assert snapshot['speed'] is None
+
+
+def test_percent_is_clamped():
+    snapshot = feed_block(ProgressParser(duration=10), out_time_us=12000000, speed='1x')
+    assert snapshot['percent'] == 100.0
+    assert snapshot['eta'] == 0.0
+
+
+def test_blocks_are_independent():
+    parser = ProgressParser(duration=10)
+    feed_block(parser, out_time_us=5000000, speed='1x')
+    snapshot = feed_block(parser, out_time_us=6000000)
+    assert snapshot['speed'] is None  # not carried over from the previous block
+    assert snapshot['percent'] == pytest.approx(60.0)
+
+
+def test_log_lines_are_kept_in_a_ring_buffer():
+    parser = ProgressParser(duration=10, max_log_lines=2)
+    for line in ("Input #0, matroska,webm, from 'in.mkv':\n", "\n", "key=not a progress key\r\n",
+                 "Error while decoding stream #0:1\n"):
+        assert parser.feed(line) is None
+    feed_block(parser, out_time_us=1000000, stream_0_0_q='28.0')
+
+    assert parser.error_text() == "key=not a progress key\nError while decoding stream #0:1"
+
+
+def test_with_progress_follows_the_executable():
+    assert with_progress(['ffmpeg', '-i', 'in.mkv', 'out.m4a']) == [
+        'ffmpeg', '-progress', 'pipe:2', '-nostats', '-i', 'in.mkv', 'out.m4a'
+    ]
@@ -0,0 +1,40 @@
+import pytest
+
+from backend.commands import OutputSpec, job_kind
+from backend.jobs import Job
+from backend.journal import job_spec
+
+
+def options(video_codec='h264', audio_codec='aac', audio_ladder=''):
+    return {'video_codec': video_codec, 'audio_codec': audio_codec, 'audio_bitrate': '192k',
+            'audio_ladder': audio_ladder}
+
+
+@pytest.mark.parametrize('output_video, output_audio, settings, expected', [
+    ('v.mp4', 'a.m4a', options(), 'transcode'),
+    ('v.mp4', 'a.m4a', options(video_codec='copy', audio_codec='copy'), 'copy'),
+    ('v.mp4', 'a.m4a', options(video_codec='copy'), 'transcode'),  # the audio is encoded
+    ('v.mp4', None, options(video_codec='copy'), 'copy'),
+    (None, 'a.m4a', options(audio_codec='copy'), 'copy'),  # the h264 setting has no output
+    (None, 'a.m4a', options(audio_codec='copy', audio_ladder='aac:128k, flac'), 'transcode'),
+    (None, 'a.m4a', options(audio_ladder='nope'), 'transcode')
+])
+def test_kind_from_settings(output_video, output_audio, settings, expected):
+    assert Job('in.mkv', output_video, output_audio, settings).kind == expected
+
+
+def test_planned_kind_wins():
+    job = Job('in.mkv', 'v.mp4', 'a.m4a', options())
+    # Smart copy found both streams already in the requested codecs
+    job.planned_kind = job_kind([OutputSpec('video', 'v.mp4', 'copy'), OutputSpec('audio', 'a.m4a', 'copy')])
+    assert job.kind == 'copy'
+
+
+def test_job_kind():
+    assert job_kind([OutputSpec('video', 'v.mp4', 'copy'), OutputSpec('audio', 'a.opus', 'opus')]) == 'transcode'
+    assert job_kind([OutputSpec('audio', 'a.m4a', 'copy')]) == 'copy'
+
+
+def test_private_settings_stay_out_of_the_job():
+    job = Job('in.mkv', 'v.mp4', 'a.m4a', dict(options(), cluster_token='secret'))
+    assert 'cluster_token' not in job_spec(job)['options']
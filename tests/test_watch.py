@@ -0,0 +1,46 @@
+import json
+
+from backend.watch import WatchState
+
+
+def recording(tmp_path, name, data=b'frames'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_handled_until_the_file_changes(tmp_path):
+    state = WatchState(str(tmp_path / 'state.json'))
+    path = recording(tmp_path, 'a.mkv')
+    state.mark(path, 'done')
+    assert state.handled(path)
+    recording(tmp_path, 'a.mkv', b'a different recording')
+    assert not state.handled(path)
+
+
+def test_saves_are_batched(tmp_path):
+    state_path = tmp_path / 'state.json'
+    state = WatchState(str(state_path), save_interval=3600)
+    for name in ('a.mkv', 'b.mkv', 'c.mkv'):
+        state.mark(recording(tmp_path, name), 'done')
+    state.save()
+    assert not state_path.exists()  # the last write (creating the state) was just now
+
+    state.save(force=True)
+    assert len(json.loads(state_path.read_text())['files']) == 3
+    reloaded = WatchState(str(state_path))
+    assert all(reloaded.handled(str(tmp_path / name)) for name in ('a.mkv', 'b.mkv', 'c.mkv'))
+
+
+def test_prune_forgets_deleted_files(tmp_path):
+    state_path = tmp_path / 'state.json'
+    state = WatchState(str(state_path))
+    kept, deleted = recording(tmp_path, 'kept.mkv'), recording(tmp_path, 'deleted.mkv')
+    state.mark(kept, 'done')
+    state.mark(deleted, 'output')
+    state.save(force=True)
+
+    (tmp_path / 'deleted.mkv').unlink()
+    assert state.prune() == 1
+    state.save(force=True)
+    assert list(json.loads(state_path.read_text())['files']) == [kept]